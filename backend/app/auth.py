@@ -3,32 +3,98 @@
 from __future__ import annotations
 
 import hashlib
+from dataclasses import dataclass
+from uuid import UUID
 
 from fastapi import Depends, Header, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import select, text
 
 from . import models
-from .database import get_db
+from .cache import TTLCache
+from .config import get_settings
+from .database import get_async_db, get_db
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class CurrentOrg:
+    """Organization resolved from an API key; detached from any session."""
+
+    id: UUID
+    name: str
+
+
+@dataclass(frozen=True)
+class CachedKey:
+    org: CurrentOrg | None
+    revoked: bool
+
+
+# Keyed by the SHA-256 hash of the raw key, never by the raw key itself.
+api_key_cache = TTLCache(maxsize=settings.api_key_cache_size, ttl=settings.api_key_cache_ttl_seconds)
 
 
 def hash_key(raw: str) -> str:
     return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
 
+def invalidate_key(hashed: str) -> None:
+    api_key_cache.invalidate(hashed)
+
+
+def cached_org_id(raw_key: str | None) -> str | None:
+    """Org id for an API key if it is already cached; never touches the database."""
+    if not raw_key:
+        return None
+    entry = api_key_cache.peek(hash_key(raw_key))
+    return str(entry.org.id) if entry and entry.org else None
+
+
+def _key_lookup(hashed: str):
+    return (
+        select(models.ApiKey.revoked, models.Organization.id, models.Organization.name)
+        .outerjoin(models.Organization, models.Organization.id == models.ApiKey.org_id)
+        .where(models.ApiKey.key == hashed)
+    )
+
+
+def _to_entry(row) -> CachedKey | None:
+    if row is None:
+        return None
+    revoked, org_id, org_name = row
+    org = CurrentOrg(id=org_id, name=org_name) if org_id else None
+    return CachedKey(org=org, revoked=revoked is not None)
+
+
+def _check_entry(entry: CachedKey | None) -> CurrentOrg:
+    if not entry or entry.revoked:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key")
+    if not entry.org:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Org not found for key")
+    return entry.org
+
+
+def _require_key(x_api_key: str | None) -> str:
+    if not x_api_key:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="API key required")
+    return hash_key(x_api_key)
+
+
 def get_current_org(
     x_api_key: str | None = Header(default=None, convert_underscores=True),
     db: Session = Depends(get_db),
-):
-    if not x_api_key:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="API key required")
-    hashed = hash_key(x_api_key)
-    record = db.query(models.ApiKey).filter(models.ApiKey.key == hashed).first()
-    if not record or record.revoked:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key")
-    org = db.get(models.Organization, record.org_id)
-    if not org:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Org not found for key")
+) -> CurrentOrg:
+    hashed = _require_key(x_api_key)
+    entry = api_key_cache.get(hashed)
+    if entry is None:
+        entry = _to_entry(db.execute(_key_lookup(hashed)).first())
+        if entry is not None:
+            api_key_cache.set(hashed, entry)
+    org = _check_entry(entry)
+    db.info["org_id"] = str(org.id)
     try:
         if db.bind and db.bind.dialect.name == "postgresql":
             db.execute(text("SET LOCAL dpp.org_id = :org_id"), {"org_id": str(org.id)})
@@ -36,3 +102,25 @@ def get_current_org(
         # RLS is best-effort; avoid blocking request if SET LOCAL fails.
         pass
     return org
+
+
+async def get_current_org_async(
+    x_api_key: str | None = Header(default=None, convert_underscores=True),
+    db: AsyncSession = Depends(get_async_db),
+) -> CurrentOrg:
+    """Async twin of :func:`get_current_org`; sets RLS on the route's async session."""
+    hashed = _require_key(x_api_key)
+    entry = api_key_cache.get(hashed)
+    if entry is None:
+        entry = _to_entry((await db.execute(_key_lookup(hashed))).first())
+        if entry is not None:
+            api_key_cache.set(hashed, entry)
+    org = _check_entry(entry)
+    db.info["org_id"] = str(org.id)
+    try:
+        if db.bind and db.bind.dialect.name == "postgresql":
+            await db.execute(text("SET LOCAL dpp.org_id = :org_id"), {"org_id": str(org.id)})
+    except Exception:
+        # RLS is best-effort; avoid blocking request if SET LOCAL fails.
+        pass
+    return org
@@ -0,0 +1,276 @@
+"""Bulk row writes for import jobs.
+
+Rows are built as plain dicts rather than ORM objects: ids and column defaults
+are filled in client-side, so every row of a table has the same keys and a
+batch goes to the database in one statement:
+
+* on Postgres with psycopg (and ``IMPORT_COPY`` on), via ``COPY ... FROM STDIN``,
+  unless the table has row-level security, which ``COPY FROM`` does not support;
+* elsewhere via a Core ``insert()`` executemany, which SQLAlchemy batches into
+  multi-row ``INSERT ... VALUES`` statements (``insertmanyvalues``).
+
+Both run on the session's connection, inside its transaction.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Iterable
+from uuid import uuid4
+
+from sqlalchemy import JSON, Table, insert, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import get_settings
+from .emissions import add_to_totals, compute_items, floats
+from .factors import FactorIndex, get_factor_index, suppliers_by_id_stmt, suppliers_by_name_stmt
+from .importers import IMPORT_MODELS, CsvDeclaration
+from .rollups import UPSERTS, Deltas, add_items, apply_deltas, rollup_item
+
+settings = get_settings()
+
+
+@lru_cache
+def _defaults(table: Table) -> dict[str, Callable[[], Any]]:
+    """Client-side default factory per column key (``None`` when there is none)."""
+    factories: dict[str, Callable[[], Any]] = {}
+    for column in table.columns:
+        default = column.default
+        if default is not None and default.is_callable:
+            factories[column.key] = lambda fn=default.arg: fn(None)
+        elif default is not None and default.is_scalar:
+            factories[column.key] = lambda value=default.arg: value
+        else:
+            factories[column.key] = lambda: None
+    return factories
+
+
+def table_row(table: Table, record: dict[str, Any], **values: Any) -> dict[str, Any]:
+    """Complete row for ``table`` from ``record`` plus ``values``, defaults filled in.
+
+    Raises ``TypeError`` for keys that are not columns of the table, like the
+    ORM constructors do.
+    """
+    defaults = _defaults(table)
+    unknown = sorted(set(record) - set(defaults))
+    if unknown:
+        raise TypeError(f"{', '.join(map(repr, unknown))} is an invalid keyword argument for {table.name}")
+    merged = {**record, **values}
+    return {key: merged[key] if key in merged else factory() for key, factory in defaults.items()}
+
+
+@dataclass(frozen=True)
+class CbamLookup:
+    """Factors and the suppliers referenced by one batch of CBAM records."""
+
+    factors: FactorIndex
+    suppliers_by_id: dict[Any, Any] = field(default_factory=dict)
+    suppliers_by_name: dict[str, Any] = field(default_factory=dict)
+
+    def supplier(self, item: dict[str, Any]) -> Any:
+        if item.get("supplier_id"):
+            return self.suppliers_by_id.get(item["supplier_id"])
+        return self.suppliers_by_name.get(item.get("supplier_name"))
+
+
+def cbam_lookup(db: Session, org_id: str | None, records: Iterable[dict[str, Any]]) -> CbamLookup:
+    """Resolve every supplier of ``records`` with one ``IN`` query by id and one by name."""
+    ids: set[Any] = set()
+    names: set[str] = set()
+    for record in records:
+        for item in record.get("items") or []:
+            if item.get("supplier_id"):
+                ids.add(item["supplier_id"])
+            elif item.get("supplier_name"):
+                names.add(item["supplier_name"])
+    lookup = CbamLookup(get_factor_index(db, org_id))
+    if ids:
+        lookup.suppliers_by_id.update((row.id, row) for row in db.execute(suppliers_by_id_stmt(org_id, ids)))
+    if names:
+        lookup.suppliers_by_name.update((row.name, row) for row in db.execute(suppliers_by_name_stmt(org_id, names)))
+    return lookup
+
+
+def item_rows(
+    org_id: str | None, declaration_id: Any, records: list[dict[str, Any]], lookup: CbamLookup
+) -> list[dict[str, Any]]:
+    """``cbam_items`` rows for ``records`` with supplier, default factor, its source and emissions filled in."""
+    item_table = models.CbamItem.__table__
+    items = [
+        table_row(
+            item_table,
+            item,
+            declaration_id=declaration_id,
+            org_id=org_id,
+            cn_code=item.get("cn_code") or "",
+            quantity_tonnes=item.get("quantity_tonnes") or 0,
+        )
+        for item in records
+    ]
+    suppliers = [lookup.supplier(item) for item in items]
+    results = compute_items(
+        lookup.factors,
+        [item["cn_code"] for item in items],
+        floats([item["quantity_tonnes"] for item in items]),
+        floats([item["verified_emission_factor"] for item in items]),
+        floats([item["default_emission_factor"] for item in items]),
+        floats([supplier.default_emission_factor if supplier else None for supplier in suppliers]),
+    )
+    for item, supplier, default_factor, source, emissions in zip(
+        items,
+        suppliers,
+        results.default_factor.tolist(),
+        results.factor_source.tolist(),
+        results.emissions.tolist(),
+    ):
+        item.update(default_emission_factor=default_factor, factor_source=source, calculated_emissions=emissions)
+        if supplier is not None:
+            item.update(supplier_id=supplier.id, supplier_name=supplier.name)
+    return items
+
+
+def declaration_rows(org_id: str | None, decl: dict[str, Any], lookup: CbamLookup) -> list[tuple[Table, dict[str, Any]]]:
+    """Rows for one imported CBAM declaration and its items, with factors, emissions and totals."""
+    declaration_table = models.CbamDeclaration.__table__
+    item_table = models.CbamItem.__table__
+    declaration_id = uuid4()
+    items = item_rows(org_id, declaration_id, decl.get("items") or [], lookup)
+    total = sum(item["calculated_emissions"] for item in items)
+    price = decl.get("certificate_price_per_tonne") or settings.cbam_certificate_price_per_tonne
+    declaration = table_row(
+        declaration_table,
+        {},
+        id=declaration_id,
+        org_id=org_id,
+        period=decl.get("period") or "unknown",
+        status=decl.get("status") or "draft",
+        total_emissions=total,
+        certificate_price_per_tonne=price,
+        certificate_cost_estimate=total * price,
+    )
+    return [(declaration_table, declaration), *((item_table, item) for item in items)]
+
+
+def declaration_header(org_id: str | None, declaration_id: Any, declaration: CsvDeclaration) -> dict[str, Any]:
+    """An empty ``cbam_declarations`` row for a CSV period run; its items are appended in batches."""
+    return table_row(
+        models.CbamDeclaration.__table__,
+        {},
+        id=declaration_id,
+        org_id=org_id,
+        period=declaration.period,
+        status=declaration.status,
+        total_emissions=0.0,
+        certificate_price_per_tonne=settings.cbam_certificate_price_per_tonne,
+        certificate_cost_estimate=0.0,
+    )
+
+
+def append_items(db: Session, org_id: str | None, rows: Iterable[tuple[Table, dict[str, Any]]]) -> None:
+    """Insert item rows into their declarations the way ``POST /declarations/{id}/items`` does.
+
+    ``rows`` holds the items and the header of each declaration they belong
+    to; a header is inserted only if its id is new, so a declaration fed over
+    several transactions is created once. Each declaration's totals and the
+    rollups then get the delta of its new items, at its stored status and price.
+    """
+    declaration_table = models.CbamDeclaration.__table__
+    headers: dict[Any, dict[str, Any]] = {}
+    items: dict[Any, list[dict[str, Any]]] = {}
+    for table, row in rows:
+        if table is declaration_table:
+            headers[row["id"]] = row
+        else:
+            items.setdefault(row["declaration_id"], []).append(row)
+    if headers:
+        insert_header = UPSERTS[db.get_bind().dialect.name](declaration_table).on_conflict_do_nothing(
+            index_elements=[declaration_table.c.id]
+        )
+        db.execute(insert_header, list(headers.values()))
+    bulk_insert(db, ((models.CbamItem.__table__, item) for group in items.values() for item in group))
+    decl = models.CbamDeclaration
+    deltas: Deltas = {}
+    for declaration_id, group in items.items():
+        header = db.execute(
+            add_to_totals(declaration_id, sum(item["calculated_emissions"] for item in group)).returning(
+                decl.period, decl.status, decl.certificate_price_per_tonne
+            )
+        ).one()
+        add_items(deltas, header.period, header.status, header.certificate_price_per_tonne, map(rollup_item, group))
+    apply_deltas(db, org_id, deltas)
+
+
+def import_rows(
+    kind: str, org_id: str | None, record: dict[str, Any], lookup: CbamLookup | None = None
+) -> list[tuple[Table, dict[str, Any]]]:
+    """``(table, row)`` pairs to insert for one import record of ``kind``.
+
+    ``cbam`` records need the batch's :func:`cbam_lookup`.
+    """
+    if kind == "cbam":
+        return declaration_rows(org_id, record, lookup)
+    table = IMPORT_MODELS[kind].__table__
+    return [(table, table_row(table, record, org_id=org_id))]
+
+
+def _use_copy(db: Session, table: Table) -> bool:
+    """Whether ``table`` can be loaded with ``COPY``.
+
+    Postgres rejects ``COPY FROM`` into a table with row-level security, so
+    with ``ENFORCE_ORG_POLICIES`` on, or once RLS is enabled on the table
+    (``pg_class.relrowsecurity``), rows go through ``INSERT``, where the
+    policies' ``WITH CHECK`` applies. ``_copy`` drives a synchronous psycopg
+    cursor, so async engines (``ASYNC_DB``, reached through ``run_sync``) also
+    use ``INSERT``.
+    """
+    dialect = db.get_bind().dialect
+    if not (
+        settings.import_copy
+        and dialect.name == "postgresql"
+        and dialect.driver == "psycopg"
+        and not dialect.is_async
+    ):
+        return False
+    if settings.enforce_org_policies:
+        return False
+    row_security = db.scalar(
+        text("SELECT relrowsecurity FROM pg_class WHERE oid = to_regclass(:name)"), {"name": table.name}
+    )
+    return not row_security
+
+
+def _copy(db: Session, table: Table, rows: list[dict[str, Any]]) -> None:
+    from psycopg import Error as PsycopgError
+    from psycopg.types.json import Json
+
+    columns = list(table.columns)
+    json_keys = {column.key for column in columns if isinstance(column.type, JSON)}
+    statement = f"COPY {table.name} ({', '.join(column.name for column in columns)}) FROM STDIN"
+    raw = db.connection().connection.driver_connection
+    try:
+        with raw.cursor() as cursor, cursor.copy(statement) as copy:
+            for row in rows:
+                copy.write_row(
+                    [
+                        Json(row[column.key]) if column.key in json_keys and row[column.key] is not None else row[column.key]
+                        for column in columns
+                    ]
+                )
+    except PsycopgError as exc:
+        # Surface COPY failures like any other statement error (IntegrityError, DataError, ...).
+        raise DBAPIError.instance(statement, None, exc, PsycopgError, dialect=db.get_bind().dialect) from exc
+
+
+def bulk_insert(db: Session, rows: Iterable[tuple[Table, dict[str, Any]]]) -> None:
+    """Insert ``(table, row)`` pairs, one statement per table, parents first."""
+    by_table: dict[Table, list[dict[str, Any]]] = {}
+    for table, row in rows:
+        by_table.setdefault(table, []).append(row)
+    for table, table_rows in by_table.items():
+        if _use_copy(db, table):
+            _copy(db, table, table_rows)
+        else:
+            db.execute(insert(table), table_rows)
@@ -11,17 +11,55 @@ from pydantic import BaseModel, Field
 
 class Settings(BaseModel):
     database_url: str = Field(default="sqlite:///./dev.db")
+    database_replica_urls: List[str] = Field(default_factory=list)
+    read_your_writes_seconds: float = Field(default=5.0)
+    use_async_db: bool = Field(default=False)
+    async_database_url: str | None = None
+    db_pool_size: int = Field(default=5)
+    db_max_overflow: int = Field(default=10)
+    db_pool_timeout: float = Field(default=30.0)
+    db_pool_recycle: int = Field(default=1800)
+    db_pool_pre_ping: bool = Field(default=True)
+    db_pool_slow_checkout_ms: float = Field(default=100.0)
+    db_prepare_threshold: int | None = Field(default=5)
     base_public_url: str = Field(default="http://localhost:3000/scan")
     cors_origins: List[str] = Field(default_factory=lambda: ["http://localhost:3000"])
     cbam_certificate_price_per_tonne: float = Field(default=50.0)
     enforce_org_policies: bool = Field(default=False)
+    job_queue_role: str = Field(default="")
+    auto_migrate: bool = Field(default=False)
     storage_path: str = Field(default="storage")
+    private_storage_path: str = Field(default="storage-private")
     use_s3: bool = Field(default=False)
     s3_bucket: str | None = None
     s3_region: str | None = None
     s3_endpoint_url: str | None = None
     aws_access_key_id: str | None = None
     aws_secret_access_key: str | None = None
+    public_cache_size: int = Field(default=10000)
+    public_cache_ttl_seconds: float = Field(default=300.0)
+    public_cache_control: str = Field(default="public, max-age=60")
+    api_key_cache_ttl_seconds: float = Field(default=60.0)
+    api_key_cache_size: int = Field(default=10000)
+    cbam_factor_cache_size: int = Field(default=1000)
+    cbam_factor_cache_ttl_seconds: float = Field(default=300.0)
+    render_workers: int = Field(default=2)
+    render_cache_max_age_days: float = Field(default=30.0)
+    label_sheet_max_labels: int = Field(default=10000)
+    label_sheet_sync_max_labels: int = Field(default=500)
+    worker_poll_seconds: float = Field(default=1.0)
+    job_heartbeat_seconds: float = Field(default=10.0)
+    job_stale_seconds: float = Field(default=60.0)
+    job_max_attempts: int = Field(default=3)
+    job_retry_base_seconds: float = Field(default=5.0)
+    import_batch_size: int = Field(default=1000)
+    import_max_errors: int = Field(default=10000)
+    import_copy: bool = Field(default=True)
+    import_validation_pool: bool = Field(default=False)
+
+
+def _optional_int(raw: str) -> int | None:
+    return None if raw.strip().lower() in {"", "none", "off"} else int(raw)
 
 
 @lru_cache
@@ -30,6 +68,23 @@ def get_settings() -> Settings:
     origins = [origin.strip() for origin in raw_origins.split(",") if origin.strip()]
     return Settings(
         database_url=os.getenv("DATABASE_URL", Settings.model_fields["database_url"].default),
+        database_replica_urls=[
+            url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+        ],
+        read_your_writes_seconds=float(
+            os.getenv("READ_YOUR_WRITES_SECONDS", Settings.model_fields["read_your_writes_seconds"].default)
+        ),
+        use_async_db=os.getenv("ASYNC_DB", "false").lower() == "true",
+        async_database_url=os.getenv("ASYNC_DATABASE_URL") or None,
+        db_pool_size=int(os.getenv("DB_POOL_SIZE", Settings.model_fields["db_pool_size"].default)),
+        db_max_overflow=int(os.getenv("DB_MAX_OVERFLOW", Settings.model_fields["db_max_overflow"].default)),
+        db_pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", Settings.model_fields["db_pool_timeout"].default)),
+        db_pool_recycle=int(os.getenv("DB_POOL_RECYCLE", Settings.model_fields["db_pool_recycle"].default)),
+        db_pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+        db_pool_slow_checkout_ms=float(
+            os.getenv("DB_POOL_SLOW_CHECKOUT_MS", Settings.model_fields["db_pool_slow_checkout_ms"].default)
+        ),
+        db_prepare_threshold=_optional_int(os.getenv("DB_PREPARE_THRESHOLD", "5")),
         base_public_url=os.getenv("BASE_PUBLIC_URL", Settings.model_fields["base_public_url"].default),
         cors_origins=origins or Settings.model_fields["cors_origins"].default_factory(),
         cbam_certificate_price_per_tonne=float(
@@ -39,11 +94,63 @@ def get_settings() -> Settings:
             )
         ),
         enforce_org_policies=os.getenv("ENFORCE_ORG_POLICIES", "false").lower() == "true",
+        job_queue_role=os.getenv("JOB_QUEUE_ROLE", Settings.model_fields["job_queue_role"].default),
+        auto_migrate=os.getenv("AUTO_MIGRATE", "false").lower() == "true",
         storage_path=os.getenv("STORAGE_PATH", Settings.model_fields["storage_path"].default),
+        private_storage_path=os.getenv(
+            "PRIVATE_STORAGE_PATH", Settings.model_fields["private_storage_path"].default
+        ),
         use_s3=os.getenv("USE_S3", "false").lower() == "true",
         s3_bucket=os.getenv("S3_BUCKET"),
         s3_region=os.getenv("S3_REGION"),
         s3_endpoint_url=os.getenv("S3_ENDPOINT_URL"),
         aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
         aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        public_cache_size=int(os.getenv("PUBLIC_CACHE_SIZE", Settings.model_fields["public_cache_size"].default)),
+        public_cache_ttl_seconds=float(
+            os.getenv("PUBLIC_CACHE_TTL_SECONDS", Settings.model_fields["public_cache_ttl_seconds"].default)
+        ),
+        public_cache_control=os.getenv(
+            "PUBLIC_CACHE_CONTROL", Settings.model_fields["public_cache_control"].default
+        ),
+        api_key_cache_ttl_seconds=float(
+            os.getenv(
+                "API_KEY_CACHE_TTL_SECONDS",
+                Settings.model_fields["api_key_cache_ttl_seconds"].default,
+            )
+        ),
+        api_key_cache_size=int(
+            os.getenv("API_KEY_CACHE_SIZE", Settings.model_fields["api_key_cache_size"].default)
+        ),
+        cbam_factor_cache_size=int(
+            os.getenv("CBAM_FACTOR_CACHE_SIZE", Settings.model_fields["cbam_factor_cache_size"].default)
+        ),
+        cbam_factor_cache_ttl_seconds=float(
+            os.getenv("CBAM_FACTOR_CACHE_TTL_SECONDS", Settings.model_fields["cbam_factor_cache_ttl_seconds"].default)
+        ),
+        render_workers=int(os.getenv("RENDER_WORKERS", Settings.model_fields["render_workers"].default)),
+        render_cache_max_age_days=float(
+            os.getenv("RENDER_CACHE_MAX_AGE_DAYS", Settings.model_fields["render_cache_max_age_days"].default)
+        ),
+        label_sheet_max_labels=int(
+            os.getenv("LABEL_SHEET_MAX_LABELS", Settings.model_fields["label_sheet_max_labels"].default)
+        ),
+        label_sheet_sync_max_labels=int(
+            os.getenv("LABEL_SHEET_SYNC_MAX_LABELS", Settings.model_fields["label_sheet_sync_max_labels"].default)
+        ),
+        worker_poll_seconds=float(
+            os.getenv("WORKER_POLL_SECONDS", Settings.model_fields["worker_poll_seconds"].default)
+        ),
+        job_heartbeat_seconds=float(
+            os.getenv("JOB_HEARTBEAT_SECONDS", Settings.model_fields["job_heartbeat_seconds"].default)
+        ),
+        job_stale_seconds=float(os.getenv("JOB_STALE_SECONDS", Settings.model_fields["job_stale_seconds"].default)),
+        job_max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", Settings.model_fields["job_max_attempts"].default)),
+        job_retry_base_seconds=float(
+            os.getenv("JOB_RETRY_BASE_SECONDS", Settings.model_fields["job_retry_base_seconds"].default)
+        ),
+        import_batch_size=int(os.getenv("IMPORT_BATCH_SIZE", Settings.model_fields["import_batch_size"].default)),
+        import_max_errors=int(os.getenv("IMPORT_MAX_ERRORS", Settings.model_fields["import_max_errors"].default)),
+        import_copy=os.getenv("IMPORT_COPY", "true").lower() == "true",
+        import_validation_pool=os.getenv("IMPORT_VALIDATION_POOL", "false").lower() == "true",
     )
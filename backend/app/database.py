@@ -2,25 +2,232 @@
 
 from __future__ import annotations
 
-from typing import Generator
+import itertools
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Generator
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from starlette.concurrency import run_in_threadpool
 
+from .cache import TTLCache
 from .config import get_settings
+from .db_pool import pool_options, register_engine
 
 settings = get_settings()
 is_sqlite = settings.database_url.startswith("sqlite")
 
 connect_args = {"check_same_thread": False} if is_sqlite else {}
-engine = create_engine(settings.database_url, connect_args=connect_args)
+engine = register_engine(
+    "primary",
+    create_engine(settings.database_url, **{"connect_args": connect_args, **pool_options(settings.database_url)}),
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+ReplicaSessions = [
+    sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=register_engine(f"replica_{i}", create_engine(url, **pool_options(url))),
+    )
+    for i, url in enumerate(settings.database_replica_urls)
+]
 
-def get_db() -> Generator:
-    db = SessionLocal()
+
+def async_url(url: str) -> str:
+    """Map a sync database URL onto its asyncio driver (aiosqlite / psycopg async)."""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:") :]
+    for prefix in ("postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix) :]
+    return url
+
+
+def _make_async_engine(url: str):
+    return create_async_engine(url, **pool_options(url, is_async=True))
+
+
+async_engine = (
+    register_engine(
+        "primary_async", _make_async_engine(settings.async_database_url or async_url(settings.database_url))
+    )
+    if settings.use_async_db
+    else None
+)
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False) if async_engine else None
+)
+AsyncReplicaSessions = (
+    [
+        async_sessionmaker(
+            register_engine(f"replica_{i}_async", _make_async_engine(async_url(url))),
+            autoflush=False,
+            expire_on_commit=False,
+        )
+        for i, url in enumerate(settings.database_replica_urls)
+    ]
+    if settings.use_async_db
+    else []
+)
+
+# Orgs that committed a write within READ_YOUR_WRITES_SECONDS read from the primary.
+recent_writes = TTLCache(maxsize=100_000, ttl=settings.read_your_writes_seconds)
+_replica_turn = itertools.count()
+
+
+@event.listens_for(Session, "after_flush")
+def _flagged_flush(session: Session, flush_context: Any) -> None:
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _flagged_execute(orm_execute_state: Any) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_recent_write(session: Session) -> None:
+    org_id = session.info.get("org_id")
+    if session.info.pop("wrote", False) and org_id:
+        recent_writes.set(org_id, True)
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_write_flag(session: Session) -> None:
+    session.info.pop("wrote", None)
+
+
+def mark_recent_write(key: str) -> None:
+    recent_writes.set(key, True)
+
+
+def use_replica(request: Request) -> bool:
+    """GET/HEAD requests go to a replica unless the caller's org wrote recently.
+
+    The org is only known here if its API key is already in the auth cache;
+    requests from unknown keys stay on the primary.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return False
+    from .auth import cached_org_id  # auth depends on this module
+
+    org_id = cached_org_id(request.headers.get("x-api-key"))
+    if org_id is None:
+        return request.headers.get("x-api-key") is None
+    return recent_writes.peek(org_id) is None
+
+
+def _pick(factories: list) -> Any:
+    return factories[next(_replica_turn) % len(factories)]
+
+
+def get_db(request: Request) -> Generator:
+    factory = _pick(ReplicaSessions) if ReplicaSessions and use_replica(request) else SessionLocal
+    db = factory()
     try:
         yield db
     finally:
         db.close()
+
+
+class SyncSessionAdapter:
+    """Awaitable subset of ``AsyncSession`` backed by a sync ``Session``.
+
+    Handed out by :func:`get_async_db` when ``ASYNC_DB`` is off so the async
+    routers run unchanged on the sync engine; each call goes to the threadpool.
+    Results are pre-buffered, as with ``AsyncSession``.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    @property
+    def bind(self):
+        return self.sync_session.bind
+
+    @property
+    def info(self) -> dict:
+        return self.sync_session.info
+
+    def add(self, instance: Any) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances: Any) -> None:
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement: Any, params: Any = None, **kwargs: Any):
+        kwargs["execution_options"] = {**kwargs.get("execution_options", {}), "prebuffer_rows": True}
+        return await run_in_threadpool(self.sync_session.execute, statement, params, **kwargs)
+
+    async def scalars(self, statement: Any, params: Any = None, **kwargs: Any):
+        kwargs["execution_options"] = {**kwargs.get("execution_options", {}), "prebuffer_rows": True}
+        return await run_in_threadpool(self.sync_session.scalars, statement, params, **kwargs)
+
+    async def scalar(self, statement: Any, params: Any = None, **kwargs: Any):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params, **kwargs)
+
+    async def get(self, entity: Any, ident: Any, **kwargs: Any):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance: Any) -> None:
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self, objects: Any = None) -> None:
+        await run_in_threadpool(self.sync_session.flush, objects)
+
+    async def refresh(self, instance: Any, attribute_names: Any = None) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def run_sync(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def stream(self, statement: Any, params: Any = None, **kwargs: Any) -> "SyncStreamResult":
+        kwargs["execution_options"] = {**kwargs.get("execution_options", {}), "stream_results": True}
+        return SyncStreamResult(await run_in_threadpool(self.sync_session.execute, statement, params, **kwargs))
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+
+class SyncStreamResult:
+    """``AsyncResult.partitions`` over a sync ``Result``; each fetch goes to the threadpool."""
+
+    def __init__(self, result: Any):
+        self.result = result
+
+    async def partitions(self, size: int) -> AsyncIterator[list[Any]]:
+        while rows := await run_in_threadpool(self.result.fetchmany, size):
+            yield rows
+
+
+@asynccontextmanager
+async def async_session_scope(replica: bool = False) -> AsyncIterator[Any]:
+    """Async session (or adapter) on the primary, or on a replica when ``replica`` is set."""
+    if AsyncSessionLocal is not None:
+        factory = _pick(AsyncReplicaSessions) if replica and AsyncReplicaSessions else AsyncSessionLocal
+        async with factory() as db:
+            yield db
+        return
+    factory = _pick(ReplicaSessions) if replica and ReplicaSessions else SessionLocal
+    db = SyncSessionAdapter(factory())
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+async def get_async_db(request: Request) -> AsyncGenerator:
+    async with async_session_scope(replica=use_replica(request)) as db:
+        yield db
+
@@ -0,0 +1,129 @@
+"""Connection pool instrumentation.
+
+Engines built through :func:`pool_options` use a ``QueuePool`` subclass that
+times every checkout, counts checkout timeouts and logs a warning when a
+request had to wait for a connection longer than ``DB_POOL_SLOW_CHECKOUT_MS``.
+That wait is exactly the latency added by an exhausted pool.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class PoolStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.checkouts = 0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            slow = seconds * 1000 >= settings.db_pool_slow_checkout_ms
+            if slow:
+                self.slow_checkouts += 1
+        if slow:
+            logger.warning("Waited %.0f ms for a database connection from pool %r", seconds * 1000, self.name)
+
+    def record_timeout(self, seconds: float) -> None:
+        with self._lock:
+            self.timeouts += 1
+        logger.warning("Timed out after %.0f ms waiting for a connection from pool %r", seconds * 1000, self.name)
+
+    def snapshot(self, pool: Pool) -> dict[str, Any]:
+        with self._lock:
+            data: dict[str, Any] = {
+                "checkouts": self.checkouts,
+                "slow_checkouts": self.slow_checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms_total": round(self.wait_seconds_total * 1000, 1),
+                "wait_ms_max": round(self.wait_seconds_max * 1000, 1),
+            }
+        if isinstance(pool, QueuePool):
+            data.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=pool.overflow(),
+            )
+        return data
+
+
+class _InstrumentedPoolMixin:
+    stats: PoolStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_timeout(time.perf_counter() - start)
+            raise
+        self.stats.record_wait(time.perf_counter() - start)
+        return conn
+
+    def recreate(self):
+        # dispose() swaps in a fresh pool; keep counting into the same stats.
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+# Engine name -> engine, for the /metrics surface.
+_engines: dict[str, Any] = {}
+
+
+def pool_options(url: str, is_async: bool = False) -> dict[str, Any]:
+    """``create_engine`` keyword arguments for the configured pool (empty for SQLite)."""
+    if url.startswith("sqlite"):
+        return {}
+    options: dict[str, Any] = {
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    if "+psycopg" in url:
+        # psycopg prepares a statement server-side once it has run this many times on a connection.
+        options["connect_args"] = {"prepare_threshold": settings.db_prepare_threshold}
+    return options
+
+
+def register_engine(name: str, engine: Any) -> Any:
+    """Attach stats to ``engine``'s pool and expose it under ``name``; returns the engine."""
+    pool = engine.pool
+    pool.stats = getattr(pool, "stats", None) or PoolStats(name)
+    _engines[name] = engine
+    return engine
+
+
+def pool_stats() -> dict[str, dict[str, Any]]:
+    return {name: engine.pool.stats.snapshot(engine.pool) for name, engine in _engines.items()}
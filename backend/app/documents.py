@@ -0,0 +1,107 @@
+"""PDF document layouts.
+
+Renderers take plain dicts (built by the routers from ORM rows) and return PDF
+bytes, so they can run in the render process pool without touching the
+database. Bump ``LAYOUT_VERSION`` whenever a layout changes to retire cached
+renders.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+
+LAYOUT_VERSION = 1
+# Core fonts with cp1252 cover the euro sign; anything else is replaced.
+ENCODING = "windows-1252"
+
+
+def _new_pdf() -> FPDF:
+    pdf = FPDF()
+    pdf.core_fonts_encoding = ENCODING
+    pdf.add_page()
+    return pdf
+
+
+def _text(value: Any) -> str:
+    return str(value).encode(ENCODING, "replace").decode(ENCODING)
+
+
+def _line(pdf: FPDF, height: float, text: Any) -> None:
+    pdf.cell(0, height, _text(text), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+
+def _heading(pdf: FPDF, size: float, height: float, text: Any) -> None:
+    pdf.set_font("Helvetica", "B", size)
+    _line(pdf, height, text)
+
+
+def render_passport(data: dict[str, Any]) -> bytes:
+    pdf = _new_pdf()
+    _heading(pdf, 14, 10, "Battery Passport")
+    pdf.set_font("Helvetica", "", 11)
+    _line(pdf, 8, f"Model: {data['battery_model']}")
+    _line(pdf, 8, f"Manufacturer: {data['manufacturer_name']}")
+    _line(pdf, 8, f"GTIN: {data['gtin']}")
+    _line(pdf, 8, f"Serial: {data['serial_number']}")
+    _line(pdf, 8, f"Category: {data['battery_category']}")
+    _line(pdf, 8, f"Capacity (kWh): {data['rated_capacity_kwh']}")
+    _line(pdf, 8, f"Weight (kg): {data['battery_weight_kg']}")
+    _line(pdf, 8, f"Carbon footprint: {data['carbon_footprint_kg_per_kwh']} kg/kWh")
+    pdf.ln(4)
+    _line(pdf, 8, f"Hazardous substances: {data['hazardous_substances'] or 'N/A'}")
+    if data["additional_public_data"]:
+        pdf.ln(4)
+        _heading(pdf, 12, 8, "Additional public data")
+        pdf.set_font("Helvetica", "", 11)
+        for k, v in data["additional_public_data"].items():
+            _line(pdf, 6, f"{k}: {v}")
+    return bytes(pdf.output())
+
+
+def render_cbam_declaration(data: dict[str, Any]) -> bytes:
+    pdf = _new_pdf()
+    _heading(pdf, 14, 10, f"CBAM Declaration {data['period']}")
+    pdf.set_font("Helvetica", "", 12)
+    _line(pdf, 8, f"Status: {data['status']}")
+    _line(pdf, 8, f"Total emissions: {data['total_emissions'] or 0:.2f} tCO2e")
+    _line(pdf, 8, f"Certificate price (€/t): {data['certificate_price_per_tonne']:.2f}")
+    _line(pdf, 8, f"Certificate cost estimate: {data['certificate_cost_estimate'] or 0:.2f} EUR")
+    pdf.ln(4)
+    _heading(pdf, 12, 8, "Line Items")
+    pdf.set_font("Helvetica", "", 11)
+    for item in data["items"]:
+        factor_used = item["verified_emission_factor"] or item["default_emission_factor"] or 0
+        supplier = item["supplier_name"] or "N/A"
+        pdf.multi_cell(
+            0,
+            6,
+            _text(
+                f"CN {item['cn_code']} | Qty {item['quantity_tonnes']} t | EF {factor_used} | "
+                f"Emissions {item['calculated_emissions'] or 0} | Supplier {supplier}"
+            ),
+            new_x=XPos.LMARGIN,
+            new_y=YPos.NEXT,
+        )
+    return bytes(pdf.output())
+
+
+def render_dop(data: dict[str, Any]) -> bytes:
+    pdf = _new_pdf()
+    _heading(pdf, 14, 10, "Declaration of Performance")
+    pdf.set_font("Helvetica", "", 12)
+    _line(pdf, 8, f"Product: {data['battery_model'] or data['name']}")
+    _line(pdf, 8, f"Manufacturer: {data['manufacturer_name'] or 'N/A'}")
+    _line(pdf, 8, f"Address: {data['manufacturer_address'] or 'N/A'}")
+    _line(pdf, 8, f"Category: {data['battery_category']}")
+    _line(pdf, 8, f"GTIN: {data['gtin'] or 'N/A'}")
+    pdf.ln(4)
+    _heading(pdf, 12, 8, "Performance Characteristics")
+    pdf.set_font("Helvetica", "", 11)
+    _line(pdf, 6, f"Rated capacity (kWh): {data['rated_capacity_kwh'] or 'N/A'}")
+    _line(pdf, 6, f"Weight (kg): {data['battery_weight_kg'] or 'N/A'}")
+    _line(pdf, 6, f"Carbon footprint class: {data['carbon_footprint_class'] or 'N/A'}")
+    _line(pdf, 6, f"Hazardous substances: {data['hazardous_substances'] or 'N/A'}")
+    return bytes(pdf.output())
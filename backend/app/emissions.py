@@ -0,0 +1,210 @@
+"""Columnar CBAM emissions engine.
+
+Items are processed as NumPy arrays (one per column, missing values as NaN)
+instead of one Python object at a time:
+
+* the default factor is the item's declared factor, else the longest-prefix
+  CN factor (:class:`~app.factors.FactorIndex`, resolved once per distinct CN
+  code), else the supplier's factor when that comes out as zero; where it came
+  from is kept as ``factor_source``;
+* the factor used is the verified factor when set and non-zero, else the
+  default; emissions are quantity times that factor;
+* declaration totals are a ``bincount`` over the items' declaration index, and
+  certificate costs are totals times each declaration's price.
+
+:func:`recompute` reapplies this to every declaration of an org with one
+query for items, one for declarations and bulk updates of the rows that
+changed, e.g. after a factor revision.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+from sqlalchemy import Update, and_, func, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import get_settings
+from .factors import FactorIndex, get_factor_index
+from .rollups import rebuild
+
+settings = get_settings()
+
+# Sources whose default factor was looked up rather than declared, so a factor
+# revision can change it. ``None`` covers items that predate the column.
+RESOLVED_SOURCES = ("org", "builtin", "supplier", "none", None)
+UPDATE_CHUNK_SIZE = 5000
+
+
+def floats(values: Sequence[float | None]) -> np.ndarray:
+    """``float64`` array with ``None`` as NaN."""
+    return np.array(values, dtype=np.float64).reshape(-1)
+
+
+@dataclass(frozen=True)
+class ItemResults:
+    default_factor: np.ndarray
+    factor_source: np.ndarray  # object array of source names
+    factor_used: np.ndarray
+    emissions: np.ndarray
+
+
+def select_default_factors(
+    factors: FactorIndex, cn_codes: Sequence[str | None], declared: np.ndarray, supplier: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """``(default factor, factor source)`` per item."""
+    codes = np.array([code or "" for code in cn_codes], dtype=object)
+    unique, inverse = np.unique(codes, return_inverse=True)
+    resolved = [factors.resolve(code) for code in unique]
+    resolved_factor = np.array([factor for factor, _ in resolved], dtype=np.float64)[inverse.reshape(-1)]
+    resolved_source = np.array([source for _, source in resolved], dtype=object)[inverse.reshape(-1)]
+
+    has_declared = ~np.isnan(declared)
+    default = np.where(has_declared, declared, resolved_factor)
+    source = np.where(has_declared, "declared", resolved_source)
+    use_supplier = (default == 0) & ~np.isnan(supplier)
+    default = np.where(use_supplier, supplier, default)
+    source = np.where(use_supplier, "supplier", source).astype(object)
+    return default, source
+
+
+def item_emissions(quantity: np.ndarray, verified: np.ndarray, default: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """``(factor used, emissions)``: a set, non-zero verified factor wins over the default."""
+    use_verified = ~np.isnan(verified) & (verified != 0)
+    used = np.nan_to_num(np.where(use_verified, verified, default))
+    return used, np.nan_to_num(quantity) * used
+
+
+def compute_items(
+    factors: FactorIndex,
+    cn_codes: Sequence[str | None],
+    quantity: np.ndarray,
+    verified: np.ndarray,
+    declared: np.ndarray,
+    supplier: np.ndarray,
+) -> ItemResults:
+    default, source = select_default_factors(factors, cn_codes, declared, supplier)
+    used, emissions = item_emissions(quantity, verified, default)
+    return ItemResults(default, source, used, emissions)
+
+
+def declaration_totals(emissions: np.ndarray, groups: np.ndarray, prices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """``(total emissions, certificate cost)`` per declaration; ``groups`` maps items to ``prices`` positions."""
+    totals = np.bincount(groups, weights=emissions, minlength=len(prices)) if len(emissions) else np.zeros(len(prices))
+    return totals, totals * prices
+
+
+def add_to_totals(declaration_id: object, emissions: float) -> Update:
+    """``UPDATE`` adding ``emissions`` (and its cost at the declaration's price) to a declaration's totals.
+
+    The increment is relative (``SET x = x + delta``) on the row it locks, so
+    concurrent writers each add their own delta and nobody re-reads the items.
+    """
+    decl = models.CbamDeclaration
+    price = func.coalesce(decl.certificate_price_per_tonne, settings.cbam_certificate_price_per_tonne)
+    return (
+        update(decl)
+        .where(decl.id == declaration_id)
+        .values(
+            total_emissions=func.coalesce(decl.total_emissions, 0) + emissions,
+            certificate_cost_estimate=func.coalesce(decl.certificate_cost_estimate, 0) + price * emissions,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _differs(new: np.ndarray, old: np.ndarray) -> np.ndarray:
+    return ~((new == old) | (np.isnan(new) & np.isnan(old)))
+
+
+def recompute(db: Session, org_id: str, period: str | None = None) -> dict[str, int]:
+    """Recompute factors, emissions and totals of the org's declarations (optionally one period).
+
+    Declared and verified factors are kept; looked-up defaults are resolved
+    again against the current factors and suppliers. Only rows whose values
+    change are written, and the scope's rollups are rebuilt if any did. The
+    caller commits.
+    """
+    decl, item, supplier = models.CbamDeclaration, models.CbamItem, models.CbamSupplier
+    scope = [decl.org_id == org_id] + ([decl.period == period] if period else [])
+    declarations = db.execute(
+        select(decl.id, decl.certificate_price_per_tonne, decl.total_emissions, decl.certificate_cost_estimate)
+        .where(*scope)
+    ).all()
+    items = db.execute(
+        select(
+            item.id,
+            item.declaration_id,
+            item.cn_code,
+            item.quantity_tonnes,
+            item.verified_emission_factor,
+            item.default_emission_factor,
+            item.factor_source,
+            item.calculated_emissions,
+            supplier.default_emission_factor,
+        )
+        .join(decl, decl.id == item.declaration_id)
+        .outerjoin(supplier, and_(supplier.id == item.supplier_id, supplier.org_id == org_id))
+        .where(*scope)
+    ).all()
+
+    position = {row.id: index for index, row in enumerate(declarations)}
+    prices = floats([row.certificate_price_per_tonne or settings.cbam_certificate_price_per_tonne for row in declarations])
+    (item_ids, decl_ids, cn_codes, quantity, verified, stored_default, stored_source, stored_emissions, supplier_factor) = (
+        zip(*items) if items else ([],) * 9
+    )
+    stored_default = floats(stored_default)
+    resolved = np.array([source in RESOLVED_SOURCES for source in stored_source], dtype=bool)
+    results = compute_items(
+        get_factor_index(db, org_id, fresh=True),
+        cn_codes,
+        floats(quantity),
+        floats(verified),
+        np.where(resolved, np.nan, stored_default),
+        floats(supplier_factor),
+    )
+    groups = np.array([position[decl_id] for decl_id in decl_ids], dtype=np.intp)
+    totals, costs = declaration_totals(results.emissions, groups, prices)
+
+    changed_items = np.flatnonzero(
+        _differs(results.default_factor, stored_default)
+        | _differs(results.emissions, floats(stored_emissions))
+        | (results.factor_source != np.array(stored_source, dtype=object))
+    )
+    changed_decls = np.flatnonzero(
+        _differs(totals, floats([row.total_emissions for row in declarations]))
+        | _differs(costs, floats([row.certificate_cost_estimate for row in declarations]))
+    )
+    item_updates = [
+        {
+            "id": item_ids[index],
+            "default_emission_factor": float(results.default_factor[index]),
+            "factor_source": results.factor_source[index],
+            "calculated_emissions": float(results.emissions[index]),
+        }
+        for index in changed_items
+    ]
+    decl_updates = [
+        {
+            "id": declarations[index].id,
+            "certificate_price_per_tonne": float(prices[index]),
+            "total_emissions": float(totals[index]),
+            "certificate_cost_estimate": float(costs[index]),
+        }
+        for index in changed_decls
+    ]
+    for start in range(0, len(item_updates), UPDATE_CHUNK_SIZE):
+        db.execute(update(item), item_updates[start : start + UPDATE_CHUNK_SIZE])
+    for start in range(0, len(decl_updates), UPDATE_CHUNK_SIZE):
+        db.execute(update(decl), decl_updates[start : start + UPDATE_CHUNK_SIZE])
+    if item_updates or decl_updates:
+        rebuild(db, org_id, period)
+    return {
+        "declarations": len(declarations),
+        "items": len(items),
+        "declarations_updated": len(decl_updates),
+        "items_updated": len(item_updates),
+    }
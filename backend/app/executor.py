@@ -0,0 +1,51 @@
+"""Shared process pool for CPU-bound rendering.
+
+QR encoding and PDF layout are pure Python and hold the GIL, so running them in
+the request thread pool still stalls every other request on the worker. Work is
+sent to a small process pool instead (``RENDER_WORKERS``; ``0`` renders in the
+calling thread). The pool is created on first use with the ``spawn`` start
+method so children never inherit open database connections or locks.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Iterable, Iterator
+
+from .config import get_settings
+
+settings = get_settings()
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> Executor | None:
+    global _pool
+    if settings.render_workers <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.render_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_process_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def pool_map(fn: Callable[..., Any], *iterables: Iterable[Any]) -> Iterator[Any]:
+    """``Executor.map`` on the render pool: submitted eagerly, yielded in order."""
+    pool = get_process_pool()
+    if pool is None:
+        return map(fn, *iterables)
+    return pool.map(fn, *iterables)
@@ -0,0 +1,133 @@
+"""CBAM default emission factors by CN code prefix.
+
+Each org's ``cbam_factors`` are loaded once into a :class:`FactorIndex`, a
+prefix table that resolves the longest prefix matching a CN code with one dict
+lookup per distinct prefix length. Org factors take precedence over the
+built-in ``DEFAULT_FACTORS``. Indexes are cached per org
+(``CBAM_FACTOR_CACHE_TTL_SECONDS``) and dropped when the org adds a factor; other
+workers pick up the change once their entry expires.
+
+Suppliers referenced by a batch of items are fetched with one ``IN`` query
+(:func:`suppliers_by_id_stmt` / :func:`suppliers_by_name_stmt`).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Collection, Iterable
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import TTLCache
+from .config import get_settings
+
+settings = get_settings()
+
+DEFAULT_FACTORS = {
+    "7208": 2.1,  # flat-rolled iron/steel
+    "7207": 2.4,  # semi-finished
+    "7210": 1.9,
+    "7601": 16.0,  # aluminum
+    "2523": 0.8,  # cement
+}
+
+
+def normalize_cn(code: str | None) -> str:
+    """Digits of a CN code (``"7208 10 00"`` -> ``"72081000"``)."""
+    return "".join(ch for ch in code or "" if ch.isdigit())
+
+
+@dataclass(frozen=True)
+class FactorIndex:
+    factors: dict[str, float]
+    lengths: tuple[int, ...]  # distinct prefix lengths, longest first
+    source: str  # recorded as the item's factor_source when this index matched
+    fallback: FactorIndex | None = None
+
+    @classmethod
+    def build(
+        cls, entries: Iterable[tuple[str, float]], source: str, fallback: FactorIndex | None = None
+    ) -> FactorIndex:
+        """Index ``(prefix, factor)`` pairs; a later entry for the same prefix wins."""
+        factors: dict[str, float] = {}
+        for prefix, factor in entries:
+            prefix = normalize_cn(prefix)
+            if prefix:
+                factors[prefix] = factor
+        lengths = tuple(sorted({len(prefix) for prefix in factors}, reverse=True))
+        return cls(factors, lengths, source, fallback)
+
+    def match(self, cn_code: str | None) -> float | None:
+        """Factor of the longest prefix of ``cn_code`` in this index, ignoring the fallback."""
+        code = normalize_cn(cn_code)
+        for length in self.lengths:
+            if length <= len(code):
+                factor = self.factors.get(code[:length])
+                if factor is not None:
+                    return factor
+        return None
+
+    def resolve(self, cn_code: str | None) -> tuple[float, str]:
+        """Longest-prefix ``(factor, source)``, falling back to the defaults and then ``(0.0, "none")``."""
+        factor = self.match(cn_code)
+        if factor is not None:
+            return factor, self.source
+        if self.fallback is not None:
+            return self.fallback.resolve(cn_code)
+        return 0.0, "none"
+
+
+DEFAULT_INDEX = FactorIndex.build(DEFAULT_FACTORS.items(), "builtin")
+
+factor_cache = TTLCache(maxsize=settings.cbam_factor_cache_size, ttl=settings.cbam_factor_cache_ttl_seconds)
+
+
+def _org_factors_stmt(org_id: str | None) -> Any:
+    factor = models.CbamFactor
+    return (
+        select(factor.cn_prefix, factor.emission_factor)
+        .where(factor.org_id == org_id)
+        .order_by(factor.created_at, factor.id)
+    )
+
+
+def get_factor_index(db: Session, org_id: str | None, fresh: bool = False) -> FactorIndex:
+    """The org's cached index; ``fresh`` reloads it from the database."""
+    index = None if fresh else factor_cache.get(org_id)
+    if index is None:
+        index = FactorIndex.build(db.execute(_org_factors_stmt(org_id)).all(), "org", DEFAULT_INDEX)
+        factor_cache.set(org_id, index)
+    return index
+
+
+async def get_factor_index_async(db: Any, org_id: str) -> FactorIndex:
+    index = factor_cache.get(org_id)
+    if index is None:
+        index = FactorIndex.build((await db.execute(_org_factors_stmt(org_id))).all(), "org", DEFAULT_INDEX)
+        factor_cache.set(org_id, index)
+    return index
+
+
+def invalidate_factor_index(org_id: str) -> None:
+    factor_cache.invalidate(org_id)
+
+
+SUPPLIER_COLUMNS = (models.CbamSupplier.id, models.CbamSupplier.name, models.CbamSupplier.default_emission_factor)
+
+
+def suppliers_by_id_stmt(org_id: str | None, ids: Collection[Any]) -> Any:
+    supplier = models.CbamSupplier
+    return select(*SUPPLIER_COLUMNS).where(supplier.org_id == org_id, supplier.id.in_(ids))
+
+
+def suppliers_by_name_stmt(org_id: str | None, names: Collection[str]) -> Any:
+    """Suppliers named in ``names``, newest first, so the oldest of equal names is read last."""
+    supplier = models.CbamSupplier
+    return (
+        select(*SUPPLIER_COLUMNS)
+        .where(supplier.org_id == org_id, supplier.name.in_(names))
+        .order_by(supplier.created_at.desc(), supplier.id.desc())
+    )
+
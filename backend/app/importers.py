@@ -0,0 +1,206 @@
+"""Incremental record sources for import jobs.
+
+An import either carries its rows inline (``payload["records"]``) or points at
+an uploaded CSV / NDJSON file on private storage (``payload["source"]``). Either way
+:func:`iter_records` yields one record at a time: files are read through a
+stream, decoded line by line and coerced to the target columns' Python types,
+so memory use does not depend on file size. Rows that cannot be parsed are
+yielded with an error instead of aborting the stream.
+
+For the ``cbam`` kind an NDJSON line is a declaration with its ``items``.
+CSV files have one item per row plus ``period`` / ``status`` columns, and
+consecutive rows with the same period form one declaration; those rows are
+yielded one item at a time, each carrying its :class:`CsvDeclaration`, so a
+period of any size streams in batches like any other file.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import itertools
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Callable, Iterable, Iterator
+from uuid import UUID
+
+from sqlalchemy import JSON, Date, DateTime, Float, Integer
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+
+from . import models
+from .storage import get_private_storage
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+IMPORT_MODELS: dict[str, type] = {
+    "components": models.Component,
+    "templates": models.ProductTemplate,
+    "passports": models.BatteryPassport,
+    "cbam": models.CbamItem,
+}
+DECLARATION_FIELDS = ("period", "status")
+
+
+@dataclass(frozen=True)
+class CsvDeclaration:
+    """The declaration of a run of CBAM CSV rows with the same period; ``line`` is the run's first line."""
+
+    line: int
+    period: str
+    status: str
+
+
+@dataclass(frozen=True)
+class ParsedRow:
+    """One source record; ``line`` is its 1-based position (file line or list index).
+
+    Rows that could not be parsed or validated carry ``error`` and the raw
+    record; validation errors also carry structured ``details``. CBAM CSV rows
+    are single items and carry their ``declaration``.
+    """
+
+    line: int
+    record: dict[str, Any] | None
+    error: str | None = None
+    details: list[dict[str, Any]] | None = None
+    declaration: CsvDeclaration | None = None
+
+
+def source_format(filename: str | None, content_type: str | None = None) -> str | None:
+    name = (filename or "").lower()
+    if name.endswith(".csv") or content_type == "text/csv":
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or content_type in {"application/x-ndjson", "application/jsonl"}:
+        return "ndjson"
+    return None
+
+
+def _converter(column_type: Any) -> Callable[[str], Any]:
+    if isinstance(column_type, Float):
+        return float
+    if isinstance(column_type, Integer):
+        return int
+    if isinstance(column_type, DateTime):
+        return datetime.fromisoformat
+    if isinstance(column_type, Date):
+        return date.fromisoformat
+    if isinstance(column_type, JSON):
+        return json.loads
+    if isinstance(column_type, PG_UUID):
+        return UUID
+    return str
+
+
+@lru_cache
+def _converters(model: type) -> dict[str, Callable[[str], Any]]:
+    return {column.key: _converter(column.type) for column in model.__table__.columns}
+
+
+def coerce(model: type, record: dict[str, Any]) -> dict[str, Any]:
+    """Convert string values to ``model``'s column types; blank strings become ``None``.
+
+    Non-string values (from JSON) pass through untouched. Unknown keys and
+    values that do not convert are kept as they are, so validation reports them
+    against the field.
+    """
+    converters = _converters(model)
+    row: dict[str, Any] = {}
+    for key, value in record.items():
+        if isinstance(value, str):
+            convert = converters.get(key, str)
+            if value == "" and convert is not str:
+                value = None
+            else:
+                try:
+                    value = convert(value)
+                except ValueError:
+                    pass
+        row[key] = value
+    return row
+
+
+def _read_csv(stream: io.TextIOBase) -> Iterator[tuple[int, Any]]:
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, {key: value for key, value in row.items() if key}
+
+
+def _read_ndjson(stream: io.TextIOBase) -> Iterator[tuple[int, Any]]:
+    for line_num, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_num, json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield line_num, ParsedRow(line_num, {"raw": line[:1000]}, f"invalid JSON ({exc.msg})")
+
+
+def _declaration_items(rows: Iterable[tuple[int, Any]], after: int) -> Iterator[ParsedRow]:
+    """CBAM CSV rows after ``after`` as coerced items of the declaration of their period run.
+
+    Runs are told apart from the start of the file, so rows after a checkpoint
+    still belong to the run (and declaration) they started in.
+    """
+    model = IMPORT_MODELS["cbam"]
+    for period, group in itertools.groupby(rows, key=lambda numbered: numbered[1].get("period") or "unknown"):
+        declaration = None
+        for line, record in group:
+            if declaration is None:
+                declaration = CsvDeclaration(line, period, record.get("status") or "draft")
+            if line <= after:
+                continue
+            item = {key: value for key, value in record.items() if key not in DECLARATION_FIELDS}
+            try:
+                coerced = coerce(model, item)
+            except (TypeError, ValueError, AttributeError) as exc:
+                yield ParsedRow(line, item, f"{type(exc).__name__}: {exc}", declaration=declaration)
+                continue
+            yield ParsedRow(line, coerced, declaration=declaration)
+
+
+def _coerced(kind: str, rows: Iterable[tuple[int, Any]], after: int) -> Iterator[ParsedRow]:
+    model = IMPORT_MODELS[kind]
+    for line, record in rows:
+        if line <= after:
+            continue
+        if isinstance(record, ParsedRow):
+            yield record
+            continue
+        if not isinstance(record, dict):
+            yield ParsedRow(line, {"raw": record}, "expected a JSON object")
+            continue
+        try:
+            if kind == "cbam":
+                coerced = {**record, "items": [coerce(model, item) for item in record.get("items") or []]}
+            else:
+                coerced = coerce(model, record)
+        except (TypeError, ValueError, AttributeError) as exc:
+            yield ParsedRow(line, record, f"{type(exc).__name__}: {exc}")
+            continue
+        yield ParsedRow(line, coerced)
+
+
+def iter_source(kind: str, source: dict[str, Any], after: int = 0) -> Iterator[ParsedRow]:
+    """Stream rows from an uploaded file, skipping (without coercing) lines up to ``after``."""
+    with get_private_storage().open_read(source["key"]) as raw:
+        stream = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+        if source["format"] == "csv" and kind == "cbam":
+            yield from _declaration_items(_read_csv(stream), after)
+            return
+        rows = _read_csv(stream) if source["format"] == "csv" else _read_ndjson(stream)
+        yield from _coerced(kind, rows, after)
+
+
+def yields_items(kind: str, payload: dict[str, Any] | None) -> bool:
+    """Whether the job's rows are single CBAM items (a CSV upload) rather than whole declarations."""
+    source = (payload or {}).get("source") or {}
+    return kind == "cbam" and source.get("format") == "csv"
+
+
+def iter_records(kind: str, payload: dict[str, Any] | None, after: int = 0) -> Iterator[ParsedRow]:
+    """Rows of an import job after position ``after``, from its file or inline records."""
+    payload = payload or {}
+    if payload.get("source"):
+        return iter_source(kind, payload["source"], after)
+    return _coerced(kind, enumerate(payload.get("records") or [], start=1), after)
@@ -0,0 +1,144 @@
+"""Printable QR label sheets for production batches.
+
+Each page is a grid of labels: the passport QR code with the serial number and
+GTIN underneath. QR codes for a page are rendered as one task on the render
+process pool; all pages are submitted up front and laid out in order as their
+images arrive, so layout of page N overlaps rendering of the pages after it.
+Large sheets are built by the worker as ``labels`` export jobs (``app.tasks``).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Iterator, Sequence
+
+from fpdf import FPDF
+from sqlalchemy import Select, select
+
+from . import models, schemas
+from .config import get_settings
+from .executor import pool_map
+from .qr import QrOptions, render_qr
+
+settings = get_settings()
+PAGE_SIZES_MM = {"A4": (210.0, 297.0), "Letter": (215.9, 279.4)}
+TEXT_LINE_MM = 3.5
+CELL_PADDING_MM = 2.0
+MIN_QR_MM = 10.0
+LABEL_FILTERS = ("battery_category", "battery_status", "battery_model", "gtin", "template_id")
+
+
+class LabelLayoutError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Label:
+    url: str
+    serial_number: str
+    gtin: str
+
+
+@dataclass(frozen=True)
+class LabelLayout:
+    columns: int = 3
+    rows: int = 8
+    page_size: str = "A4"
+    margin_mm: float = 10.0
+    font_size: float = 7.0
+    error: str | None = None
+
+    @property
+    def per_page(self) -> int:
+        return self.columns * self.rows
+
+    @property
+    def cell_mm(self) -> tuple[float, float]:
+        width, height = PAGE_SIZES_MM[self.page_size]
+        return (width - 2 * self.margin_mm) / self.columns, (height - 2 * self.margin_mm) / self.rows
+
+    @property
+    def qr_mm(self) -> float:
+        cell_w, cell_h = self.cell_mm
+        return min(cell_w, cell_h - 2 * TEXT_LINE_MM) - 2 * CELL_PADDING_MM
+
+    def validate(self) -> None:
+        if self.qr_mm < MIN_QR_MM:
+            raise LabelLayoutError(
+                f"Grid {self.columns}x{self.rows} on {self.page_size} leaves {self.qr_mm:.1f} mm per code; "
+                f"at least {MIN_QR_MM:.0f} mm is needed to scan reliably"
+            )
+
+
+def label_layout(request: schemas.LabelSheetRequest) -> LabelLayout:
+    return LabelLayout(
+        columns=request.columns,
+        rows=request.rows,
+        page_size=request.page_size,
+        margin_mm=request.margin_mm,
+        error=request.error,
+    )
+
+
+def label_selection(org_id: str | None, request: schemas.LabelSheetRequest, limit: int) -> Select:
+    """The org's passports picked by ``passport_ids`` and the list filters, oldest first, at most ``limit``."""
+    passport = models.BatteryPassport
+    stmt = select(passport.id, passport.serial_number, passport.gtin).where(passport.org_id == org_id)
+    if request.passport_ids:
+        stmt = stmt.where(passport.id.in_(request.passport_ids))
+    for name in LABEL_FILTERS:
+        value = getattr(request, name)
+        if value:
+            stmt = stmt.where(getattr(passport, name) == value)
+    return stmt.order_by(passport.created_at, passport.id).limit(limit)
+
+
+def sheet_labels(rows: Sequence) -> list[Label]:
+    return [Label(url=f"{settings.base_public_url}/{row.id}", serial_number=row.serial_number, gtin=row.gtin) for row in rows]
+
+
+def render_page_codes(urls: Sequence[str], error: str | None = None) -> list[bytes]:
+    """Render one page worth of QR PNGs; runs in a render pool process."""
+    # Small module size keeps the PNGs compact; the PDF scales them to the cell.
+    options = QrOptions(kind="png", scale=4, border=0, error=error)
+    return [render_qr(url, options) for url in urls]
+
+
+def _latin1(text: str) -> str:
+    # Core PDF fonts only cover Latin-1.
+    return text.encode("latin-1", "replace").decode("latin-1")
+
+
+def _pages(labels: Sequence[Label], per_page: int) -> list[Sequence[Label]]:
+    return [labels[start : start + per_page] for start in range(0, len(labels), per_page)]
+
+
+def build_label_sheet(labels: Sequence[Label], layout: LabelLayout) -> bytes:
+    layout.validate()
+    width, height = PAGE_SIZES_MM[layout.page_size]
+    cell_w, cell_h = layout.cell_mm
+    qr_mm = layout.qr_mm
+
+    pdf = FPDF(unit="mm", format=(width, height))
+    pdf.set_auto_page_break(False)
+    pdf.set_margins(layout.margin_mm, layout.margin_mm)
+    pdf.set_font("Helvetica", "", layout.font_size)
+
+    pages = _pages(labels, layout.per_page)
+    rendered: Iterator[list[bytes]] = pool_map(
+        render_page_codes, [[label.url for label in page] for page in pages], [layout.error] * len(pages)
+    )
+    for page, images in zip(pages, rendered):
+        pdf.add_page()
+        for index, (label, image) in enumerate(zip(page, images)):
+            row, column = divmod(index, layout.columns)
+            x = layout.margin_mm + column * cell_w
+            y = layout.margin_mm + row * cell_h
+            pdf.image(BytesIO(image), x=x + (cell_w - qr_mm) / 2, y=y + CELL_PADDING_MM, w=qr_mm, h=qr_mm)
+            text_y = y + CELL_PADDING_MM + qr_mm + 0.5
+            pdf.set_xy(x, text_y)
+            pdf.cell(cell_w, TEXT_LINE_MM, _latin1(f"S/N {label.serial_number}"), align="C")
+            pdf.set_xy(x, text_y + TEXT_LINE_MM)
+            pdf.cell(cell_w, TEXT_LINE_MM, _latin1(f"GTIN {label.gtin}"), align="C")
+    return bytes(pdf.output())
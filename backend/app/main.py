@@ -7,8 +7,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
+from .auth import api_key_cache
 from .config import get_settings
-from .database import Base, engine
+from .database import async_engine, engine
+from .db_pool import pool_stats
+from .executor import shutdown_process_pool
+from .migrations import check_schema, upgrade
+from .pagination import NEXT_CURSOR_HEADER, PREV_CURSOR_HEADER
+from .routers.passports import public_cache
 from .security import ensure_rls_policies
 from .routers import passports, catalog, artifacts, orgs, keys, audit, jobs, cbam, dop, compliance
 
@@ -16,7 +22,9 @@ settings = get_settings()
 
 
 def init_db() -> None:
-    Base.metadata.create_all(bind=engine)
+    if settings.auto_migrate:
+        upgrade(engine)
+    check_schema(engine)
 
 
 app = FastAPI(
@@ -31,11 +39,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, PREV_CURSOR_HEADER, "ETag", "Last-Modified"],
 )
 
 # Serve uploaded artifacts (local storage) - replace with real storage/CDN in production.
+# Import uploads and exports live under PRIVATE_STORAGE_PATH, outside this mount.
 if not settings.use_s3:
     storage_dir = Path(settings.storage_path)
+    if Path(settings.private_storage_path).resolve().is_relative_to(storage_dir.resolve()):
+        raise RuntimeError("PRIVATE_STORAGE_PATH must not be inside STORAGE_PATH, which is served publicly")
     storage_dir.mkdir(parents=True, exist_ok=True)
     app.mount("/storage", StaticFiles(directory=storage_dir), name="storage")
 
@@ -44,7 +56,14 @@ if not settings.use_s3:
 def on_startup() -> None:
     init_db()
     if settings.enforce_org_policies:
-        ensure_rls_policies(engine)
+        ensure_rls_policies(engine, queue_role=settings.job_queue_role or None)
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    if async_engine is not None:
+        await async_engine.dispose()
+    shutdown_process_pool()
 
 
 @app.get("/health")
@@ -53,9 +72,13 @@ def health() -> dict[str, str]:
 
 
 @app.get("/metrics")
-def metrics() -> dict[str, str]:
-    # Placeholder metrics endpoint; integrate real monitoring later.
-    return {"metrics": "pending"}
+def metrics() -> dict[str, dict]:
+    # In-process counters only; integrate real monitoring later.
+    return {
+        "auth_cache": api_key_cache.stats(),
+        "public_passport_cache": public_cache.stats(),
+        "db_pools": pool_stats(),
+    }
 
 
 app.include_router(passports.router)
@@ -0,0 +1,248 @@
+"""Versioned schema migrations.
+
+Apply pending migrations with ``python -m app.migrations`` (or set
+``AUTO_MIGRATE=true`` for local runs); the API itself only checks on startup
+that the database is at :data:`LATEST_VERSION`.
+
+Migrations run on an autocommit connection so Postgres can build indexes with
+``CREATE INDEX CONCURRENTLY`` without locking writers. Every step must be
+idempotent: a fresh database gets the current models from the baseline, and a
+run interrupted half-way is simply re-run.
+"""
+
+from __future__ import annotations
+
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Sequence
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from . import models  # noqa: F401  (registers tables on Base.metadata)
+from .database import Base
+
+SCHEMA_TABLE = "schema_version"
+# Arbitrary constant shared by every migrator so concurrent deploys serialise.
+ADVISORY_LOCK_ID = 80_457_201
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def create_index(conn: Connection, name: str, table: str, columns: Sequence[str], unique: bool = False) -> None:
+    cols = ", ".join(columns)
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    if conn.dialect.name == "postgresql":
+        # A failed concurrent build leaves an INVALID index behind; drop it so IF NOT EXISTS retries.
+        invalid = conn.execute(
+            text(
+                "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ),
+            {"name": name},
+        ).first()
+        if invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table} ({cols})"))
+    else:
+        conn.execute(text(f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({cols})"))
+
+
+def add_column(conn: Connection, table: str, column_ddl: str) -> None:
+    name = column_ddl.split()[0]
+    existing = {col["name"] for col in inspect(conn).get_columns(table)}
+    if name not in existing:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column_ddl}"))
+
+
+def _baseline(conn: Connection) -> None:
+    Base.metadata.create_all(bind=conn)
+
+
+ORG_SCOPED_TABLES = [
+    "components",
+    "product_templates",
+    "template_components",
+    "battery_passports",
+    "restricted_artifacts",
+    "audit_logs",
+    "import_jobs",
+    "export_jobs",
+    "cbam_declarations",
+    "cbam_items",
+    "cbam_factors",
+    "cbam_suppliers",
+    "cra_products",
+    "eudr_suppliers",
+    "ai_systems",
+    "ai_incidents",
+    "epd_records",
+    "nis2_attestations",
+]
+
+
+def _filter_indexes(conn: Connection) -> None:
+    for table in ORG_SCOPED_TABLES:
+        create_index(conn, f"ix_{table}_org_created", table, ["org_id", "created_at", "id"])
+    create_index(conn, "ix_template_components_template", "template_components", ["template_id", "created_at", "id"])
+    create_index(conn, "ix_battery_passports_template", "battery_passports", ["template_id"])
+    create_index(conn, "ix_restricted_artifacts_passport", "restricted_artifacts", ["passport_id", "created_at", "id"])
+    create_index(conn, "ix_cbam_items_declaration", "cbam_items", ["declaration_id", "created_at", "id"])
+    create_index(conn, "ix_cbam_factors_org_prefix", "cbam_factors", ["org_id", "cn_prefix"])
+    create_index(conn, "ix_ai_incidents_system", "ai_incidents", ["system_id"])
+    create_index(conn, "ix_api_keys_org", "api_keys", ["org_id"])
+    create_index(conn, "ix_users_org", "users", ["org_id"])
+
+
+JOB_TABLES = ["import_jobs", "export_jobs"]
+
+
+def _job_queue(conn: Connection) -> None:
+    for table in JOB_TABLES:
+        add_column(conn, table, "attempts INTEGER NOT NULL DEFAULT 0")
+        add_column(conn, table, "max_attempts INTEGER NOT NULL DEFAULT 3")
+        add_column(conn, table, "next_run_at TIMESTAMP")
+        add_column(conn, table, "locked_by VARCHAR(120)")
+        add_column(conn, table, "locked_at TIMESTAMP")
+        add_column(conn, table, "heartbeat_at TIMESTAMP")
+        create_index(conn, f"ix_{table}_queue", table, ["status", "next_run_at"])
+
+
+def _import_checkpoints(conn: Connection) -> None:
+    add_column(conn, "import_jobs", "checkpoint INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "import_jobs", "rows_created INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "import_jobs", "rows_failed INTEGER NOT NULL DEFAULT 0")
+    Base.metadata.tables["import_job_errors"].create(bind=conn, checkfirst=True)
+
+
+def _import_validation(conn: Connection) -> None:
+    add_column(conn, "import_job_errors", "details JSON")
+
+
+def _factor_source(conn: Connection) -> None:
+    add_column(conn, "cbam_items", "factor_source VARCHAR(20)")
+    # Older items never recorded where their default came from, but it was always
+    # looked up (supplier factor first when linked), so a factor revision may
+    # re-resolve it.
+    conn.execute(
+        text(
+            "UPDATE cbam_items SET factor_source = "
+            "CASE WHEN supplier_id IS NULL THEN 'builtin' ELSE 'supplier' END "
+            "WHERE factor_source IS NULL"
+        )
+    )
+
+
+def _cbam_rollups(conn: Connection) -> None:
+    Base.metadata.tables["cbam_rollups"].create(bind=conn, checkfirst=True)
+    create_index(
+        conn,
+        "ux_cbam_rollups_key",
+        "cbam_rollups",
+        ["org_id", "period", "status", "cn_chapter", "supplier", "country"],
+        unique=True,
+    )
+
+
+def _cbam_item_filters(conn: Connection) -> None:
+    # varchar_pattern_ops lets Postgres serve `cn_code LIKE 'prefix%'` from the index under any collation.
+    cn_code = "cn_code varchar_pattern_ops" if conn.dialect.name == "postgresql" else "cn_code"
+    create_index(conn, "ix_cbam_items_declaration_cn", "cbam_items", ["declaration_id", cn_code])
+    for name, column in (
+        ("supplier", "supplier_id"),
+        ("supplier_name", "supplier_name"),
+        ("country", "country_of_origin"),
+    ):
+        create_index(conn, f"ix_cbam_items_declaration_{name}", "cbam_items", ["declaration_id", column, "created_at", "id"])
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "baseline schema", _baseline),
+    Migration(2, "org/created_at and foreign key filter indexes", _filter_indexes),
+    Migration(3, "job queue columns for the background worker", _job_queue),
+    Migration(4, "import checkpoints and per-row import errors", _import_checkpoints),
+    Migration(5, "structured import validation errors", _import_validation),
+    Migration(6, "origin of CBAM item default factors", _factor_source),
+    Migration(7, "CBAM analytics rollups", _cbam_rollups),
+    Migration(8, "CBAM item filter indexes", _cbam_item_filters),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def _ensure_version_table(conn: Connection) -> None:
+    conn.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {SCHEMA_TABLE} ("
+            "version INTEGER PRIMARY KEY, description VARCHAR(255) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+        )
+    )
+
+
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table(SCHEMA_TABLE):
+        return 0
+    return conn.execute(text(f"SELECT COALESCE(MAX(version), 0) FROM {SCHEMA_TABLE}")).scalar_one()
+
+
+def upgrade(engine: Engine, target: int | None = None) -> int:
+    """Apply pending migrations up to ``target`` (default: latest); return the new version."""
+    target = LATEST_VERSION if target is None else target
+    with engine.connect() as raw_conn:
+        conn = raw_conn.execution_options(isolation_level="AUTOCOMMIT")
+        is_pg = conn.dialect.name == "postgresql"
+        if is_pg:
+            conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+        try:
+            _ensure_version_table(conn)
+            version = current_version(conn)
+            for migration in MIGRATIONS:
+                if migration.version <= version or migration.version > target:
+                    continue
+                migration.upgrade(conn)
+                conn.execute(
+                    text(f"INSERT INTO {SCHEMA_TABLE} (version, description, applied_at) VALUES (:v, :d, :t)"),
+                    {"v": migration.version, "d": migration.description, "t": datetime.utcnow()},
+                )
+                version = migration.version
+            return version
+        finally:
+            if is_pg:
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+
+
+def check_schema(engine: Engine) -> None:
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version < LATEST_VERSION:
+        raise SchemaOutOfDate(
+            f"Database schema is at version {version}, this build expects {LATEST_VERSION}; "
+            "run `python -m app.migrations` first"
+        )
+
+
+def main(argv: list[str]) -> None:
+    from .database import engine
+
+    command = argv[0] if argv else "upgrade"
+    if command == "current":
+        with engine.connect() as conn:
+            print(current_version(conn))
+    elif command == "upgrade":
+        target = int(argv[1]) if len(argv) > 1 else None
+        print(f"schema at version {upgrade(engine, target)}")
+    else:
+        raise SystemExit("usage: python -m app.migrations [upgrade [version] | current]")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -5,8 +5,9 @@ from __future__ import annotations
 from datetime import datetime, date
 from uuid import uuid4
 
-from sqlalchemy import JSON, Column, Date, DateTime, Float, Integer, String, ForeignKey
+from sqlalchemy import JSON, Column, Date, DateTime, Float, Index, Integer, String, Text, ForeignKey
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
 
 from .database import Base
 
@@ -21,6 +22,7 @@ class Organization(Base):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (Index("ix_users_org", "org_id"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id"), nullable=True)
@@ -31,6 +33,7 @@ class User(Base):
 
 class ApiKey(Base):
     __tablename__ = "api_keys"
+    __table_args__ = (Index("ix_api_keys_org", "org_id"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id"), nullable=False)
@@ -42,6 +45,9 @@ class ApiKey(Base):
 
 class Component(Base):
     __tablename__ = "components"
+    __table_args__ = (
+        Index("ix_components_org_created", "org_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
@@ -59,6 +65,9 @@ class Component(Base):
 
 class ProductTemplate(Base):
     __tablename__ = "product_templates"
+    __table_args__ = (
+        Index("ix_product_templates_org_created", "org_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
@@ -89,6 +98,10 @@ class ProductTemplate(Base):
 
 class TemplateComponent(Base):
     __tablename__ = "template_components"
+    __table_args__ = (
+        Index("ix_template_components_org_created", "org_id", "created_at", "id"),
+        Index("ix_template_components_template", "template_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
@@ -101,6 +114,10 @@ class TemplateComponent(Base):
 
 class BatteryPassport(Base):
     __tablename__ = "battery_passports"
+    __table_args__ = (
+        Index("ix_battery_passports_org_created", "org_id", "created_at", "id"),
+        Index("ix_battery_passports_template", "template_id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
@@ -136,6 +153,10 @@ class BatteryPassport(Base):
 
 class RestrictedArtifact(Base):
     __tablename__ = "restricted_artifacts"
+    __table_args__ = (
+        Index("ix_restricted_artifacts_org_created", "org_id", "created_at", "id"),
+        Index("ix_restricted_artifacts_passport", "passport_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
@@ -143,12 +164,16 @@ class RestrictedArtifact(Base):
     kind = Column(String(80), nullable=False)  # conformity, test_report, dismantling, safety
     title = Column(String(255), nullable=False)
     url = Column(String(255), nullable=True)
-    metadata = Column(JSON, nullable=True)
+    # "metadata" is reserved by the declarative API; keep the column name, rename the attribute.
+    metadata_ = Column("metadata", JSON, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        Index("ix_audit_logs_org_created", "org_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
@@ -162,34 +187,76 @@ class AuditLog(Base):
 
 class ImportJob(Base):
     __tablename__ = "import_jobs"
+    __table_args__ = (
+        Index("ix_import_jobs_org_created", "org_id", "created_at", "id"),
+        Index("ix_import_jobs_queue", "status", "next_run_at"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
     kind = Column(String(80), nullable=False)  # components/templates/passports/cbam
-    status = Column(String(50), nullable=False, default="pending")
+    status = Column(String(50), nullable=False, default="pending")  # pending/queued/running/completed/failed
     payload = Column(JSON, nullable=True)
     result = Column(JSON, nullable=True)
     error = Column(String(255), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    max_attempts = Column(Integer, nullable=False, default=3, server_default="3")
+    next_run_at = Column(DateTime, nullable=True)
+    locked_by = Column(String(120), nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    checkpoint = Column(Integer, nullable=False, default=0, server_default="0")  # last committed source line
+    rows_created = Column(Integer, nullable=False, default=0, server_default="0")
+    rows_failed = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
 
+class ImportJobError(Base):
+    __tablename__ = "import_job_errors"
+    __table_args__ = (
+        Index("ix_import_job_errors_job_created", "job_id", "created_at", "id"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    job_id = Column(UUID(as_uuid=True), ForeignKey("import_jobs.id", ondelete="CASCADE"), nullable=False)
+    org_id = Column(String(120), nullable=True)
+    line = Column(Integer, nullable=False)
+    record = Column(JSON, nullable=True)
+    error = Column(Text, nullable=False)
+    details = Column(JSON, nullable=True)  # [{field, message, type}] for validation errors
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class ExportJob(Base):
     __tablename__ = "export_jobs"
+    __table_args__ = (
+        Index("ix_export_jobs_org_created", "org_id", "created_at", "id"),
+        Index("ix_export_jobs_queue", "status", "next_run_at"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
     kind = Column(String(80), nullable=False)  # passports, cbam, etc.
-    status = Column(String(50), nullable=False, default="pending")
+    status = Column(String(50), nullable=False, default="pending")  # pending/queued/running/completed/failed
     payload = Column(JSON, nullable=True)
     result = Column(JSON, nullable=True)
     error = Column(String(255), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    max_attempts = Column(Integer, nullable=False, default=3, server_default="3")
+    next_run_at = Column(DateTime, nullable=True)
+    locked_by = Column(String(120), nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
 
 class CbamDeclaration(Base):
     __tablename__ = "cbam_declarations"
+    __table_args__ = (
+        Index("ix_cbam_declarations_org_created", "org_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
@@ -201,9 +268,20 @@ class CbamDeclaration(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
+    # Never lazy-loaded: queries that need items use selectinload(CbamDeclaration.items).
+    items = relationship("CbamItem", order_by="[CbamItem.created_at, CbamItem.id]", lazy="raise")
+
 
 class CbamItem(Base):
     __tablename__ = "cbam_items"
+    __table_args__ = (
+        Index("ix_cbam_items_org_created", "org_id", "created_at", "id"),
+        Index("ix_cbam_items_declaration", "declaration_id", "created_at", "id"),
+        Index("ix_cbam_items_declaration_cn", "declaration_id", "cn_code", postgresql_ops={"cn_code": "varchar_pattern_ops"}),
+        Index("ix_cbam_items_declaration_supplier", "declaration_id", "supplier_id", "created_at", "id"),
+        Index("ix_cbam_items_declaration_supplier_name", "declaration_id", "supplier_name", "created_at", "id"),
+        Index("ix_cbam_items_declaration_country", "declaration_id", "country_of_origin", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     declaration_id = Column(UUID(as_uuid=True), ForeignKey("cbam_declarations.id"), nullable=False)
@@ -212,6 +290,7 @@ class CbamItem(Base):
     product_description = Column(String(255), nullable=True)
     quantity_tonnes = Column(Float, nullable=False)
     default_emission_factor = Column(Float, nullable=True)
+    factor_source = Column(String(20), nullable=True)  # declared, org, builtin, supplier, none
     verified_emission_factor = Column(Float, nullable=True)
     calculated_emissions = Column(Float, nullable=True)
     supplier_id = Column(UUID(as_uuid=True), ForeignKey("cbam_suppliers.id"), nullable=True)
@@ -220,8 +299,34 @@ class CbamItem(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 
+class CbamRollup(Base):
+    """Running CBAM totals per org, period, status, CN chapter, supplier and country (see ``app.rollups``)."""
+
+    __tablename__ = "cbam_rollups"
+    __table_args__ = (
+        Index("ux_cbam_rollups_key", "org_id", "period", "status", "cn_chapter", "supplier", "country", unique=True),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    org_id = Column(String(120), nullable=False)
+    period = Column(String(20), nullable=False)
+    status = Column(String(50), nullable=False)
+    cn_chapter = Column(String(2), nullable=False)  # first two CN digits; "" when unknown
+    supplier = Column(String(255), nullable=False)  # supplier name; "" when none
+    country = Column(String(120), nullable=False)  # country of origin; "" when none
+    item_count = Column(Integer, nullable=False, default=0)
+    quantity_tonnes = Column(Float, nullable=False, default=0)
+    total_emissions = Column(Float, nullable=False, default=0)
+    certificate_cost = Column(Float, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
 class CbamFactor(Base):
     __tablename__ = "cbam_factors"
+    __table_args__ = (
+        Index("ix_cbam_factors_org_created", "org_id", "created_at", "id"),
+        Index("ix_cbam_factors_org_prefix", "org_id", "cn_prefix"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
@@ -233,6 +338,9 @@ class CbamFactor(Base):
 
 class CbamSupplier(Base):
     __tablename__ = "cbam_suppliers"
+    __table_args__ = (
+        Index("ix_cbam_suppliers_org_created", "org_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
@@ -245,6 +353,9 @@ class CbamSupplier(Base):
 
 class CraProduct(Base):
     __tablename__ = "cra_products"
+    __table_args__ = (
+        Index("ix_cra_products_org_created", "org_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
@@ -257,6 +368,9 @@ class CraProduct(Base):
 
 class EudrSupplier(Base):
     __tablename__ = "eudr_suppliers"
+    __table_args__ = (
+        Index("ix_eudr_suppliers_org_created", "org_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
@@ -269,6 +383,9 @@ class EudrSupplier(Base):
 
 class AiSystem(Base):
     __tablename__ = "ai_systems"
+    __table_args__ = (
+        Index("ix_ai_systems_org_created", "org_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
@@ -281,6 +398,10 @@ class AiSystem(Base):
 
 class AiIncident(Base):
     __tablename__ = "ai_incidents"
+    __table_args__ = (
+        Index("ix_ai_incidents_org_created", "org_id", "created_at", "id"),
+        Index("ix_ai_incidents_system", "system_id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
@@ -292,6 +413,9 @@ class AiIncident(Base):
 
 class EpdRecord(Base):
     __tablename__ = "epd_records"
+    __table_args__ = (
+        Index("ix_epd_records_org_created", "org_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
@@ -303,6 +427,9 @@ class EpdRecord(Base):
 
 class Nis2Attestation(Base):
     __tablename__ = "nis2_attestations"
+    __table_args__ = (
+        Index("ix_nis2_attestations_org_created", "org_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     org_id = Column(String(120), nullable=True, index=True)
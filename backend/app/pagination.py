@@ -0,0 +1,97 @@
+"""Keyset (cursor) pagination over ``(created_at, id)``.
+
+List endpoints return the page as a plain JSON array and advertise the cursors
+for the neighbouring pages in the ``X-Next-Cursor`` / ``X-Prev-Cursor`` headers.
+Pages are newest first; ``after`` walks towards older rows, ``before`` back
+towards newer ones. Each page costs one indexed range scan regardless of how
+deep into the table it is.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Sequence
+from uuid import UUID
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+PREV_CURSOR_HEADER = "X-Prev-Cursor"
+
+
+@dataclass(frozen=True)
+class CursorParams:
+    limit: int = DEFAULT_PAGE_SIZE
+    after: str | None = None
+    before: str | None = None
+
+
+def cursor_params(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: str | None = Query(None, description="Cursor from X-Next-Cursor; returns older rows"),
+    before: str | None = Query(None, description="Cursor from X-Prev-Cursor; returns newer rows"),
+) -> CursorParams:
+    if after and before:
+        raise HTTPException(status_code=400, detail="Use either 'after' or 'before', not both")
+    return CursorParams(limit=limit, after=after, before=before)
+
+
+def encode_cursor(row: Any) -> str:
+    raw = json.dumps([row.created_at.isoformat(), str(row.id)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), UUID(row_id)
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+
+
+def keyset(query: Any, model: Any, params: CursorParams) -> Any:
+    """Apply cursor filter, ordering and limit to a ``Query`` or ``Select``.
+
+    One extra row is fetched to detect whether another page exists; pass the
+    result rows to :func:`finish_page`.
+    """
+    key = tuple_(model.created_at, model.id)
+    if params.before:
+        query = query.filter(key > decode_cursor(params.before))
+        query = query.order_by(model.created_at.asc(), model.id.asc())
+    else:
+        if params.after:
+            query = query.filter(key < decode_cursor(params.after))
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+    return query.limit(params.limit + 1)
+
+
+def finish_page(rows: Sequence[Any], params: CursorParams, response: Response) -> list[Any]:
+    rows = list(rows)
+    has_more = len(rows) > params.limit
+    rows = rows[: params.limit]
+    if params.before:
+        rows.reverse()
+    if rows:
+        # Walking backwards we came from an older page, so there always is one.
+        if has_more or params.before:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1])
+        if params.after or (params.before and has_more):
+            response.headers[PREV_CURSOR_HEADER] = encode_cursor(rows[0])
+    return rows
+
+
+def paginate(query: Any, model: Any, params: CursorParams, response: Response) -> list[Any]:
+    return finish_page(keyset(query, model, params).all(), params, response)
+
+
+async def paginate_async(db: Any, stmt: Any, model: Any, params: CursorParams, response: Response) -> list[Any]:
+    rows = (await db.scalars(keyset(stmt, model, params))).all()
+    return finish_page(rows, params, response)
@@ -0,0 +1,73 @@
+"""QR rendering with a content-addressed cache on storage.
+
+A rendered image depends only on the encoded URL and the rendering options, so
+the storage key is a hash of exactly those inputs: entries never go stale and
+can be served with immutable caching headers.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from io import BytesIO
+
+import segno
+
+from .cache import TTLCache
+from .storage import get_storage
+
+CONTENT_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+ERROR_LEVELS = ("l", "m", "q", "h")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Hot images stay in memory so repeated requests skip the storage round-trip.
+qr_memory_cache = TTLCache(maxsize=4096, ttl=3600)
+
+
+@dataclass(frozen=True)
+class QrOptions:
+    kind: str = "png"
+    scale: int = 6
+    border: int | None = None
+    error: str | None = None
+
+    @property
+    def content_type(self) -> str:
+        return CONTENT_TYPES[self.kind]
+
+
+@dataclass(frozen=True)
+class QrImage:
+    body: bytes
+    digest: str
+    content_type: str
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+
+def render_qr(data: str, options: QrOptions) -> bytes:
+    qr = segno.make(data, micro=False, error=options.error)
+    buffer = BytesIO()
+    qr.save(buffer, kind=options.kind, scale=options.scale, border=options.border)
+    return buffer.getvalue()
+
+
+def qr_digest(data: str, options: QrOptions) -> str:
+    raw = "|".join([data, options.kind, str(options.scale), str(options.border), str(options.error)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_qr_image(data: str, options: QrOptions) -> QrImage:
+    digest = qr_digest(data, options)
+    body = qr_memory_cache.get(digest)
+    if body is None:
+        storage = get_storage()
+        key = f"qr/{digest[:2]}/{digest}.{options.kind}"
+        body = storage.get(key)
+        if body is None:
+            body = render_qr(data, options)
+            storage.put(key, body, content_type=options.content_type)
+        qr_memory_cache.set(digest, body)
+    return QrImage(body=body, digest=digest, content_type=options.content_type)
@@ -0,0 +1,104 @@
+"""Shared document rendering service.
+
+``render_document`` turns a renderer name plus its input dict into PDF bytes:
+
+* the cache key is a hash of the renderer, ``LAYOUT_VERSION`` and the input,
+  so any change to the entity (or to settings shown on the document) yields a
+  new key and stale renders are never served;
+* renders are stored on private storage under ``renders/<kind>/`` (they
+  include org-private documents) and reused by every worker; nothing reads a
+  stale key again, so :func:`prune_renders` (run by ``app.worker``) deletes
+  renders older than ``RENDER_CACHE_MAX_AGE_DAYS``;
+* misses run on the render process pool, keeping the GIL-bound layout work off
+  the worker serving API requests;
+* concurrent requests for the same document within a worker share one render.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from fastapi import Request, Response, status
+from starlette.concurrency import run_in_threadpool
+
+from . import documents
+from .executor import get_process_pool
+from .storage import get_private_storage
+
+RENDERERS: dict[str, Callable[[dict[str, Any]], bytes]] = {
+    "passport": documents.render_passport,
+    "cbam": documents.render_cbam_declaration,
+    "dop": documents.render_dop,
+}
+
+RENDER_PREFIX = "renders/"
+
+# Digest -> render in progress on this worker.
+_inflight: dict[str, asyncio.Task] = {}
+
+
+@dataclass(frozen=True)
+class RenderedDocument:
+    body: bytes
+    digest: str
+
+    @property
+    def etag(self) -> str:
+        return etag_for(self.digest)
+
+
+def etag_for(digest: str) -> str:
+    return f'"{digest[:32]}"'
+
+
+def render_digest(kind: str, context: dict[str, Any]) -> str:
+    raw = json.dumps([kind, documents.LAYOUT_VERSION, context], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def _render(kind: str, context: dict[str, Any], digest: str) -> bytes:
+    storage = get_private_storage()
+    key = f"{RENDER_PREFIX}{kind}/{digest[:2]}/{digest}.pdf"
+    body = await run_in_threadpool(storage.get, key)
+    if body is not None:
+        return body
+    pool = get_process_pool()
+    if pool is None:
+        body = await run_in_threadpool(RENDERERS[kind], context)
+    else:
+        body = await asyncio.get_running_loop().run_in_executor(pool, RENDERERS[kind], context)
+    await run_in_threadpool(storage.put, key, body, "application/pdf")
+    return body
+
+
+def prune_renders(max_age: timedelta) -> int:
+    """Delete cached renders written more than ``max_age`` ago; a later request renders again."""
+    return get_private_storage().prune(RENDER_PREFIX, datetime.utcnow() - max_age)
+
+
+async def render_document(kind: str, context: dict[str, Any]) -> RenderedDocument:
+    digest = render_digest(kind, context)
+    task = _inflight.get(digest)
+    if task is None:
+        task = asyncio.ensure_future(_render(kind, context, digest))
+        _inflight[digest] = task
+        task.add_done_callback(lambda _: _inflight.pop(digest, None))
+    # Shield so one client disconnecting does not cancel the render for the others.
+    body = await asyncio.shield(task)
+    return RenderedDocument(body=body, digest=digest)
+
+
+async def document_response(request: Request, kind: str, context: dict[str, Any], filename: str) -> Response:
+    """PDF download response; answers ``If-None-Match`` without rendering."""
+    etag = etag_for(render_digest(kind, context))
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in {tag.strip() for tag in request.headers.get("if-none-match", "").split(",")}:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    document = await render_document(kind, context)
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return Response(content=document.body, media_type="application/pdf", headers=headers)
@@ -0,0 +1,193 @@
+"""Materialised CBAM analytics: running totals in ``cbam_rollups``.
+
+One row per org, period, status, CN chapter (first two digits of the CN code),
+supplier name and country of origin holds the item count, tonnes, emissions
+and certificate cost of the matching items. Writers add signed deltas in the
+same transaction as the change itself:
+
+* creating a declaration or importing one adds its items;
+* appending, editing or deleting items adds the difference;
+* a status change moves them from the old status to the new one;
+* a recompute rebuilds the affected scope.
+
+Deltas are applied with ``INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x``,
+so concurrent writers add up instead of overwriting each other, and keys are
+written in sorted order so two transactions never lock them in opposite order.
+Rows whose count drops to zero are kept and filtered out by queries.
+:func:`rebuild` recomputes an org (or one period) from its items, e.g. to
+backfill after migrating.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Iterable, Sequence
+
+from sqlalchemy import Table, delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import get_settings
+from .factors import normalize_cn
+
+settings = get_settings()
+
+DIMENSIONS = ("period", "status", "cn_chapter", "supplier", "country")
+MEASURES = ("item_count", "quantity_tonnes", "total_emissions", "certificate_cost")
+UPSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+REBUILD_YIELD_PER = 5000
+
+ITEM_FIELDS = ("cn_code", "supplier_name", "country_of_origin", "quantity_tonnes", "calculated_emissions")
+RollupItem = tuple[Any, Any, Any, Any, Any]  # ITEM_FIELDS values
+# Dimension values -> [item_count, quantity_tonnes, total_emissions, certificate_cost]
+Deltas = dict[tuple[str, ...], list[float]]
+
+
+def add_items(
+    deltas: Deltas, period: str, status: str, price: float | None, items: Iterable[RollupItem], sign: int = 1
+) -> Deltas:
+    """Add (``sign=1``) or subtract (``sign=-1``) one declaration's items to ``deltas``."""
+    price = price or settings.cbam_certificate_price_per_tonne
+    for cn_code, supplier, country, quantity, emissions in items:
+        _add(deltas, (period, status, normalize_cn(cn_code)[:2], supplier or "", country or ""), sign, 1, quantity, emissions, price)
+    return deltas
+
+
+def _add(
+    deltas: Deltas, key: tuple[str, ...], sign: int, count: int, quantity: float | None, emissions: float | None, price: float
+) -> None:
+    totals = deltas.setdefault(key, [0, 0.0, 0.0, 0.0])
+    totals[0] += sign * count
+    totals[1] += sign * (quantity or 0)
+    totals[2] += sign * (emissions or 0)
+    totals[3] += sign * (emissions or 0) * price
+
+
+def rollup_item(item: Any) -> RollupItem:
+    """:data:`ITEM_FIELDS` of an item row (a dict) or ``CbamItem``."""
+    if isinstance(item, dict):
+        return tuple(item[name] for name in ITEM_FIELDS)
+    return tuple(getattr(item, name) for name in ITEM_FIELDS)
+
+
+def import_deltas(rows: Iterable[tuple[Table, dict[str, Any]]]) -> Deltas:
+    """Deltas for the ``(table, row)`` pairs of imported declarations (see :func:`app.bulk.import_rows`)."""
+    declarations: dict[Any, dict[str, Any]] = {}
+    items: dict[Any, list[RollupItem]] = {}
+    for table, row in rows:
+        if table is models.CbamDeclaration.__table__:
+            declarations[row["id"]] = row
+        elif table is models.CbamItem.__table__:
+            items.setdefault(row["declaration_id"], []).append(rollup_item(row))
+    deltas: Deltas = {}
+    for declaration_id, decl in declarations.items():
+        add_items(deltas, decl["period"], decl["status"], decl["certificate_price_per_tonne"], items.get(declaration_id, []))
+    return deltas
+
+
+def move_status(db: Session, org_id: str | None, decl: models.CbamDeclaration, status: str) -> None:
+    """Move ``decl``'s items from its current status to ``status``; runs in the caller's transaction.
+
+    Items are summed per CN code, supplier and country in SQL, so only the
+    distinct groups are read, not the items.
+    """
+    item = models.CbamItem
+    groups = db.execute(
+        select(
+            item.cn_code,
+            item.supplier_name,
+            item.country_of_origin,
+            func.count(),
+            func.sum(item.quantity_tonnes),
+            func.sum(item.calculated_emissions),
+        )
+        .where(item.declaration_id == decl.id)
+        .group_by(item.cn_code, item.supplier_name, item.country_of_origin)
+    )
+    price = decl.certificate_price_per_tonne or settings.cbam_certificate_price_per_tonne
+    deltas: Deltas = {}
+    for cn_code, supplier, country, count, quantity, emissions in groups:
+        dimensions = (normalize_cn(cn_code)[:2], supplier or "", country or "")
+        _add(deltas, (decl.period, decl.status, *dimensions), -1, count, quantity, emissions, price)
+        _add(deltas, (decl.period, status, *dimensions), 1, count, quantity, emissions, price)
+    apply_deltas(db, org_id, deltas)
+
+
+def apply_deltas(db: Session, org_id: str | None, deltas: Deltas) -> None:
+    """Add ``deltas`` to the org's rollup rows, creating missing ones; runs in the caller's transaction."""
+    if not deltas:
+        return
+    table = models.CbamRollup.__table__
+    insert = UPSERTS[db.get_bind().dialect.name](table)
+    now = datetime.utcnow()
+    statement = insert.on_conflict_do_update(
+        index_elements=[table.c.org_id, *(table.c[name] for name in DIMENSIONS)],
+        set_={
+            **{name: table.c[name] + insert.excluded[name] for name in MEASURES},
+            "updated_at": insert.excluded.updated_at,
+        },
+    )
+    db.execute(
+        statement,
+        [
+            {
+                "org_id": org_id,
+                **dict(zip(DIMENSIONS, key)),
+                **dict(zip(MEASURES, deltas[key])),
+                "updated_at": now,
+            }
+            for key in sorted(deltas)
+        ],
+    )
+
+
+def rebuild(db: Session, org_id: str, period: str | None = None) -> int:
+    """Recompute the org's rollups (optionally one period) from its items; returns the row count.
+
+    The caller commits.
+    """
+    rollup, decl, item = models.CbamRollup, models.CbamDeclaration, models.CbamItem
+    db.execute(delete(rollup).where(rollup.org_id == org_id, *([rollup.period == period] if period else [])))
+    rows = db.execute(
+        select(decl.period, decl.status, decl.certificate_price_per_tonne, *(getattr(item, name) for name in ITEM_FIELDS))
+        .join(decl, decl.id == item.declaration_id)
+        .where(decl.org_id == org_id, *([decl.period == period] if period else []))
+        .execution_options(yield_per=REBUILD_YIELD_PER)
+    )
+    deltas: Deltas = {}
+    for row in rows:
+        add_items(deltas, row.period, row.status, row.certificate_price_per_tonne, [row[3:]])
+    apply_deltas(db, org_id, deltas)
+    return len(deltas)
+
+
+def rollup_stmt(org_id: str, group_by: Sequence[str], filters: dict[str, str | None]) -> Any:
+    """Totals of the org's rollup rows grouped by ``group_by``.
+
+    ``filters`` match dimensions exactly, except ``period``, which also
+    matches as a prefix (``"2025"`` for the whole year).
+    """
+    rollup = models.CbamRollup
+    columns = [getattr(rollup, name) for name in group_by]
+    conditions = [rollup.org_id == org_id]
+    for name, value in filters.items():
+        if value is None:
+            continue
+        column = getattr(rollup, name)
+        conditions.append(column.startswith(value, autoescape=True) if name == "period" else column == value)
+    item_count = func.sum(rollup.item_count)
+    return (
+        select(
+            *columns,
+            item_count.label("item_count"),
+            func.sum(rollup.quantity_tonnes).label("quantity_tonnes"),
+            func.sum(rollup.total_emissions).label("total_emissions"),
+            func.sum(rollup.certificate_cost).label("certificate_cost"),
+        )
+        .where(*conditions)
+        .group_by(*columns)
+        .having(item_count > 0)
+        .order_by(*columns)
+    )
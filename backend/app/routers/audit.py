@@ -4,22 +4,32 @@ from __future__ import annotations
 
 from typing import List
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
 from ..auth import get_current_org
 from ..database import get_db
+from ..pagination import CursorParams, cursor_params, paginate
 
 router = APIRouter(prefix="/api/audit", tags=["audit"])
 
 
 @router.get("", response_model=List[schemas.AuditLogRead])
-def list_logs(db: Session = Depends(get_db), org=Depends(get_current_org)):
-    return (
-        db.query(models.AuditLog)
-        .filter(models.AuditLog.org_id == str(org.id))
-        .order_by(models.AuditLog.created_at.desc())
-        .limit(200)
-        .all()
-    )
+def list_logs(
+    response: Response,
+    entity: str | None = None,
+    entity_id: str | None = None,
+    action: str | None = None,
+    page: CursorParams = Depends(cursor_params),
+    db: Session = Depends(get_db),
+    org=Depends(get_current_org),
+):
+    query = db.query(models.AuditLog).filter(models.AuditLog.org_id == str(org.id))
+    if entity:
+        query = query.filter(models.AuditLog.entity == entity)
+    if entity_id:
+        query = query.filter(models.AuditLog.entity_id == entity_id)
+    if action:
+        query = query.filter(models.AuditLog.action == action)
+    return paginate(query, models.AuditLog, page, response)
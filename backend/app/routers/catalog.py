@@ -5,39 +5,45 @@ from __future__ import annotations
 from typing import List
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .. import models, schemas
-from ..auth import get_current_org
-from ..database import get_db
+from ..auth import get_current_org_async
+from ..database import get_async_db
+from ..pagination import CursorParams, cursor_params, paginate_async
 
 router = APIRouter(prefix="/api/catalog", tags=["catalog"])
 
 
 # Components
 @router.post("/components", response_model=schemas.ComponentRead, status_code=status.HTTP_201_CREATED)
-def create_component(payload: schemas.ComponentCreate, db: Session = Depends(get_db), org=Depends(get_current_org)):
+async def create_component(payload: schemas.ComponentCreate, db: AsyncSession = Depends(get_async_db), org=Depends(get_current_org_async)):
     record = models.Component(org_id=str(org.id), **payload.model_dump(exclude={"org_id"}))
     db.add(record)
-    db.commit()
-    db.refresh(record)
+    await db.commit()
+    await db.refresh(record)
     return record
 
 
 @router.get("/components", response_model=List[schemas.ComponentRead])
-def list_components(db: Session = Depends(get_db), org=Depends(get_current_org)):
-    return (
-        db.query(models.Component)
-        .filter(models.Component.org_id == str(org.id))
-        .order_by(models.Component.created_at.desc())
-        .all()
-    )
+async def list_components(
+    response: Response,
+    kind: str | None = None,
+    page: CursorParams = Depends(cursor_params),
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    stmt = select(models.Component).where(models.Component.org_id == str(org.id))
+    if kind:
+        stmt = stmt.where(models.Component.kind == kind)
+    return await paginate_async(db, stmt, models.Component, page, response)
 
 
 @router.get("/components/{component_id}", response_model=schemas.ComponentRead)
-def get_component(component_id: UUID, db: Session = Depends(get_db), org=Depends(get_current_org)):
-    record = db.get(models.Component, component_id)
+async def get_component(component_id: UUID, db: AsyncSession = Depends(get_async_db), org=Depends(get_current_org_async)):
+    record = await db.get(models.Component, component_id)
     if not record:
         raise HTTPException(status_code=404, detail="Component not found")
     if record.org_id and record.org_id != str(org.id):
@@ -46,44 +52,48 @@ def get_component(component_id: UUID, db: Session = Depends(get_db), org=Depends
 
 
 @router.patch("/components/{component_id}", response_model=schemas.ComponentRead)
-def update_component(
-    component_id: UUID, payload: schemas.ComponentUpdate, db: Session = Depends(get_db), org=Depends(get_current_org)
+async def update_component(
+    component_id: UUID, payload: schemas.ComponentUpdate, db: AsyncSession = Depends(get_async_db), org=Depends(get_current_org_async)
 ):
-    record = db.get(models.Component, component_id)
+    record = await db.get(models.Component, component_id)
     if not record:
         raise HTTPException(status_code=404, detail="Component not found")
     if record.org_id and record.org_id != str(org.id):
         raise HTTPException(status_code=404, detail="Component not found")
     for key, value in payload.model_dump(exclude_none=True, exclude={"org_id"}).items():
         setattr(record, key, value)
-    db.commit()
-    db.refresh(record)
+    await db.commit()
+    await db.refresh(record)
     return record
 
 
 # Templates
 @router.post("/templates", response_model=schemas.ProductTemplateRead, status_code=status.HTTP_201_CREATED)
-def create_template(payload: schemas.ProductTemplateCreate, db: Session = Depends(get_db), org=Depends(get_current_org)):
+async def create_template(payload: schemas.ProductTemplateCreate, db: AsyncSession = Depends(get_async_db), org=Depends(get_current_org_async)):
     record = models.ProductTemplate(org_id=str(org.id), **payload.model_dump())
     db.add(record)
-    db.commit()
-    db.refresh(record)
+    await db.commit()
+    await db.refresh(record)
     return record
 
 
 @router.get("/templates", response_model=List[schemas.ProductTemplateRead])
-def list_templates(db: Session = Depends(get_db), org=Depends(get_current_org)):
-    return (
-        db.query(models.ProductTemplate)
-        .filter(models.ProductTemplate.org_id == str(org.id))
-        .order_by(models.ProductTemplate.created_at.desc())
-        .all()
-    )
+async def list_templates(
+    response: Response,
+    battery_category: str | None = None,
+    page: CursorParams = Depends(cursor_params),
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    stmt = select(models.ProductTemplate).where(models.ProductTemplate.org_id == str(org.id))
+    if battery_category:
+        stmt = stmt.where(models.ProductTemplate.battery_category == battery_category)
+    return await paginate_async(db, stmt, models.ProductTemplate, page, response)
 
 
 @router.get("/templates/{template_id}", response_model=schemas.ProductTemplateRead)
-def get_template(template_id: UUID, db: Session = Depends(get_db), org=Depends(get_current_org)):
-    record = db.get(models.ProductTemplate, template_id)
+async def get_template(template_id: UUID, db: AsyncSession = Depends(get_async_db), org=Depends(get_current_org_async)):
+    record = await db.get(models.ProductTemplate, template_id)
     if not record:
         raise HTTPException(status_code=404, detail="Template not found")
     if record.org_id and record.org_id != str(org.id):
@@ -92,18 +102,18 @@ def get_template(template_id: UUID, db: Session = Depends(get_db), org=Depends(g
 
 
 @router.patch("/templates/{template_id}", response_model=schemas.ProductTemplateRead)
-def update_template(
-    template_id: UUID, payload: schemas.ProductTemplateUpdate, db: Session = Depends(get_db), org=Depends(get_current_org)
+async def update_template(
+    template_id: UUID, payload: schemas.ProductTemplateUpdate, db: AsyncSession = Depends(get_async_db), org=Depends(get_current_org_async)
 ):
-    record = db.get(models.ProductTemplate, template_id)
+    record = await db.get(models.ProductTemplate, template_id)
     if not record:
         raise HTTPException(status_code=404, detail="Template not found")
     if record.org_id and record.org_id != str(org.id):
         raise HTTPException(status_code=404, detail="Template not found")
     for key, value in payload.model_dump(exclude_none=True, exclude={"org_id"}).items():
         setattr(record, key, value)
-    db.commit()
-    db.refresh(record)
+    await db.commit()
+    await db.refresh(record)
     return record
 
 
@@ -112,28 +122,28 @@ def update_template(
     response_model=schemas.TemplateComponentRead,
     status_code=status.HTTP_201_CREATED,
 )
-def attach_component(
+async def attach_component(
     template_id: UUID,
     payload: schemas.TemplateComponentCreate,
-    db: Session = Depends(get_db),
-    org=Depends(get_current_org),
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
 ):
     if str(payload.template_id) != str(template_id):
         raise HTTPException(status_code=400, detail="template_id mismatch")
-    template = db.get(models.ProductTemplate, template_id)
+    template = await db.get(models.ProductTemplate, template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     if template.org_id and template.org_id != str(org.id):
         raise HTTPException(status_code=404, detail="Template not found")
-    component = db.get(models.Component, payload.component_id)
+    component = await db.get(models.Component, payload.component_id)
     if not component:
         raise HTTPException(status_code=404, detail="Component not found")
     if component.org_id and component.org_id != str(org.id):
         raise HTTPException(status_code=404, detail="Component not found")
     record = models.TemplateComponent(org_id=str(org.id), **payload.model_dump())
     db.add(record)
-    db.commit()
-    db.refresh(record)
+    await db.commit()
+    await db.refresh(record)
     return record
 
 
@@ -141,13 +151,15 @@ def attach_component(
     "/templates/{template_id}/components",
     response_model=List[schemas.TemplateComponentRead],
 )
-def list_template_components(template_id: UUID, db: Session = Depends(get_db), org=Depends(get_current_org)):
-    template = db.get(models.ProductTemplate, template_id)
+async def list_template_components(
+    template_id: UUID,
+    response: Response,
+    page: CursorParams = Depends(cursor_params),
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    template = await db.get(models.ProductTemplate, template_id)
     if not template or (template.org_id and template.org_id != str(org.id)):
         raise HTTPException(status_code=404, detail="Template not found")
-    return (
-        db.query(models.TemplateComponent)
-        .filter(models.TemplateComponent.template_id == template_id)
-        .order_by(models.TemplateComponent.created_at.desc())
-        .all()
-    )
+    stmt = select(models.TemplateComponent).where(models.TemplateComponent.template_id == template_id)
+    return await paginate_async(db, stmt, models.TemplateComponent, page, response)
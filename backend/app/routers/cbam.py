@@ -2,311 +2,625 @@
 
 from __future__ import annotations
 
-from typing import List
-from uuid import UUID
+from typing import Any, AsyncIterator, List, Literal, Sequence
+from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends, HTTPException, status
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from fpdf import FPDF
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .. import models, schemas
-from ..auth import get_current_org
+from ..auth import get_current_org_async
+from ..bulk import bulk_insert, cbam_lookup, item_rows
 from ..config import get_settings
-from ..database import get_db
+from ..csvstream import csv_response, csv_stream
+from ..database import async_session_scope, get_async_db, use_replica
+from ..emissions import RESOLVED_SOURCES, add_to_totals, compute_items, floats, item_emissions, recompute
+from ..factors import get_factor_index_async, invalidate_factor_index, suppliers_by_id_stmt
+from ..pagination import CursorParams, cursor_params, paginate_async
+from ..rendering import document_response
+from ..rollups import add_items, apply_deltas, move_status, rebuild, rollup_item, rollup_stmt
+from ..scenarios import run_scenarios
+from ..security import scope_session_to_org
 
 router = APIRouter(prefix="/api/cbam", tags=["cbam"])
 
-DEFAULT_FACTORS = {
-    "7208": 2.1,  # flat-rolled iron/steel
-    "7207": 2.4,  # semi-finished
-    "7210": 1.9,
-    "7601": 16.0,  # aluminum
-    "2523": 0.8,  # cement
-}
 settings = get_settings()
 CERT_PRICE_PER_TONNE = settings.cbam_certificate_price_per_tonne
+ITEM_STREAM_BATCH = 1000
 
 
-def calculate_emissions(item: models.CbamItem) -> float:
-    factor = item.verified_emission_factor or item.default_emission_factor or 0.0
-    return (item.quantity_tonnes or 0.0) * factor
-
-
-def render_pdf(decl: models.CbamDeclaration, items: list[models.CbamItem]) -> bytes:
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, f"CBAM Declaration {decl.period}", ln=1)
-    pdf.set_font("Arial", "", 12)
-    pdf.cell(0, 8, f"Status: {decl.status}", ln=1)
-    pdf.cell(0, 8, f"Total emissions: {decl.total_emissions or 0:.2f} tCO2e", ln=1)
-    pdf.cell(0, 8, f"Certificate price (€/t): {CERT_PRICE_PER_TONNE:.2f}", ln=1)
-    pdf.cell(
-        0,
-        8,
-        f"Certificate cost estimate: {decl.certificate_cost_estimate or 0:.2f} EUR",
-        ln=1,
+def declaration_emissions(items: List[models.CbamItem]) -> tuple[np.ndarray, np.ndarray]:
+    """``(factor used, emissions)`` arrays for stored items, in order."""
+    return item_emissions(
+        floats([item.quantity_tonnes for item in items]),
+        floats([item.verified_emission_factor for item in items]),
+        floats([item.default_emission_factor for item in items]),
     )
-    pdf.ln(4)
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 8, "Line Items", ln=1)
-    pdf.set_font("Arial", "", 11)
-    for item in items:
-        factor_used = item.verified_emission_factor or item.default_emission_factor or 0
-        supplier = item.supplier_name or "N/A"
-        pdf.multi_cell(
-            0,
-            6,
-            f"CN {item.cn_code} | Qty {item.quantity_tonnes} t | EF {factor_used} | Emissions {item.calculated_emissions or 0} | Supplier {supplier}",
+
+
+def declaration_read(decl: models.CbamDeclaration) -> schemas.CbamDeclarationRead:
+    """Response model for a declaration whose ``items`` are loaded."""
+    return schemas.CbamDeclarationRead.model_validate(decl)
+
+
+async def load_declaration(db: AsyncSession, declaration_id: UUID, org) -> models.CbamDeclaration:
+    """The org's declaration with its items (two queries), or 404."""
+    decl = await db.scalar(
+        select(models.CbamDeclaration)
+        .where(models.CbamDeclaration.id == declaration_id)
+        .options(selectinload(models.CbamDeclaration.items))
+        .execution_options(populate_existing=True)
+    )
+    if not decl or (decl.org_id and decl.org_id != str(org.id)):
+        raise HTTPException(status_code=404, detail="Declaration not found")
+    return decl
+
+
+async def declaration_header(db: AsyncSession, declaration_id: UUID, org) -> models.CbamDeclaration:
+    """The org's declaration without its items, or 404."""
+    decl = await db.get(models.CbamDeclaration, declaration_id)
+    if not decl or (decl.org_id and decl.org_id != str(org.id)):
+        raise HTTPException(status_code=404, detail="Declaration not found")
+    return decl
+
+
+async def declaration_summary(db: AsyncSession, decl: Any) -> schemas.CbamDeclarationSummary:
+    """``decl`` (a declaration or header row) as a summary with its item count, pending changes included."""
+    await db.flush()
+    summary = schemas.CbamDeclarationSummary.model_validate(decl)
+    summary.item_count = await db.scalar(
+        select(func.count()).select_from(models.CbamItem).where(models.CbamItem.declaration_id == decl.id)
+    )
+    return summary
+
+
+def item_filters(
+    cn_prefix: str | None = None,
+    supplier_id: UUID | None = None,
+    supplier_name: str | None = None,
+    country: str | None = None,
+) -> list[Any]:
+    """Item conditions; each is served by a ``(declaration_id, column, ...)`` index."""
+    item = models.CbamItem
+    conditions = []
+    if cn_prefix:
+        conditions.append(item.cn_code.startswith(cn_prefix, autoescape=True))
+    if supplier_id:
+        conditions.append(item.supplier_id == supplier_id)
+    if supplier_name:
+        conditions.append(item.supplier_name == supplier_name)
+    if country:
+        conditions.append(item.country_of_origin == country)
+    return conditions
+
+
+async def stream_items(declaration_id: UUID, org_id: str, replica: bool, conditions: Sequence[Any] = ()) -> AsyncIterator[list[Any]]:
+    """The declaration's items (all columns), oldest first, in partitions read through a server-side cursor.
+
+    Runs on its own org-scoped session: the request's session is closed
+    before a streamed body is sent.
+    """
+    item = models.CbamItem
+    stmt = (
+        select(*item.__table__.columns)
+        .where(item.declaration_id == declaration_id, *conditions)
+        .order_by(item.created_at, item.id)
+        .execution_options(yield_per=ITEM_STREAM_BATCH)
+    )
+    async with async_session_scope(replica=replica) as db:
+        scope_session_to_org(db.sync_session, org_id)
+        result = await db.stream(stmt)
+        async for rows in result.partitions(ITEM_STREAM_BATCH):
+            yield rows
+
+
+async def adjust_totals(db: AsyncSession, declaration_id: UUID, org, emissions: float) -> Any:
+    """Add ``emissions`` (and its cost at the declaration's price) to the totals; 404 if not the org's.
+
+    See :func:`app.emissions.add_to_totals`. Returns the updated header row;
+    :func:`declaration_summary` adds the item count once the items are written.
+    """
+    decl = models.CbamDeclaration
+    row = (
+        await db.execute(
+            add_to_totals(declaration_id, emissions)
+            .where(or_(decl.org_id.is_(None), decl.org_id == str(org.id)))
+            .returning(
+                decl.id,
+                decl.period,
+                decl.status,
+                decl.total_emissions,
+                decl.certificate_cost_estimate,
+                decl.certificate_price_per_tonne,
+                decl.created_at,
+                decl.updated_at,
+            )
         )
-    return pdf.output(dest="S").encode("latin1")
+    ).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Declaration not found")
+    return row
+
+
+async def locked_item(db: AsyncSession, declaration_id: UUID, item_id: UUID, org) -> models.CbamItem:
+    item = await db.scalar(
+        select(models.CbamItem)
+        .where(models.CbamItem.id == item_id, models.CbamItem.declaration_id == declaration_id)
+        .with_for_update()
+    )
+    if not item or (item.org_id and item.org_id != str(org.id)):
+        raise HTTPException(status_code=404, detail="Item not found")
+    return item
+
+
+def declaration_document(decl: models.CbamDeclaration) -> dict:
+    item_fields = [
+        "cn_code",
+        "quantity_tonnes",
+        "verified_emission_factor",
+        "default_emission_factor",
+        "calculated_emissions",
+        "supplier_name",
+    ]
+    return {
+        "period": decl.period,
+        "status": decl.status,
+        "total_emissions": decl.total_emissions,
+        "certificate_price_per_tonne": decl.certificate_price_per_tonne or CERT_PRICE_PER_TONNE,
+        "certificate_cost_estimate": decl.certificate_cost_estimate,
+        "items": [{field: getattr(item, field) for field in item_fields} for item in decl.items],
+    }
 
 
 @router.post("/declarations", response_model=schemas.CbamDeclarationRead, status_code=status.HTTP_201_CREATED)
-def create_declaration(payload: schemas.CbamDeclarationCreate, db: Session = Depends(get_db), org=Depends(get_current_org)):
+async def create_declaration(payload: schemas.CbamDeclarationCreate, db: AsyncSession = Depends(get_async_db), org=Depends(get_current_org_async)):
     declaration = models.CbamDeclaration(
+        id=uuid4(),
         org_id=str(org.id),
         period=payload.period,
         status=payload.status or "draft",
         certificate_price_per_tonne=payload.certificate_price_per_tonne or CERT_PRICE_PER_TONNE,
+        items=[],
     )
     db.add(declaration)
-    db.flush()
-
-    items: List[models.CbamItem] = []
-    for data in payload.items:
-        default_factor = data.default_emission_factor
-        if default_factor is None:
-            prefix = data.cn_code[:4]
-            # Lookup org-specific factor first
-            factor_entry = (
-                db.query(models.CbamFactor)
-                .filter(models.CbamFactor.org_id == str(org.id))
-                .filter(models.CbamFactor.cn_prefix == prefix)
-                .first()
+
+    factors = await get_factor_index_async(db, str(org.id))
+    supplier_ids = {data.supplier_id for data in payload.items if data.supplier_id}
+    suppliers = {}
+    if supplier_ids:
+        suppliers = {row.id: row for row in await db.execute(suppliers_by_id_stmt(str(org.id), supplier_ids))}
+    item_suppliers = [suppliers.get(data.supplier_id) for data in payload.items]
+    results = compute_items(
+        factors,
+        [data.cn_code for data in payload.items],
+        floats([data.quantity_tonnes for data in payload.items]),
+        floats([data.verified_emission_factor for data in payload.items]),
+        floats([data.default_emission_factor for data in payload.items]),
+        floats([supplier.default_emission_factor if supplier else None for supplier in item_suppliers]),
+    )
+    for data, supplier, default_factor, source, emissions in zip(
+        payload.items,
+        item_suppliers,
+        results.default_factor.tolist(),
+        results.factor_source.tolist(),
+        results.emissions.tolist(),
+    ):
+        declaration.items.append(
+            models.CbamItem(
+                declaration_id=declaration.id,
+                org_id=str(org.id),
+                cn_code=data.cn_code,
+                product_description=data.product_description,
+                quantity_tonnes=data.quantity_tonnes,
+                default_emission_factor=default_factor,
+                factor_source=source,
+                verified_emission_factor=data.verified_emission_factor,
+                calculated_emissions=emissions,
+                supplier_id=data.supplier_id,
+                supplier_name=supplier.name if supplier else data.supplier_name,
+                country_of_origin=data.country_of_origin,
             )
-            if factor_entry:
-                default_factor = factor_entry.emission_factor
-            else:
-                default_factor = DEFAULT_FACTORS.get(prefix, 0.0)
-        supplier_name = data.supplier_name
-        if data.supplier_id:
-            supplier = db.get(models.CbamSupplier, data.supplier_id)
-            if supplier and supplier.org_id == str(org.id):
-                supplier_name = supplier.name
-                if default_factor == 0 and supplier.default_emission_factor is not None:
-                    default_factor = supplier.default_emission_factor
-        item = models.CbamItem(
-            declaration_id=declaration.id,
-            org_id=str(org.id),
-            cn_code=data.cn_code,
-            product_description=data.product_description,
-            quantity_tonnes=data.quantity_tonnes,
-            default_emission_factor=default_factor,
-            verified_emission_factor=data.verified_emission_factor,
-            supplier_id=data.supplier_id,
-            supplier_name=supplier_name,
-            country_of_origin=data.country_of_origin,
         )
-        item.calculated_emissions = calculate_emissions(item)
-        items.append(item)
-        db.add(item)
-
-    declaration.total_emissions = sum(i.calculated_emissions or 0.0 for i in items)
-    price = declaration.certificate_price_per_tonne or CERT_PRICE_PER_TONNE
-    declaration.certificate_cost_estimate = (declaration.total_emissions or 0.0) * price
-    db.commit()
-    db.refresh(declaration)
-    return schemas.CbamDeclarationRead(
-        **declaration.__dict__,
-        items=[schemas.CbamItemRead.model_validate(item) for item in items],
-    )
-
 
-@router.get("/declarations", response_model=List[schemas.CbamDeclarationRead])
-def list_declarations(db: Session = Depends(get_db), org=Depends(get_current_org)):
-    declarations = (
-        db.query(models.CbamDeclaration)
-        .filter(models.CbamDeclaration.org_id == str(org.id))
-        .order_by(models.CbamDeclaration.created_at.desc())
-        .all()
+    total = float(results.emissions.sum())
+    declaration.total_emissions = total
+    declaration.certificate_cost_estimate = total * declaration.certificate_price_per_tonne
+    deltas = add_items(
+        {},
+        declaration.period,
+        declaration.status,
+        declaration.certificate_price_per_tonne,
+        map(rollup_item, declaration.items),
     )
-    results = []
-    for decl in declarations:
-        items = db.query(models.CbamItem).filter(models.CbamItem.declaration_id == decl.id).all()
-        results.append(
-            schemas.CbamDeclarationRead(
-                **decl.__dict__,
-                items=[schemas.CbamItemRead.model_validate(item) for item in items],
+    await db.run_sync(apply_deltas, str(org.id), deltas)
+    await db.commit()
+    return declaration_read(await load_declaration(db, declaration.id, org))
+
+
+@router.get("/declarations", response_model=List[schemas.CbamDeclarationSummary])
+async def list_declarations(
+    response: Response,
+    period: str | None = None,
+    declaration_status: str | None = Query(None, alias="status"),
+    page: CursorParams = Depends(cursor_params),
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    """Declaration headers with their item counts; fetch items from ``/declarations/{id}/items``."""
+    stmt = select(models.CbamDeclaration).where(models.CbamDeclaration.org_id == str(org.id))
+    if period:
+        stmt = stmt.where(models.CbamDeclaration.period == period)
+    if declaration_status:
+        stmt = stmt.where(models.CbamDeclaration.status == declaration_status)
+    declarations = await paginate_async(db, stmt, models.CbamDeclaration, page, response)
+    item = models.CbamItem
+    counts = dict(
+        (
+            await db.execute(
+                select(item.declaration_id, func.count())
+                .where(item.declaration_id.in_([decl.id for decl in declarations]))
+                .group_by(item.declaration_id)
             )
-        )
-    return results
+        ).all()
+    )
+    summaries = []
+    for decl in declarations:
+        summary = schemas.CbamDeclarationSummary.model_validate(decl)
+        summary.item_count = counts.get(decl.id, 0)
+        summaries.append(summary)
+    return summaries
 
 
-@router.get("/declarations/{declaration_id}", response_model=schemas.CbamDeclarationRead)
-def get_declaration(declaration_id: UUID, db: Session = Depends(get_db), org=Depends(get_current_org)):
-    decl = db.get(models.CbamDeclaration, declaration_id)
-    if not decl or (decl.org_id and decl.org_id != str(org.id)):
-        raise HTTPException(status_code=404, detail="Declaration not found")
-    items = db.query(models.CbamItem).filter(models.CbamItem.declaration_id == decl.id).all()
-    return schemas.CbamDeclarationRead(
-        **decl.__dict__,
-        items=[schemas.CbamItemRead.model_validate(item) for item in items],
+@router.get(
+    "/declarations/{declaration_id}",
+    response_model=schemas.CbamDeclarationRead | schemas.CbamDeclarationSummary,
+)
+async def get_declaration(
+    declaration_id: UUID,
+    include: Literal["items"] | None = Query(None, description="`items` embeds every item"),
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    """Declaration summary; ``?include=items`` embeds the items, otherwise page them from ``/items``."""
+    if include == "items":
+        return declaration_read(await load_declaration(db, declaration_id, org))
+    return await declaration_summary(db, await declaration_header(db, declaration_id, org))
+
+
+@router.get("/declarations/{declaration_id}/summary", response_model=schemas.CbamDeclarationSummary)
+async def get_declaration_summary(
+    declaration_id: UUID, db: AsyncSession = Depends(get_async_db), org=Depends(get_current_org_async)
+):
+    """Declaration header and totals without its items; fetch those from ``/items``."""
+    return await declaration_summary(db, await declaration_header(db, declaration_id, org))
+
+
+@router.get("/declarations/{declaration_id}/items", response_model=List[schemas.CbamItemRead])
+async def list_declaration_items(
+    declaration_id: UUID,
+    response: Response,
+    conditions: list = Depends(item_filters),
+    page: CursorParams = Depends(cursor_params),
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    await declaration_header(db, declaration_id, org)
+    stmt = select(models.CbamItem).where(models.CbamItem.declaration_id == declaration_id, *conditions)
+    return await paginate_async(db, stmt, models.CbamItem, page, response)
+
+
+@router.get(
+    "/declarations/{declaration_id}/items/stream", responses={200: {"content": {"application/x-ndjson": {}}}}
+)
+async def stream_declaration_items(
+    declaration_id: UUID,
+    request: Request,
+    conditions: list = Depends(item_filters),
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    """Every matching item as NDJSON, oldest first, read through a server-side cursor."""
+    await declaration_header(db, declaration_id, org)
+    partitions = stream_items(declaration_id, str(org.id), use_replica(request), conditions)
+
+    async def lines():
+        async for rows in partitions:
+            yield "".join(schemas.CbamItemRead.model_validate(row).model_dump_json() + "\n" for row in rows)
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="cbam_{declaration_id}_items.ndjson"'},
     )
 
 
-@router.post("/declarations/{declaration_id}/status", response_model=schemas.CbamDeclarationRead)
-def update_declaration_status(
+@router.post("/declarations/{declaration_id}/status", response_model=schemas.CbamDeclarationSummary)
+async def update_declaration_status(
     declaration_id: UUID,
     payload: schemas.CbamStatusUpdate,
-    db: Session = Depends(get_db),
-    org=Depends(get_current_org),
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
 ):
-    decl = db.get(models.CbamDeclaration, declaration_id)
+    # Row lock: concurrent status changes must each move the rollups from the status they saw.
+    decl = await db.get(models.CbamDeclaration, declaration_id, with_for_update=True)
     if not decl or (decl.org_id and decl.org_id != str(org.id)):
         raise HTTPException(status_code=404, detail="Declaration not found")
-    decl.status = payload.status
-    db.commit()
-    db.refresh(decl)
-    items = db.query(models.CbamItem).filter(models.CbamItem.declaration_id == decl.id).all()
-    return schemas.CbamDeclarationRead(
-        **decl.__dict__,
-        items=[schemas.CbamItemRead.model_validate(item) for item in items],
-    )
+    if payload.status != decl.status:
+        await db.run_sync(move_status, str(org.id), decl, payload.status)
+        decl.status = payload.status
+    summary = await declaration_summary(db, decl)
+    await db.commit()
+    return summary
+
+
+@router.post(
+    "/declarations/{declaration_id}/items", response_model=schemas.CbamItemsResult, status_code=status.HTTP_201_CREATED
+)
+async def append_items(
+    declaration_id: UUID,
+    payload: schemas.CbamItemsAppend,
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    """Append a tranche of items; the totals and rollups get the tranche's delta, existing items are not read."""
+    records = [data.model_dump() for data in payload.items]
+    lookup = await db.run_sync(cbam_lookup, str(org.id), [{"items": records}])
+    rows = item_rows(str(org.id), declaration_id, records, lookup)
+    decl = await adjust_totals(db, declaration_id, org, sum(row["calculated_emissions"] for row in rows))
+    await db.run_sync(bulk_insert, [(models.CbamItem.__table__, row) for row in rows])
+    deltas = add_items({}, decl.period, decl.status, decl.certificate_price_per_tonne, map(rollup_item, rows))
+    await db.run_sync(apply_deltas, str(org.id), deltas)
+    summary = await declaration_summary(db, decl)
+    await db.commit()
+    return {"declaration": summary, "items": rows}
+
+
+@router.patch("/declarations/{declaration_id}/items/{item_id}", response_model=schemas.CbamItemsResult)
+async def update_item(
+    declaration_id: UUID,
+    item_id: UUID,
+    payload: schemas.CbamItemUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    """Edit one item; looked-up factors are resolved again and the totals get the change in emissions."""
+    item = await locked_item(db, declaration_id, item_id, org)
+    before = rollup_item(item)
+    changes = payload.model_dump(exclude_none=True)
+    record = {field: getattr(item, field) for field in schemas.CbamItemBase.model_fields}
+    if item.factor_source in RESOLVED_SOURCES:
+        record["default_emission_factor"] = None
+    if "supplier_name" in changes and "supplier_id" not in changes:
+        record["supplier_id"] = None
+    record.update(changes)
+    lookup = await db.run_sync(cbam_lookup, str(org.id), [{"items": [record]}])
+    [row] = item_rows(str(org.id), declaration_id, [record], lookup)
+    for field in (*schemas.CbamItemBase.model_fields, "factor_source", "calculated_emissions"):
+        setattr(item, field, row[field])
+    decl = await adjust_totals(db, declaration_id, org, row["calculated_emissions"] - (before[-1] or 0))
+    deltas = add_items({}, decl.period, decl.status, decl.certificate_price_per_tonne, [before], sign=-1)
+    add_items(deltas, decl.period, decl.status, decl.certificate_price_per_tonne, [rollup_item(row)])
+    await db.run_sync(apply_deltas, str(org.id), deltas)
+    result = {"declaration": await declaration_summary(db, decl), "items": [schemas.CbamItemRead.model_validate(item)]}
+    await db.commit()
+    return result
+
+
+@router.delete("/declarations/{declaration_id}/items/{item_id}", response_model=schemas.CbamDeclarationSummary)
+async def delete_item(
+    declaration_id: UUID,
+    item_id: UUID,
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    """Delete one item and subtract it from the totals and rollups."""
+    item = await locked_item(db, declaration_id, item_id, org)
+    before = rollup_item(item)
+    await db.delete(item)
+    decl = await adjust_totals(db, declaration_id, org, -(before[-1] or 0))
+    deltas = add_items({}, decl.period, decl.status, decl.certificate_price_per_tonne, [before], sign=-1)
+    await db.run_sync(apply_deltas, str(org.id), deltas)
+    summary = await declaration_summary(db, decl)
+    await db.commit()
+    return summary
 
 
 @router.post("/suppliers", response_model=schemas.CbamSupplierRead, status_code=status.HTTP_201_CREATED)
-def create_supplier(payload: schemas.CbamSupplierCreate, db: Session = Depends(get_db), org=Depends(get_current_org)):
+async def create_supplier(payload: schemas.CbamSupplierCreate, db: AsyncSession = Depends(get_async_db), org=Depends(get_current_org_async)):
     record = models.CbamSupplier(
         org_id=str(org.id),
         **payload.model_dump(),
     )
     db.add(record)
-    db.commit()
-    db.refresh(record)
+    await db.commit()
+    await db.refresh(record)
     return record
 
 
 @router.get("/suppliers", response_model=List[schemas.CbamSupplierRead])
-def list_suppliers(db: Session = Depends(get_db), org=Depends(get_current_org)):
-    return (
-        db.query(models.CbamSupplier)
-        .filter(models.CbamSupplier.org_id == str(org.id))
-        .order_by(models.CbamSupplier.created_at.desc())
-        .all()
-    )
+async def list_suppliers(
+    response: Response,
+    country: str | None = None,
+    page: CursorParams = Depends(cursor_params),
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    stmt = select(models.CbamSupplier).where(models.CbamSupplier.org_id == str(org.id))
+    if country:
+        stmt = stmt.where(models.CbamSupplier.country == country)
+    return await paginate_async(db, stmt, models.CbamSupplier, page, response)
 
 
 @router.post("/factors", response_model=schemas.CbamFactorRead, status_code=status.HTTP_201_CREATED)
-def create_factor(payload: schemas.CbamFactorCreate, db: Session = Depends(get_db), org=Depends(get_current_org)):
+async def create_factor(payload: schemas.CbamFactorCreate, db: AsyncSession = Depends(get_async_db), org=Depends(get_current_org_async)):
     record = models.CbamFactor(org_id=str(org.id), **payload.model_dump())
     db.add(record)
-    db.commit()
-    db.refresh(record)
+    await db.commit()
+    invalidate_factor_index(str(org.id))
+    await db.refresh(record)
     return record
 
 
 @router.get("/factors", response_model=List[schemas.CbamFactorRead])
-def list_factors(db: Session = Depends(get_db), org=Depends(get_current_org)):
-    return (
-        db.query(models.CbamFactor)
-        .filter(models.CbamFactor.org_id == str(org.id))
-        .order_by(models.CbamFactor.created_at.desc())
-        .all()
-    )
+async def list_factors(
+    response: Response,
+    cn_prefix: str | None = None,
+    page: CursorParams = Depends(cursor_params),
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    stmt = select(models.CbamFactor).where(models.CbamFactor.org_id == str(org.id))
+    if cn_prefix:
+        stmt = stmt.where(models.CbamFactor.cn_prefix == cn_prefix)
+    return await paginate_async(db, stmt, models.CbamFactor, page, response)
 
 
-@router.get("/declarations/{declaration_id}/export/csv")
-def export_declaration_csv(declaration_id: UUID, db: Session = Depends(get_db), org=Depends(get_current_org)):
-    decl = db.get(models.CbamDeclaration, declaration_id)
-    if not decl or (decl.org_id and decl.org_id != str(org.id)):
-        raise HTTPException(status_code=404, detail="Declaration not found")
-    items = db.query(models.CbamItem).filter(models.CbamItem.declaration_id == decl.id).all()
-    headers = [
-        "cn_code",
-        "product_description",
-        "quantity_tonnes",
-        "default_emission_factor",
-        "verified_emission_factor",
-        "calculated_emissions",
-        "supplier_name",
-        "country_of_origin",
-        "supplier_name",
-        "verified_emission_factor",
-        "default_emission_factor",
-        "certificate_cost_estimate",
-    ]
-    lines = [",".join(headers)]
-    for item in items:
-        row = [
-            item.cn_code or "",
-            (item.product_description or "").replace(",", " "),
-            str(item.quantity_tonnes or ""),
-            str(item.default_emission_factor or ""),
-            str(item.verified_emission_factor or ""),
-            str(item.calculated_emissions or ""),
-            (item.supplier_name or "").replace(",", " "),
-            (item.country_of_origin or "").replace(",", " "),
-            str((item.calculated_emissions or 0) * CERT_PRICE_PER_TONNE),
-        ]
-        lines.append(",".join(row))
-    content = "\n".join(lines)
-    return StreamingResponse(
-        iter([content]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f'attachment; filename="cbam_{declaration_id}.csv"'},
-    )
+@router.post("/recompute", response_model=schemas.CbamRecomputeResult)
+async def recompute_declarations(
+    period: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    """Re-resolve looked-up factors and recompute emissions and totals, e.g. after a factor revision."""
+    result = await db.run_sync(recompute, str(org.id), period)
+    await db.commit()
+    return result
 
 
-@router.get("/declarations/{declaration_id}/export/pdf")
-def export_declaration_pdf(declaration_id: UUID, db: Session = Depends(get_db), org=Depends(get_current_org)):
-    decl = db.get(models.CbamDeclaration, declaration_id)
-    if not decl or (decl.org_id and decl.org_id != str(org.id)):
+@router.post("/scenarios", response_model=schemas.CbamScenarioResponse)
+async def evaluate_scenarios(
+    payload: schemas.CbamScenarioRequest,
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    """Certificate costs of stored declarations under price sweeps and factor adjustments; read-only."""
+    result = await db.run_sync(run_scenarios, str(org.id), payload)
+    if payload.declaration_id and not result["declarations"]:
         raise HTTPException(status_code=404, detail="Declaration not found")
-    items = db.query(models.CbamItem).filter(models.CbamItem.declaration_id == decl.id).all()
-    content = render_pdf(decl, items)
-    return StreamingResponse(
-        iter([content]),
-        media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename=\"cbam_{declaration_id}.pdf\"'},
+    return result
+
+
+@router.get("/rollups", response_model=List[schemas.CbamRollupRead])
+async def list_rollups(
+    group_by: List[schemas.CbamRollupDimension] = Query(default=["period"]),
+    period: str | None = None,
+    status: str | None = None,
+    cn_chapter: str | None = None,
+    supplier: str | None = None,
+    country: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    """Emissions and cost totals from the maintained rollups; ``period`` also matches as a prefix (``2025``)."""
+    filters = {"period": period, "status": status, "cn_chapter": cn_chapter, "supplier": supplier, "country": country}
+    rows = await db.execute(rollup_stmt(str(org.id), list(dict.fromkeys(group_by)), filters))
+    return [dict(row._mapping) for row in rows]
+
+
+@router.post("/rollups/rebuild", response_model=schemas.CbamRollupRebuildResult)
+async def rebuild_rollups(
+    period: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    """Recompute the org's rollups from its items, e.g. to backfill after migrating."""
+    rows = await db.run_sync(rebuild, str(org.id), period)
+    await db.commit()
+    return {"rows": rows}
+
+
+CSV_EXPORT_COLUMNS = (
+    "cn_code",
+    "product_description",
+    "quantity_tonnes",
+    "default_emission_factor",
+    "verified_emission_factor",
+    "calculated_emissions",
+    "supplier_name",
+    "country_of_origin",
+    "certificate_cost_estimate",
+)
+
+
+@router.get("/declarations/{declaration_id}/export/csv")
+async def export_declaration_csv(
+    declaration_id: UUID,
+    request: Request,
+    gzip: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    decl = await declaration_header(db, declaration_id, org)
+    price = decl.certificate_price_per_tonne or CERT_PRICE_PER_TONNE
+    partitions = stream_items(declaration_id, str(org.id), use_replica(request))
+
+    async def batches():
+        yield [CSV_EXPORT_COLUMNS]
+        async for items in partitions:
+            _, emissions = declaration_emissions(items)
+            yield (
+                [
+                    item.cn_code,
+                    item.product_description,
+                    item.quantity_tonnes,
+                    item.default_emission_factor,
+                    item.verified_emission_factor,
+                    item.calculated_emissions,
+                    item.supplier_name,
+                    item.country_of_origin,
+                    emitted * price,
+                ]
+                for item, emitted in zip(items, emissions.tolist())
+            )
+
+    return csv_response(csv_stream(batches()), f"cbam_{declaration_id}.csv", gzip)
+
+
+@router.get("/declarations/{declaration_id}/export/pdf", responses={200: {"content": {"application/pdf": {}}}})
+async def export_declaration_pdf(declaration_id: UUID, request: Request, db: AsyncSession = Depends(get_async_db), org=Depends(get_current_org_async)):
+    decl = await load_declaration(db, declaration_id, org)
+    return await document_response(
+        request, "cbam", declaration_document(decl), f"cbam_{declaration_id}.pdf"
     )
 
 
 @router.get("/declarations/{declaration_id}/export/eu")
-def export_declaration_eu_csv(declaration_id: UUID, db: Session = Depends(get_db), org=Depends(get_current_org)):
+async def export_declaration_eu_csv(
+    declaration_id: UUID,
+    request: Request,
+    gzip: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
     # EU-format style CSV (simplified): period, status, cert price, item rows with CN, qty, EF used, emissions, cost.
-    decl = db.get(models.CbamDeclaration, declaration_id)
-    if not decl or (decl.org_id and decl.org_id != str(org.id)):
-        raise HTTPException(status_code=404, detail="Declaration not found")
-    items = db.query(models.CbamItem).filter(models.CbamItem.declaration_id == decl.id).all()
+    decl = await declaration_header(db, declaration_id, org)
     price = decl.certificate_price_per_tonne or CERT_PRICE_PER_TONNE
-    lines = [
-        "period,status,cert_price_per_tonne,total_emissions,total_cost",
-        f"{decl.period},{decl.status},{price},{decl.total_emissions or 0},{decl.certificate_cost_estimate or 0}",
-        "",
-        "cn_code,quantity_tonnes,factor_used,emissions,cost,supplier,country",
-    ]
-    for item in items:
-        factor_used = item.verified_emission_factor or item.default_emission_factor or 0
-        emissions = (item.quantity_tonnes or 0) * factor_used
-        cost = emissions * price
-        lines.append(
-            ",".join(
+    partitions = stream_items(declaration_id, str(org.id), use_replica(request))
+
+    async def batches():
+        yield [
+            ("period", "status", "cert_price_per_tonne", "total_emissions", "total_cost"),
+            (decl.period, decl.status, price, decl.total_emissions or 0, decl.certificate_cost_estimate or 0),
+            (),
+            ("cn_code", "quantity_tonnes", "factor_used", "emissions", "cost", "supplier", "country"),
+        ]
+        async for items in partitions:
+            factors_used, emissions = declaration_emissions(items)
+            yield (
                 [
-                    item.cn_code or "",
-                    str(item.quantity_tonnes or ""),
-                    str(factor_used),
-                    str(emissions),
-                    str(cost),
-                    (item.supplier_name or "").replace(",", " "),
-                    (item.country_of_origin or "").replace(",", " "),
+                    item.cn_code,
+                    item.quantity_tonnes,
+                    factor_used,
+                    emitted,
+                    emitted * price,
+                    item.supplier_name,
+                    item.country_of_origin,
                 ]
+                for item, factor_used, emitted in zip(items, factors_used.tolist(), emissions.tolist())
             )
-        )
-    content = "\n".join(lines)
-    return StreamingResponse(
-        iter([content]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f'attachment; filename=\"cbam_{declaration_id}_eu.csv\"'},
-    )
+
+    return csv_response(csv_stream(batches()), f"cbam_{declaration_id}_eu.csv", gzip)
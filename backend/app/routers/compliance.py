@@ -5,13 +5,14 @@ from __future__ import annotations
 from typing import List
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
 from ..auth import get_current_org
 from ..database import get_db
+from ..pagination import CursorParams, cursor_params, paginate
 
 router = APIRouter(prefix="/api/compliance", tags=["compliance"])
 
@@ -32,13 +33,14 @@ def create_cra_product(payload: schemas.CraProductCreate, db: Session = Depends(
 
 
 @router.get("/cra/products", response_model=List[schemas.CraProductRead])
-def list_cra_products(db: Session = Depends(get_db), org=Depends(get_current_org)):
-    return (
-        db.query(models.CraProduct)
-        .filter(models.CraProduct.org_id == str(org.id))
-        .order_by(models.CraProduct.created_at.desc())
-        .all()
-    )
+def list_cra_products(
+    response: Response,
+    page: CursorParams = Depends(cursor_params),
+    db: Session = Depends(get_db),
+    org=Depends(get_current_org),
+):
+    query = db.query(models.CraProduct).filter(models.CraProduct.org_id == str(org.id))
+    return paginate(query, models.CraProduct, page, response)
 
 
 @router.get("/cra/products/{product_id}", response_model=schemas.CraProductRead)
@@ -61,13 +63,14 @@ def create_eudr_supplier(payload: schemas.EudrSupplierCreate, db: Session = Depe
 
 
 @router.get("/eudr/suppliers", response_model=List[schemas.EudrSupplierRead])
-def list_eudr_suppliers(db: Session = Depends(get_db), org=Depends(get_current_org)):
-    return (
-        db.query(models.EudrSupplier)
-        .filter(models.EudrSupplier.org_id == str(org.id))
-        .order_by(models.EudrSupplier.created_at.desc())
-        .all()
-    )
+def list_eudr_suppliers(
+    response: Response,
+    page: CursorParams = Depends(cursor_params),
+    db: Session = Depends(get_db),
+    org=Depends(get_current_org),
+):
+    query = db.query(models.EudrSupplier).filter(models.EudrSupplier.org_id == str(org.id))
+    return paginate(query, models.EudrSupplier, page, response)
 
 
 # AI Act
@@ -81,13 +84,14 @@ def create_ai_system(payload: schemas.AiSystemCreate, db: Session = Depends(get_
 
 
 @router.get("/ai/systems", response_model=List[schemas.AiSystemRead])
-def list_ai_systems(db: Session = Depends(get_db), org=Depends(get_current_org)):
-    return (
-        db.query(models.AiSystem)
-        .filter(models.AiSystem.org_id == str(org.id))
-        .order_by(models.AiSystem.created_at.desc())
-        .all()
-    )
+def list_ai_systems(
+    response: Response,
+    page: CursorParams = Depends(cursor_params),
+    db: Session = Depends(get_db),
+    org=Depends(get_current_org),
+):
+    query = db.query(models.AiSystem).filter(models.AiSystem.org_id == str(org.id))
+    return paginate(query, models.AiSystem, page, response)
 
 
 @router.post("/ai/incidents", response_model=schemas.AiIncidentRead, status_code=status.HTTP_201_CREATED)
@@ -103,13 +107,14 @@ def create_ai_incident(payload: schemas.AiIncidentCreate, db: Session = Depends(
 
 
 @router.get("/ai/incidents", response_model=List[schemas.AiIncidentRead])
-def list_ai_incidents(db: Session = Depends(get_db), org=Depends(get_current_org)):
-    return (
-        db.query(models.AiIncident)
-        .filter(models.AiIncident.org_id == str(org.id))
-        .order_by(models.AiIncident.created_at.desc())
-        .all()
-    )
+def list_ai_incidents(
+    response: Response,
+    page: CursorParams = Depends(cursor_params),
+    db: Session = Depends(get_db),
+    org=Depends(get_current_org),
+):
+    query = db.query(models.AiIncident).filter(models.AiIncident.org_id == str(org.id))
+    return paginate(query, models.AiIncident, page, response)
 
 
 # EPD
@@ -123,13 +128,14 @@ def create_epd_record(payload: schemas.EpdRecordCreate, db: Session = Depends(ge
 
 
 @router.get("/epd/records", response_model=List[schemas.EpdRecordRead])
-def list_epd_records(db: Session = Depends(get_db), org=Depends(get_current_org)):
-    return (
-        db.query(models.EpdRecord)
-        .filter(models.EpdRecord.org_id == str(org.id))
-        .order_by(models.EpdRecord.created_at.desc())
-        .all()
-    )
+def list_epd_records(
+    response: Response,
+    page: CursorParams = Depends(cursor_params),
+    db: Session = Depends(get_db),
+    org=Depends(get_current_org),
+):
+    query = db.query(models.EpdRecord).filter(models.EpdRecord.org_id == str(org.id))
+    return paginate(query, models.EpdRecord, page, response)
 
 
 @router.get("/epd/records/export/placeholder")
@@ -155,13 +161,14 @@ def create_attestation(payload: schemas.Nis2AttestationCreate, db: Session = Dep
 
 
 @router.get("/nis2/attestations", response_model=List[schemas.Nis2AttestationRead])
-def list_attestations(db: Session = Depends(get_db), org=Depends(get_current_org)):
-    return (
-        db.query(models.Nis2Attestation)
-        .filter(models.Nis2Attestation.org_id == str(org.id))
-        .order_by(models.Nis2Attestation.created_at.desc())
-        .all()
-    )
+def list_attestations(
+    response: Response,
+    page: CursorParams = Depends(cursor_params),
+    db: Session = Depends(get_db),
+    org=Depends(get_current_org),
+):
+    query = db.query(models.Nis2Attestation).filter(models.Nis2Attestation.org_id == str(org.id))
+    return paginate(query, models.Nis2Attestation, page, response)
 
 
 @router.get("/export/placeholder")
@@ -1,36 +1,117 @@
-"""Import and export job scaffolding."""
+"""Import and export jobs.
+
+The API only records and queues jobs; ``python -m app.worker`` processes them
+(see ``app.worker`` and ``app.tasks``).
+"""
 
 from __future__ import annotations
 
+from datetime import datetime
 from typing import List
-from uuid import UUID
+from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, File, Form, Query, Response, status, HTTPException, UploadFile
+from fastapi.responses import RedirectResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
 from ..auth import get_current_org
+from ..config import get_settings
 from ..database import get_db
+from ..importers import FORMATS, IMPORT_MODELS, source_format
+from ..pagination import CursorParams, cursor_params, paginate
+from ..storage import COPY_CHUNK_SIZE, StorageError, get_private_storage
+from ..tasks import export_content_type, export_key
+
 router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+settings = get_settings()
+
+
+def enqueue(db: Session, record):
+    """Queue a pending or failed job for the worker; other states are returned unchanged.
+
+    A failed import resumes after its last checkpoint.
+    """
+    if record.status not in {"pending", "failed"}:
+        return record
+    record.status = "queued"
+    record.attempts = 0
+    record.next_run_at = datetime.utcnow()
+    record.error = None
+    db.commit()
+    db.refresh(record)
+    return record
 
 
 @router.post("/imports", response_model=schemas.ImportJobRead, status_code=status.HTTP_201_CREATED)
 def create_import_job(payload: schemas.ImportJobCreate, db: Session = Depends(get_db), org=Depends(get_current_org)):
-    record = models.ImportJob(org_id=str(org.id), kind=payload.kind, payload=payload.payload or {}, status="pending")
+    record = models.ImportJob(
+        org_id=str(org.id),
+        kind=payload.kind,
+        payload=payload.payload or {},
+        status="pending",
+        max_attempts=settings.job_max_attempts,
+    )
     db.add(record)
     db.commit()
     db.refresh(record)
     return record
 
 
-@router.get("/imports", response_model=List[schemas.ImportJobRead])
-def list_import_jobs(db: Session = Depends(get_db), org=Depends(get_current_org)):
-    return (
-        db.query(models.ImportJob)
-        .filter(models.ImportJob.org_id == str(org.id))
-        .order_by(models.ImportJob.created_at.desc())
-        .all()
+@router.post("/imports/upload", response_model=schemas.ImportJobRead, status_code=status.HTTP_201_CREATED)
+def upload_import_job(
+    kind: str = Form(...),
+    file: UploadFile = File(...),
+    file_format: str | None = Form(None, alias="format", description="csv or ndjson; inferred from the file name"),
+    dry_run: bool = Form(False, description="Only validate the rows and report errors; write nothing"),
+    db: Session = Depends(get_db),
+    org=Depends(get_current_org),
+):
+    """Create an import job from a CSV / NDJSON file; the rows are read by the worker, not stored on the job."""
+    if kind not in IMPORT_MODELS:
+        raise HTTPException(status_code=400, detail=f"Unsupported import kind: {kind}")
+    fmt = file_format or source_format(file.filename, file.content_type)
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail="Upload a .csv or .ndjson file or pass format=csv|ndjson")
+
+    job_id = uuid4()
+    key = f"imports/{org.id}/{job_id}.{fmt}"
+    try:
+        size = get_private_storage().put_file(key, file.file, FORMATS[fmt])
+    except StorageError as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+    payload: dict = {"source": {"key": key, "format": fmt, "filename": file.filename, "size": size}}
+    if dry_run:
+        payload["dry_run"] = True
+    record = models.ImportJob(
+        id=job_id,
+        org_id=str(org.id),
+        kind=kind,
+        payload=payload,
+        status="pending",
+        max_attempts=settings.job_max_attempts,
     )
+    db.add(record)
+    db.commit()
+    db.refresh(record)
+    return record
+
+
+@router.get("/imports", response_model=List[schemas.ImportJobRead])
+def list_import_jobs(
+    response: Response,
+    kind: str | None = None,
+    job_status: str | None = Query(None, alias="status"),
+    page: CursorParams = Depends(cursor_params),
+    db: Session = Depends(get_db),
+    org=Depends(get_current_org),
+):
+    query = db.query(models.ImportJob).filter(models.ImportJob.org_id == str(org.id))
+    if kind:
+        query = query.filter(models.ImportJob.kind == kind)
+    if job_status:
+        query = query.filter(models.ImportJob.status == job_status)
+    return paginate(query, models.ImportJob, page, response)
 
 
 @router.get("/imports/{job_id}", response_model=schemas.ImportJobRead)
@@ -41,79 +122,48 @@ def get_import_job(job_id: UUID, db: Session = Depends(get_db), org=Depends(get_
     return record
 
 
-@router.post("/imports/{job_id}/run", response_model=schemas.ImportJobRead)
-def run_import_job(job_id: UUID, db: Session = Depends(get_db), org=Depends(get_current_org)):
+@router.post("/imports/{job_id}/run", response_model=schemas.ImportJobRead, status_code=status.HTTP_202_ACCEPTED)
+def run_import_job(
+    job_id: UUID,
+    restart: bool = Query(False, description="Discard the checkpoint and row errors and start over"),
+    db: Session = Depends(get_db),
+    org=Depends(get_current_org),
+):
     record = db.get(models.ImportJob, job_id)
     if not record or record.org_id != str(org.id):
         raise HTTPException(status_code=404, detail="Import job not found")
-    if record.status not in {"pending", "failed"}:
-        return record
-
-    payload = record.payload or {}
-    records = payload.get("records") or []
-    created = 0
-    errors: List[str] = []
-
-    try:
-        if record.kind == "components":
-            for item in records:
-                model = models.Component(org_id=str(org.id), **item)
-                db.add(model)
-                created += 1
-        elif record.kind == "templates":
-            for item in records:
-                model = models.ProductTemplate(org_id=str(org.id), **item)
-                db.add(model)
-                created += 1
-        elif record.kind == "passports":
-            for item in records:
-                model = models.BatteryPassport(org_id=str(org.id), **item)
-                db.add(model)
-                created += 1
-        elif record.kind == "cbam":
-            for decl in records:
-                declaration = models.CbamDeclaration(
-                    org_id=str(org.id),
-                    period=decl.get("period", "unknown"),
-                    status=decl.get("status", "draft"),
-                )
-                db.add(declaration)
-                db.flush()
-                for item in decl.get("items", []):
-                    cbam_item = models.CbamItem(
-                        declaration_id=declaration.id,
-                        org_id=str(org.id),
-                        cn_code=item.get("cn_code", ""),
-                        product_description=item.get("product_description"),
-                        quantity_tonnes=item.get("quantity_tonnes", 0),
-                        default_emission_factor=item.get("default_emission_factor"),
-                        verified_emission_factor=item.get("verified_emission_factor"),
-                        supplier_name=item.get("supplier_name"),
-                        country_of_origin=item.get("country_of_origin"),
-                    )
-                    cbam_item.calculated_emissions = (
-                        cbam_item.quantity_tonnes or 0
-                    ) * (cbam_item.verified_emission_factor or cbam_item.default_emission_factor or 0)
-                    db.add(cbam_item)
-                created += 1
-        else:
-            errors.append(f"Unsupported import kind: {record.kind}")
-        db.commit()
-        record.status = "completed" if not errors else "failed"
-        record.result = {"created": created}
-        record.error = "; ".join(errors) if errors else None
-    except Exception as exc:  # noqa: BLE001
-        db.rollback()
-        record.status = "failed"
-        record.error = str(exc)
-    db.commit()
-    db.refresh(record)
-    return record
+    if restart and record.status in {"pending", "failed"}:
+        db.query(models.ImportJobError).filter(models.ImportJobError.job_id == record.id).delete()
+        record.checkpoint = 0
+        record.rows_created = 0
+        record.rows_failed = 0
+    return enqueue(db, record)
+
+
+@router.get("/imports/{job_id}/errors", response_model=List[schemas.ImportJobErrorRead])
+def list_import_job_errors(
+    job_id: UUID,
+    response: Response,
+    page: CursorParams = Depends(cursor_params),
+    db: Session = Depends(get_db),
+    org=Depends(get_current_org),
+):
+    record = db.get(models.ImportJob, job_id)
+    if not record or record.org_id != str(org.id):
+        raise HTTPException(status_code=404, detail="Import job not found")
+    query = db.query(models.ImportJobError).filter(models.ImportJobError.job_id == record.id)
+    return paginate(query, models.ImportJobError, page, response)
 
 
 @router.post("/exports", response_model=schemas.ExportJobRead, status_code=status.HTTP_201_CREATED)
 def create_export_job(payload: schemas.ExportJobCreate, db: Session = Depends(get_db), org=Depends(get_current_org)):
-    record = models.ExportJob(org_id=str(org.id), kind=payload.kind, payload=payload.payload or {}, status="pending")
+    record = models.ExportJob(
+        org_id=str(org.id),
+        kind=payload.kind,
+        payload=payload.payload or {},
+        status="pending",
+        max_attempts=settings.job_max_attempts,
+    )
     db.add(record)
     db.commit()
     db.refresh(record)
@@ -121,13 +171,20 @@ def create_export_job(payload: schemas.ExportJobCreate, db: Session = Depends(ge
 
 
 @router.get("/exports", response_model=List[schemas.ExportJobRead])
-def list_export_jobs(db: Session = Depends(get_db), org=Depends(get_current_org)):
-    return (
-        db.query(models.ExportJob)
-        .filter(models.ExportJob.org_id == str(org.id))
-        .order_by(models.ExportJob.created_at.desc())
-        .all()
-    )
+def list_export_jobs(
+    response: Response,
+    kind: str | None = None,
+    job_status: str | None = Query(None, alias="status"),
+    page: CursorParams = Depends(cursor_params),
+    db: Session = Depends(get_db),
+    org=Depends(get_current_org),
+):
+    query = db.query(models.ExportJob).filter(models.ExportJob.org_id == str(org.id))
+    if kind:
+        query = query.filter(models.ExportJob.kind == kind)
+    if job_status:
+        query = query.filter(models.ExportJob.status == job_status)
+    return paginate(query, models.ExportJob, page, response)
 
 
 @router.get("/exports/{job_id}", response_model=schemas.ExportJobRead)
@@ -138,85 +195,44 @@ def get_export_job(job_id: UUID, db: Session = Depends(get_db), org=Depends(get_
     return record
 
 
-@router.post("/exports/{job_id}/run", response_model=schemas.ExportJobRead)
+@router.post("/exports/{job_id}/run", response_model=schemas.ExportJobRead, status_code=status.HTTP_202_ACCEPTED)
 def run_export_job(job_id: UUID, db: Session = Depends(get_db), org=Depends(get_current_org)):
     record = db.get(models.ExportJob, job_id)
     if not record or record.org_id != str(org.id):
         raise HTTPException(status_code=404, detail="Export job not found")
-    if record.status not in {"pending", "failed"}:
-        return record
+    return enqueue(db, record)
+
 
+@router.get("/exports/{job_id}/download")
+def download_export(job_id: UUID, db: Session = Depends(get_db), org=Depends(get_current_org)):
+    """Hand out a completed export's file from private storage.
+
+    On S3 this redirects to a short-lived presigned URL; local files are streamed.
+    """
+    record = db.get(models.ExportJob, job_id)
+    if not record or record.org_id != str(org.id):
+        raise HTTPException(status_code=404, detail="Export job not found")
+    filename = (record.result or {}).get("filename")
+    if record.status != "completed" or not filename:
+        raise HTTPException(status_code=409, detail="Export is not ready")
+    storage = get_private_storage()
+    key = export_key(record.org_id, filename)
     try:
-        if record.kind == "passports":
-            passports = (
-                db.query(models.BatteryPassport)
-                .filter(models.BatteryPassport.org_id == str(org.id))
-                .order_by(models.BatteryPassport.created_at.desc())
-                .all()
-            )
-            headers = [
-                "id",
-                "battery_model",
-                "gtin",
-                "serial_number",
-                "battery_category",
-                "battery_weight_kg",
-                "rated_capacity_kwh",
-                "carbon_footprint_kg_per_kwh",
-            ]
-            lines = [",".join(headers)]
-            for p in passports:
-                lines.append(
-                    ",".join(
-                        [
-                            str(p.id),
-                            (p.battery_model or "").replace(",", " "),
-                            p.gtin,
-                            p.serial_number,
-                            p.battery_category,
-                            str(p.battery_weight_kg),
-                            str(p.rated_capacity_kwh),
-                            str(p.carbon_footprint_kg_per_kwh),
-                        ]
-                    )
-                )
-            record.result = {"csv": "\n".join(lines)}
-            record.status = "completed"
-        elif record.kind == "cbam":
-            declarations = (
-                db.query(models.CbamDeclaration)
-                .filter(models.CbamDeclaration.org_id == str(org.id))
-                .order_by(models.CbamDeclaration.created_at.desc())
-                .all()
-            )
-            payloads = []
-            for decl in declarations:
-                items = db.query(models.CbamItem).filter(models.CbamItem.declaration_id == decl.id).all()
-                payloads.append(
-                    {
-                        "id": str(decl.id),
-                        "period": decl.period,
-                        "status": decl.status,
-                        "total_emissions": decl.total_emissions,
-                        "items": [
-                            {
-                                "cn_code": i.cn_code,
-                                "quantity_tonnes": i.quantity_tonnes,
-                                "calculated_emissions": i.calculated_emissions,
-                            }
-                            for i in items
-                        ],
-                    }
-                )
-            record.result = {"json": payloads}
-            record.status = "completed"
-        else:
-            record.status = "failed"
-            record.error = f"Unsupported export kind: {record.kind}"
-    except Exception as exc:  # noqa: BLE001
-        db.rollback()
-        record.status = "failed"
-        record.error = str(exc)
-    db.commit()
-    db.refresh(record)
-    return record
+        url = storage.download_url(key, filename)
+        if url:
+            return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+        source = storage.open_read(key)
+    except StorageError:
+        raise HTTPException(status_code=404, detail="Export file not found")
+
+    def chunks():
+        try:
+            while chunk := source.read(COPY_CHUNK_SIZE):
+                yield chunk
+        finally:
+            source.close()
+
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if record.result.get("bytes") is not None:
+        headers["Content-Length"] = str(record.result["bytes"])
+    return StreamingResponse(chunks(), media_type=export_content_type(filename), headers=headers)
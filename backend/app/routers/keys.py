@@ -6,12 +6,13 @@ import secrets
 from typing import List
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
-from ..auth import hash_key
+from ..auth import hash_key, invalidate_key
 from ..database import get_db
+from ..pagination import CursorParams, cursor_params, paginate
 
 router = APIRouter(prefix="/api/keys", tags=["api-keys"])
 
@@ -46,11 +47,16 @@ def create_key(payload: schemas.ApiKeyCreate, db: Session = Depends(get_db)):
 
 
 @router.get("", response_model=List[schemas.ApiKeyRead])
-def list_keys(org_id: UUID | None = None, db: Session = Depends(get_db)):
-    query = db.query(models.ApiKey).order_by(models.ApiKey.created_at.desc())
+def list_keys(
+    response: Response,
+    org_id: UUID | None = None,
+    page: CursorParams = Depends(cursor_params),
+    db: Session = Depends(get_db),
+):
+    query = db.query(models.ApiKey)
     if org_id:
         query = query.filter(models.ApiKey.org_id == org_id)
-    return query.all()
+    return paginate(query, models.ApiKey, page, response)
 
 
 @router.post("/{key_id}/revoke", response_model=schemas.ApiKeyRead)
@@ -60,5 +66,6 @@ def revoke_key(key_id: UUID, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="API key not found")
     record.revoked = record.revoked or record.created_at
     db.commit()
+    invalidate_key(record.key)
     db.refresh(record)
     return record
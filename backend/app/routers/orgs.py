@@ -4,11 +4,12 @@ from __future__ import annotations
 
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
 from ..database import get_db
+from ..pagination import CursorParams, cursor_params, paginate
 
 router = APIRouter(prefix="/api/orgs", tags=["orgs"])
 
@@ -26,8 +27,8 @@ def create_org(payload: schemas.OrgCreate, db: Session = Depends(get_db)):
 
 
 @router.get("", response_model=List[schemas.OrgRead])
-def list_orgs(db: Session = Depends(get_db)):
-    return db.query(models.Organization).order_by(models.Organization.created_at.desc()).all()
+def list_orgs(response: Response, page: CursorParams = Depends(cursor_params), db: Session = Depends(get_db)):
+    return paginate(db.query(models.Organization), models.Organization, page, response)
 
 
 @router.post("/{org_id}/users", response_model=schemas.UserRead, status_code=status.HTTP_201_CREATED)
@@ -43,13 +44,14 @@ def create_user(org_id: str, payload: schemas.UserCreate, db: Session = Depends(
 
 
 @router.get("/{org_id}/users", response_model=List[schemas.UserRead])
-def list_users(org_id: str, db: Session = Depends(get_db)):
+def list_users(
+    org_id: str,
+    response: Response,
+    page: CursorParams = Depends(cursor_params),
+    db: Session = Depends(get_db),
+):
     org = db.get(models.Organization, org_id)
     if not org:
         raise HTTPException(status_code=404, detail="Organization not found")
-    return (
-        db.query(models.User)
-        .filter(models.User.org_id == org.id)
-        .order_by(models.User.created_at.desc())
-        .all()
-    )
+    query = db.query(models.User).filter(models.User.org_id == org.id)
+    return paginate(query, models.User, page, response)
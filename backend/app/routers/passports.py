@@ -1,29 +1,74 @@
-"""Passport CRUD and QR endpoints."""
+"""Passport CRUD, QR and label sheet endpoints."""
 
 from __future__ import annotations
 
-from io import BytesIO
-from typing import List
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import List, Literal
 from uuid import UUID
 
-import segno
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
-from fpdf import FPDF
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
 from .. import models, schemas
-from ..auth import get_current_org
+from ..auth import get_current_org_async
+from ..cache import TTLCache
 from ..config import get_settings
-from ..database import get_db
+from ..database import async_session_scope, get_async_db, mark_recent_write, recent_writes
+from ..labels import LabelLayoutError, build_label_sheet, label_layout, label_selection, sheet_labels
+from ..pagination import CursorParams, cursor_params, paginate_async
+from ..qr import IMMUTABLE_CACHE_CONTROL, QrOptions, get_qr_image
+from ..rendering import document_response
+from ..storage import StorageError
 
 router = APIRouter(prefix="/api/passports", tags=["passports"])
 settings = get_settings()
 
 
+@dataclass(frozen=True)
+class PublicPayload:
+    body: bytes
+    etag: str
+    last_modified: str
+
+
+# Serialized public views keyed by passport id; update_passport invalidates.
+public_cache = TTLCache(maxsize=settings.public_cache_size, ttl=settings.public_cache_ttl_seconds)
+
+
+def build_public_payload(record: models.BatteryPassport) -> PublicPayload:
+    body = schemas.BatteryPassportPublic.model_validate(record).model_dump_json().encode("utf-8")
+    updated_at = record.updated_at.replace(tzinfo=timezone.utc)
+    return PublicPayload(
+        body=body,
+        etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+        last_modified=format_datetime(updated_at, usegmt=True),
+    )
+
+
+def not_modified(request: Request, payload: PublicPayload) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or payload.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(payload.last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
 def record_audit(
-    db: Session,
+    db: AsyncSession,
     action: str,
     entity: str,
     entity_id: str,
@@ -41,11 +86,32 @@ def record_audit(
     db.add(entry)
 
 
+def filter_passports(
+    stmt,
+    battery_category: str | None = None,
+    battery_status: str | None = None,
+    battery_model: str | None = None,
+    gtin: str | None = None,
+    template_id: UUID | None = None,
+):
+    if battery_category:
+        stmt = stmt.where(models.BatteryPassport.battery_category == battery_category)
+    if battery_status:
+        stmt = stmt.where(models.BatteryPassport.battery_status == battery_status)
+    if battery_model:
+        stmt = stmt.where(models.BatteryPassport.battery_model == battery_model)
+    if gtin:
+        stmt = stmt.where(models.BatteryPassport.gtin == gtin)
+    if template_id:
+        stmt = stmt.where(models.BatteryPassport.template_id == template_id)
+    return stmt
+
+
 @router.post("", response_model=schemas.BatteryPassportRead, status_code=status.HTTP_201_CREATED)
-def create_passport(
+async def create_passport(
     passport: schemas.BatteryPassportCreate,
-    db: Session = Depends(get_db),
-    org=Depends(get_current_org),
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
 ):
     record = models.BatteryPassport(org_id=str(org.id), **passport.model_dump())
     db.add(record)
@@ -58,27 +124,94 @@ def create_passport(
         details={"origin": "manual"},
     )
     try:
-        db.commit()
+        await db.commit()
     except IntegrityError as exc:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail="Serial number must be unique") from exc
-    db.refresh(record)
+    await db.refresh(record)
     return record
 
 
 @router.get("", response_model=List[schemas.BatteryPassportRead])
-def list_passports(db: Session = Depends(get_db), org=Depends(get_current_org)):
-    return (
-        db.query(models.BatteryPassport)
-        .filter(models.BatteryPassport.org_id == str(org.id))
-        .order_by(models.BatteryPassport.created_at.desc())
-        .all()
+async def list_passports(
+    response: Response,
+    battery_category: str | None = None,
+    battery_status: str | None = None,
+    battery_model: str | None = None,
+    gtin: str | None = None,
+    template_id: UUID | None = None,
+    page: CursorParams = Depends(cursor_params),
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    stmt = filter_passports(
+        select(models.BatteryPassport).where(models.BatteryPassport.org_id == str(org.id)),
+        battery_category=battery_category,
+        battery_status=battery_status,
+        battery_model=battery_model,
+        gtin=gtin,
+        template_id=template_id,
+    )
+    return await paginate_async(db, stmt, models.BatteryPassport, page, response)
+
+
+@router.post(
+    "/labels",
+    responses={
+        200: {"content": {"application/pdf": {}}},
+        202: {"model": schemas.ExportJobRead, "description": "Sheet queued as a `labels` export job"},
+    },
+    response_class=Response,
+)
+async def label_sheet(
+    payload: schemas.LabelSheetRequest,
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
+):
+    """Render small sheets in the request; larger ones are queued for the worker as an export job."""
+    layout = label_layout(payload)
+    try:
+        layout.validate()
+    except LabelLayoutError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    limit = settings.label_sheet_max_labels
+    rows = (await db.execute(label_selection(str(org.id), payload, limit + 1))).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="No passports match the selection")
+    if len(rows) > limit:
+        raise HTTPException(status_code=400, detail=f"Selection exceeds {limit} labels; narrow the filter")
+
+    if len(rows) > settings.label_sheet_sync_max_labels:
+        job = models.ExportJob(
+            org_id=str(org.id),
+            kind="labels",
+            payload=payload.model_dump(mode="json"),
+            status="queued",
+            attempts=0,
+            max_attempts=settings.job_max_attempts,
+            next_run_at=datetime.utcnow(),
+        )
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=jsonable_encoder(schemas.ExportJobRead.model_validate(job)),
+            headers={"Location": f"/api/jobs/exports/{job.id}"},
+        )
+
+    content = await run_in_threadpool(build_label_sheet, sheet_labels(rows), layout)
+    return Response(
+        content,
+        media_type="application/pdf",
+        headers={"Content-Disposition": 'attachment; filename="passport_labels.pdf"'},
     )
 
 
 @router.get("/{passport_id}", response_model=schemas.BatteryPassportRead)
-def get_passport(passport_id: UUID, db: Session = Depends(get_db), org=Depends(get_current_org)):
-    record = db.get(models.BatteryPassport, passport_id)
+async def get_passport(passport_id: UUID, db: AsyncSession = Depends(get_async_db), org=Depends(get_current_org_async)):
+    record = await db.get(models.BatteryPassport, passport_id)
     if not record:
         raise HTTPException(status_code=404, detail="Passport not found")
     if record.org_id and record.org_id != str(org.id):
@@ -87,13 +220,13 @@ def get_passport(passport_id: UUID, db: Session = Depends(get_db), org=Depends(g
 
 
 @router.patch("/{passport_id}", response_model=schemas.BatteryPassportRead)
-def update_passport(
+async def update_passport(
     passport_id: UUID,
     updates: schemas.BatteryPassportUpdate,
-    db: Session = Depends(get_db),
-    org=Depends(get_current_org),
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
 ):
-    record = db.get(models.BatteryPassport, passport_id)
+    record = await db.get(models.BatteryPassport, passport_id)
     if not record:
         raise HTTPException(status_code=404, detail="Passport not found")
     if record.org_id and record.org_id != str(org.id):
@@ -109,11 +242,15 @@ def update_passport(
             org_id=str(org.id),
             details={"updated_fields": list(updates.model_dump(exclude_none=True).keys())},
         )
-        db.commit()
+        await db.commit()
     except IntegrityError as exc:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail="Serial number must be unique") from exc
-    db.refresh(record)
+    # Keep refills of the public view off lagging replicas for a moment; mark
+    # before invalidating so no refill in between can read a replica.
+    mark_recent_write(f"passport:{passport_id}")
+    public_cache.invalidate(passport_id)
+    await db.refresh(record)
     return record
 
 
@@ -122,12 +259,12 @@ def update_passport(
     response_model=schemas.BatteryPassportRead,
     status_code=status.HTTP_201_CREATED,
 )
-def create_from_template(
+async def create_from_template(
     payload: schemas.BatteryPassportFromTemplate,
-    db: Session = Depends(get_db),
-    org=Depends(get_current_org),
+    db: AsyncSession = Depends(get_async_db),
+    org=Depends(get_current_org_async),
 ):
-    template = db.get(models.ProductTemplate, payload.template_id)
+    template = await db.get(models.ProductTemplate, payload.template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     if template.org_id and template.org_id != str(org.id):
@@ -188,10 +325,8 @@ def create_from_template(
 
     # Snapshot linked components for traceability
     template_components = (
-        db.query(models.TemplateComponent)
-        .filter(models.TemplateComponent.template_id == template.id)
-        .all()
-    )
+        await db.scalars(select(models.TemplateComponent).where(models.TemplateComponent.template_id == template.id))
+    ).all()
     combined["component_snapshot"] = [
         {
             "component_id": str(item.component_id),
@@ -212,39 +347,64 @@ def create_from_template(
         details={"origin": "template", "template_id": str(template.id)},
     )
     try:
-        db.commit()
+        await db.commit()
     except IntegrityError as exc:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail="Serial number must be unique") from exc
-    db.refresh(record)
+    await db.refresh(record)
     return record
 
 
 @router.get("/{passport_id}/public", response_model=schemas.BatteryPassportPublic)
-def get_public(passport_id: UUID, db: Session = Depends(get_db)):
-    record = db.get(models.BatteryPassport, passport_id)
-    if not record:
-        raise HTTPException(status_code=404, detail="Passport not found")
-    return record
+async def get_public(passport_id: UUID, request: Request, db: AsyncSession = Depends(get_async_db)):
+    payload = public_cache.get(passport_id)
+    if payload is None:
+        if recent_writes.peek(f"passport:{passport_id}") is not None:
+            async with async_session_scope() as primary:
+                record = await primary.get(models.BatteryPassport, passport_id)
+        else:
+            record = await db.get(models.BatteryPassport, passport_id)
+        if not record:
+            raise HTTPException(status_code=404, detail="Passport not found")
+        payload = build_public_payload(record)
+        public_cache.set(passport_id, payload)
+    headers = {
+        "ETag": payload.etag,
+        "Last-Modified": payload.last_modified,
+        "Cache-Control": settings.public_cache_control,
+    }
+    if not_modified(request, payload):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
 
 
 @router.get(
     "/{passport_id}/qr",
-    responses={200: {"content": {"image/png": {}}}},
-    response_class=StreamingResponse,
+    responses={200: {"content": {"image/png": {}, "image/svg+xml": {}}}},
+    response_class=Response,
 )
-def get_qr(passport_id: UUID):
-    target_url = f"{settings.base_public_url}/{passport_id}"
-    qr = segno.make(target_url, micro=False)
-    buffer = BytesIO()
-    qr.save(buffer, kind="png", scale=6)
-    buffer.seek(0)
-    return StreamingResponse(buffer, media_type="image/png")
+def get_qr(
+    passport_id: UUID,
+    request: Request,
+    kind: Literal["png", "svg"] = Query("png", alias="format"),
+    scale: int = Query(6, ge=1, le=40),
+    border: int | None = Query(None, ge=0, le=20, description="Quiet zone in modules (default 4)"),
+    error: Literal["l", "m", "q", "h"] | None = Query(None, description="Error correction level"),
+):
+    options = QrOptions(kind=kind, scale=scale, border=border, error=error)
+    try:
+        image = get_qr_image(f"{settings.base_public_url}/{passport_id}", options)
+    except StorageError as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+    headers = {"ETag": image.etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if image.etag in {tag.strip() for tag in request.headers.get("if-none-match", "").split(",")}:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=image.body, media_type=image.content_type, headers=headers)
 
 
 @router.get("/{passport_id}/export/jsonld")
-def export_jsonld(passport_id: UUID, db: Session = Depends(get_db)):
-    record = db.get(models.BatteryPassport, passport_id)
+async def export_jsonld(passport_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    record = await db.get(models.BatteryPassport, passport_id)
     if not record:
         raise HTTPException(status_code=404, detail="Passport not found")
     data = {
@@ -273,36 +433,25 @@ def export_jsonld(passport_id: UUID, db: Session = Depends(get_db)):
     return JSONResponse(content=data)
 
 
-@router.get("/{passport_id}/export/pdf")
-def export_pdf(passport_id: UUID, db: Session = Depends(get_db)):
-    record = db.get(models.BatteryPassport, passport_id)
+def passport_document(record: models.BatteryPassport) -> dict:
+    fields = [
+        "battery_model",
+        "manufacturer_name",
+        "gtin",
+        "serial_number",
+        "battery_category",
+        "rated_capacity_kwh",
+        "battery_weight_kg",
+        "carbon_footprint_kg_per_kwh",
+        "hazardous_substances",
+        "additional_public_data",
+    ]
+    return {field: getattr(record, field) for field in fields}
+
+
+@router.get("/{passport_id}/export/pdf", responses={200: {"content": {"application/pdf": {}}}})
+async def export_pdf(passport_id: UUID, request: Request, db: AsyncSession = Depends(get_async_db)):
+    record = await db.get(models.BatteryPassport, passport_id)
     if not record:
         raise HTTPException(status_code=404, detail="Passport not found")
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Battery Passport", ln=1)
-    pdf.set_font("Arial", "", 11)
-    pdf.cell(0, 8, f"Model: {record.battery_model}", ln=1)
-    pdf.cell(0, 8, f"Manufacturer: {record.manufacturer_name}", ln=1)
-    pdf.cell(0, 8, f"GTIN: {record.gtin}", ln=1)
-    pdf.cell(0, 8, f"Serial: {record.serial_number}", ln=1)
-    pdf.cell(0, 8, f"Category: {record.battery_category}", ln=1)
-    pdf.cell(0, 8, f"Capacity (kWh): {record.rated_capacity_kwh}", ln=1)
-    pdf.cell(0, 8, f"Weight (kg): {record.battery_weight_kg}", ln=1)
-    pdf.cell(0, 8, f"Carbon footprint: {record.carbon_footprint_kg_per_kwh} kg/kWh", ln=1)
-    pdf.ln(4)
-    pdf.cell(0, 8, f"Hazardous substances: {record.hazardous_substances or 'N/A'}", ln=1)
-    if record.additional_public_data:
-        pdf.ln(4)
-        pdf.set_font("Arial", "B", 12)
-        pdf.cell(0, 8, "Additional public data", ln=1)
-        pdf.set_font("Arial", "", 11)
-        for k, v in record.additional_public_data.items():
-            pdf.cell(0, 6, f"{k}: {v}", ln=1)
-    content = pdf.output(dest="S").encode("latin1")
-    return StreamingResponse(
-        iter([content]),
-        media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename=\"passport_{passport_id}.pdf\"'},
-    )
+    return await document_response(request, "passport", passport_document(record), f"passport_{passport_id}.pdf")
@@ -0,0 +1,160 @@
+"""CBAM what-if scenarios: certificate price sweeps and factor adjustments.
+
+Stored declarations are evaluated read-only. The items' factors used form one
+row per scenario (the baseline first, then each requested scenario with its
+adjustments applied in order), so emissions for a block of scenarios are a
+single ``scenarios x items`` array product and the per-declaration totals a
+``reduceat`` over the items, which are loaded grouped by declaration. Blocks
+are sized to ``SCENARIO_BLOCK_CELLS`` to bound memory on large periods.
+
+Costs come out two ways: at each declaration's own certificate price, and
+for every swept price (total emissions times price), summarised as a
+distribution.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .config import get_settings
+from .emissions import floats, item_emissions
+from .factors import normalize_cn
+
+settings = get_settings()
+
+SCENARIO_BLOCK_CELLS = 2_000_000
+BASELINE = "baseline"
+
+
+def _items_mask(items: dict[str, np.ndarray], adjustment: schemas.CbamScenarioAdjustment) -> np.ndarray:
+    mask = np.ones(len(items["quantity"]), dtype=bool)
+    if adjustment.cn_prefix:
+        mask &= np.char.startswith(items["cn_code"], normalize_cn(adjustment.cn_prefix))
+    if adjustment.supplier_id:
+        mask &= items["supplier_id"] == str(adjustment.supplier_id)
+    if adjustment.supplier_name:
+        mask &= items["supplier_name"] == adjustment.supplier_name
+    if adjustment.country_of_origin:
+        mask &= items["country"] == adjustment.country_of_origin.upper()
+    if adjustment.factor_basis:
+        mask &= items["verified"] if adjustment.factor_basis == "verified" else ~items["verified"]
+    return mask
+
+
+def _apply(factors: np.ndarray, items: dict[str, np.ndarray], scenario: schemas.CbamScenario) -> None:
+    """Apply ``scenario``'s adjustments in order to one row of factors, in place."""
+    for adjustment in scenario.adjustments:
+        mask = _items_mask(items, adjustment)
+        if adjustment.emission_factor is not None:
+            factors[mask] = adjustment.emission_factor
+        else:
+            factors[mask] *= adjustment.scale
+
+
+def sweep_prices(request: schemas.CbamScenarioRequest) -> np.ndarray:
+    prices = floats(request.prices)
+    if request.price_range is not None:
+        bounds = request.price_range
+        prices = np.concatenate([prices, np.linspace(bounds.start, bounds.stop, bounds.steps)])
+    return prices
+
+
+def distribution(costs: np.ndarray) -> dict[str, float] | None:
+    if not len(costs):
+        return None
+    p5, p50, p95 = np.percentile(costs, [5, 50, 95]).tolist()
+    return {
+        "min": float(costs.min()),
+        "p5": p5,
+        "p50": p50,
+        "p95": p95,
+        "max": float(costs.max()),
+        "mean": float(costs.mean()),
+    }
+
+
+def run_scenarios(db: Session, org_id: str, request: schemas.CbamScenarioRequest) -> dict[str, Any]:
+    """Evaluate the request's scenarios against the org's declarations; never writes."""
+    decl, item = models.CbamDeclaration, models.CbamItem
+    scope = [decl.org_id == org_id]
+    if request.declaration_id:
+        scope.append(decl.id == request.declaration_id)
+    if request.period:
+        scope.append(decl.period.startswith(request.period, autoescape=True))
+    declarations = db.execute(
+        select(decl.id, decl.period, decl.certificate_price_per_tonne).where(*scope).order_by(decl.period, decl.id)
+    ).all()
+    position = {row.id: index for index, row in enumerate(declarations)}
+    rows = db.execute(
+        select(
+            item.declaration_id,
+            item.cn_code,
+            item.quantity_tonnes,
+            item.verified_emission_factor,
+            item.default_emission_factor,
+            item.supplier_id,
+            item.supplier_name,
+            item.country_of_origin,
+        )
+        .join(decl, decl.id == item.declaration_id)
+        .where(*scope)
+    ).all()
+    rows.sort(key=lambda row: position[row.declaration_id])
+
+    quantity = floats([row.quantity_tonnes for row in rows])
+    verified = floats([row.verified_emission_factor for row in rows])
+    base_factors, _ = item_emissions(quantity, verified, floats([row.default_emission_factor for row in rows]))
+    quantity = np.nan_to_num(quantity)
+    items = {
+        "quantity": quantity,
+        "verified": ~np.isnan(verified) & (verified != 0),
+        "cn_code": np.array([normalize_cn(row.cn_code) for row in rows], dtype=str),
+        "supplier_id": np.array([str(row.supplier_id) if row.supplier_id else "" for row in rows], dtype=object),
+        "supplier_name": np.array([row.supplier_name or "" for row in rows], dtype=object),
+        "country": np.array([(row.country_of_origin or "").upper() for row in rows], dtype=object),
+    }
+
+    groups = np.array([position[row.declaration_id] for row in rows], dtype=np.intp)
+    filled, starts = np.unique(groups, return_index=True)
+    scenarios = [schemas.CbamScenario(name=BASELINE), *request.scenarios]
+    totals = np.zeros((len(scenarios), len(declarations)))
+    block = max(1, SCENARIO_BLOCK_CELLS // max(len(rows), 1))
+    for first in range(0, len(scenarios), block):
+        chunk = scenarios[first : first + block]
+        factors = np.tile(base_factors, (len(chunk), 1))
+        for row, scenario in zip(factors, chunk):
+            _apply(row, items, scenario)
+        if len(rows):
+            totals[first : first + len(chunk), filled] = np.add.reduceat(factors * quantity, starts, axis=1)
+
+    own_prices = floats([row.certificate_price_per_tonne or settings.cbam_certificate_price_per_tonne for row in declarations])
+    own_costs = totals * own_prices
+    prices = sweep_prices(request)
+    emissions = totals.sum(axis=1)
+    costs = np.outer(emissions, prices)
+    results = []
+    for index, scenario in enumerate(scenarios):
+        result: dict[str, Any] = {
+            "name": scenario.name,
+            "total_emissions": float(emissions[index]),
+            "certificate_cost_estimate": float(own_costs[index].sum()),
+            "costs": costs[index].tolist(),
+            "distribution": distribution(costs[index]),
+        }
+        if request.include_declarations:
+            result["declarations"] = [
+                {
+                    "id": row.id,
+                    "period": row.period,
+                    "total_emissions": float(totals[index, column]),
+                    "certificate_cost_estimate": float(own_costs[index, column]),
+                }
+                for column, row in enumerate(declarations)
+            ]
+        results.append(result)
+    return {"declarations": len(declarations), "items": len(rows), "prices": prices.tolist(), "scenarios": results}
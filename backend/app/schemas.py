@@ -3,11 +3,11 @@
 from __future__ import annotations
 
 from datetime import date, datetime
-from typing import Dict, Optional, List
+from typing import Any, Dict, Literal, Optional, List
 from uuid import UUID
 
-from pydantic import BaseModel, ConfigDict
-from pydantic import field_validator
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field
+from pydantic import field_validator, model_validator
 
 
 class OrgCreate(BaseModel):
@@ -255,6 +255,20 @@ class BatteryPassportPublic(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class LabelSheetRequest(BaseModel):
+    passport_ids: Optional[List[UUID]] = None
+    battery_category: Optional[str] = None
+    battery_status: Optional[str] = None
+    battery_model: Optional[str] = None
+    gtin: Optional[str] = None
+    template_id: Optional[UUID] = None
+    columns: int = Field(default=3, ge=1, le=10)
+    rows: int = Field(default=8, ge=1, le=20)
+    page_size: Literal["A4", "Letter"] = "A4"
+    margin_mm: float = Field(default=10.0, ge=0, le=40)
+    error: Optional[Literal["l", "m", "q", "h"]] = None
+
+
 class ComponentBase(BaseModel):
     name: str
     kind: Optional[str] = None
@@ -372,7 +386,9 @@ class RestrictedArtifactBase(BaseModel):
     kind: str
     title: str
     url: Optional[str] = None
-    metadata: Optional[Dict[str, str]] = None
+    metadata: Optional[Dict[str, str]] = Field(
+        default=None, validation_alias=AliasChoices("metadata_", "metadata")
+    )
 
 
 class RestrictedArtifactCreate(RestrictedArtifactBase):
@@ -548,7 +564,7 @@ class Nis2AttestationRead(Nis2AttestationBase):
 
 class ImportJobCreate(BaseModel):
     kind: str
-    payload: Optional[Dict[str, str]] = None
+    payload: Optional[Dict[str, Any]] = None
 
 
 class ImportJobRead(BaseModel):
@@ -556,18 +572,36 @@ class ImportJobRead(BaseModel):
     org_id: Optional[str] = None
     kind: str
     status: str
-    payload: Optional[Dict[str, str]] = None
-    result: Optional[Dict[str, str]] = None
+    payload: Optional[Dict[str, Any]] = None
+    result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
+    attempts: int = 0
+    max_attempts: int
+    next_run_at: Optional[datetime] = None
+    checkpoint: int = 0
+    rows_created: int = 0
+    rows_failed: int = 0
     created_at: datetime
     updated_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class ImportJobErrorRead(BaseModel):
+    id: UUID
+    job_id: UUID
+    line: int
+    record: Optional[Dict[str, Any]] = None
+    error: str
+    details: Optional[List[Dict[str, Any]]] = None
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class ExportJobCreate(BaseModel):
     kind: str
-    payload: Optional[Dict[str, str]] = None
+    payload: Optional[Dict[str, Any]] = None
 
 
 class ExportJobRead(BaseModel):
@@ -575,9 +609,12 @@ class ExportJobRead(BaseModel):
     org_id: Optional[str] = None
     kind: str
     status: str
-    payload: Optional[Dict[str, str]] = None
-    result: Optional[Dict[str, str]] = None
+    payload: Optional[Dict[str, Any]] = None
+    result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
+    attempts: int = 0
+    max_attempts: int
+    next_run_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
 
@@ -617,12 +654,46 @@ class CbamItemCreate(CbamItemBase):
 
 class CbamItemRead(CbamItemBase):
     id: UUID
+    factor_source: Optional[str] = None
     calculated_emissions: Optional[float] = None
     created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class CbamItemUpdate(BaseModel):
+    cn_code: Optional[str] = None
+    product_description: Optional[str] = None
+    quantity_tonnes: Optional[float] = None
+    default_emission_factor: Optional[float] = None
+    verified_emission_factor: Optional[float] = None
+    supplier_id: Optional[UUID] = None
+    supplier_name: Optional[str] = None
+    country_of_origin: Optional[str] = None
+
+    @field_validator("quantity_tonnes")
+    @classmethod
+    def non_negative_qty(cls, value: Optional[float]) -> Optional[float]:
+        if value is None:
+            return value
+        if value < 0:
+            raise ValueError("Quantity must be non-negative")
+        return value
+
+    @field_validator("default_emission_factor", "verified_emission_factor")
+    @classmethod
+    def ef_bounds(cls, value: Optional[float]) -> Optional[float]:
+        if value is None:
+            return value
+        if value < 0 or value > 500:
+            raise ValueError("Emission factor out of expected range")
+        return value
+
+
+class CbamItemsAppend(BaseModel):
+    items: List[CbamItemCreate] = Field(min_length=1)
+
+
 class CbamDeclarationCreate(BaseModel):
     period: str
     items: List[CbamItemCreate]
@@ -634,6 +705,128 @@ class CbamStatusUpdate(BaseModel):
     status: str
 
 
+class CbamRecomputeResult(BaseModel):
+    declarations: int
+    items: int
+    declarations_updated: int
+    items_updated: int
+
+
+class CbamPriceRange(BaseModel):
+    start: float = Field(ge=0)
+    stop: float = Field(ge=0)
+    steps: int = Field(ge=2, le=1000)
+
+
+class CbamScenarioAdjustment(BaseModel):
+    """Factor change for the items matching every filter that is set (all items when none is)."""
+
+    cn_prefix: Optional[str] = None
+    supplier_id: Optional[UUID] = None
+    supplier_name: Optional[str] = None
+    country_of_origin: Optional[str] = None
+    factor_basis: Optional[Literal["default", "verified"]] = None
+    emission_factor: Optional[float] = Field(default=None, ge=0, le=500)
+    scale: Optional[float] = Field(default=None, ge=0)
+
+    @model_validator(mode="after")
+    def one_change(self) -> "CbamScenarioAdjustment":
+        if (self.emission_factor is None) == (self.scale is None):
+            raise ValueError("Set exactly one of emission_factor or scale")
+        return self
+
+
+class CbamScenario(BaseModel):
+    name: str
+    adjustments: List[CbamScenarioAdjustment] = Field(default_factory=list, max_length=50)
+
+
+class CbamScenarioRequest(BaseModel):
+    declaration_id: Optional[UUID] = None
+    period: Optional[str] = None  # a period ("2025-Q1") or its prefix ("2025" for the whole year)
+    prices: List[float] = Field(default_factory=list, max_length=1000)
+    price_range: Optional[CbamPriceRange] = None
+    scenarios: List[CbamScenario] = Field(default_factory=list, max_length=100)
+    include_declarations: bool = False
+
+    @field_validator("prices")
+    @classmethod
+    def non_negative_prices(cls, value: List[float]) -> List[float]:
+        if any(price < 0 for price in value):
+            raise ValueError("Prices must be non-negative")
+        return value
+
+
+class CbamCostDistribution(BaseModel):
+    min: float
+    p5: float
+    p50: float
+    p95: float
+    max: float
+    mean: float
+
+
+class CbamScenarioDeclaration(BaseModel):
+    id: UUID
+    period: str
+    total_emissions: float
+    certificate_cost_estimate: float
+
+
+class CbamScenarioResult(BaseModel):
+    name: str
+    total_emissions: float
+    certificate_cost_estimate: float  # at each declaration's own price
+    costs: List[float]  # one per swept price
+    distribution: Optional[CbamCostDistribution] = None
+    declarations: Optional[List[CbamScenarioDeclaration]] = None
+
+
+class CbamScenarioResponse(BaseModel):
+    declarations: int
+    items: int
+    prices: List[float]
+    scenarios: List[CbamScenarioResult]
+
+
+CbamRollupDimension = Literal["period", "status", "cn_chapter", "supplier", "country"]
+
+
+class CbamRollupRead(BaseModel):
+    period: Optional[str] = None
+    status: Optional[str] = None
+    cn_chapter: Optional[str] = None
+    supplier: Optional[str] = None
+    country: Optional[str] = None
+    item_count: int
+    quantity_tonnes: float
+    total_emissions: float
+    certificate_cost: float
+
+
+class CbamRollupRebuildResult(BaseModel):
+    rows: int
+
+
+class CbamDeclarationSummary(BaseModel):
+    id: UUID
+    period: str
+    status: str
+    total_emissions: Optional[float] = None
+    certificate_cost_estimate: Optional[float] = None
+    certificate_price_per_tonne: Optional[float] = None
+    item_count: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class CbamItemsResult(BaseModel):
+    declaration: CbamDeclarationSummary
+    items: List[CbamItemRead]
+
+
 class CbamDeclarationRead(BaseModel):
     id: UUID
     org_id: Optional[str] = None
@@ -4,8 +4,9 @@ from __future__ import annotations
 
 from typing import Iterable
 
-from sqlalchemy import text
+from sqlalchemy import event, text
 from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
 
 
 DEFAULT_RLS_TABLES: list[str] = [
@@ -16,11 +17,13 @@ DEFAULT_RLS_TABLES: list[str] = [
     "restricted_artifacts",
     "audit_logs",
     "import_jobs",
+    "import_job_errors",
     "export_jobs",
     "cbam_declarations",
     "cbam_items",
     "cbam_factors",
     "cbam_suppliers",
+    "cbam_rollups",
     "cra_products",
     "eudr_suppliers",
     "ai_systems",
@@ -28,13 +31,21 @@ DEFAULT_RLS_TABLES: list[str] = [
     "epd_records",
     "nis2_attestations",
 ]
+# Tables the worker polls without an org; see ensure_rls_policies(queue_role=...).
+JOB_QUEUE_TABLES: list[str] = ["import_jobs", "export_jobs"]
 
 
-def ensure_rls_policies(engine: Engine, tables: Iterable[str] | None = None) -> None:
+def ensure_rls_policies(engine: Engine, tables: Iterable[str] | None = None, queue_role: str | None = None) -> None:
     """Enable org_id-based RLS policies for Postgres.
 
     This assumes each table has an org_id column and guards access using the
     session variable `dpp.org_id` set per request (see auth.get_current_org).
+
+    Workers claim, heartbeat and recover jobs of every org before any
+    `dpp.org_id` is set. With ``queue_role`` the job tables also get a
+    `{table}_queue_policy` letting that role (the worker's login) see all job
+    rows while `dpp.org_id` is unset; once a job's work sets it, the org policy
+    applies as usual.
     """
     if engine.dialect.name != "postgresql":
         return
@@ -67,3 +78,43 @@ def ensure_rls_policies(engine: Engine, tables: Iterable[str] | None = None) ->
                     """
                 )
             )
+        if not queue_role:
+            return
+        role = conn.dialect.identifier_preparer.quote(queue_role)
+        for table in JOB_QUEUE_TABLES:
+            if table not in target_tables:
+                continue
+            conn.execute(
+                text(
+                    f"""
+                    DO $$
+                    BEGIN
+                        IF NOT EXISTS (
+                            SELECT 1 FROM pg_policies
+                            WHERE schemaname = current_schema()
+                            AND tablename = '{table}'
+                            AND policyname = '{table}_queue_policy'
+                        ) THEN
+                            CREATE POLICY {table}_queue_policy ON {table} TO {role}
+                            USING (coalesce(current_setting('dpp.org_id', true), '') = '')
+                            WITH CHECK (coalesce(current_setting('dpp.org_id', true), '') = '');
+                        END IF;
+                    END
+                    $$;
+                    """
+                )
+            )
+
+
+def scope_session_to_org(session: Session, org_id: str) -> None:
+    """Apply ``dpp.org_id`` to every transaction ``session`` begins.
+
+    Request sessions set it once per request; long-running work (background
+    jobs) commits several times, and ``SET LOCAL`` only lasts one transaction.
+    """
+    session.info["org_id"] = org_id
+
+    @event.listens_for(session, "after_begin")
+    def _set_org(session: Session, transaction, connection) -> None:
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("SELECT set_config('dpp.org_id', :org_id, true)"), {"org_id": org_id})
@@ -0,0 +1,239 @@
+"""Blob storage on the local filesystem (``STORAGE_PATH``) or S3 (``USE_S3``).
+
+:func:`get_storage` holds files that may be public (artifacts, QR codes);
+locally its root is served by the ``/storage`` static mount.
+:func:`get_private_storage` holds files only authenticated endpoints hand
+out (import uploads, exports, cached PDF renders): a separate root (``PRIVATE_STORAGE_PATH``)
+locally, keys under ``private/`` on S3.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError
+
+from .config import get_settings
+
+settings = get_settings()
+COPY_CHUNK_SIZE = 1024 * 1024
+PRIVATE_S3_PREFIX = "private/"
+DOWNLOAD_URL_SECONDS = 300
+
+
+class StorageError(RuntimeError):
+    pass
+
+
+class LocalStorage:
+    """Files under ``root``; the default root is served publicly by the ``/storage`` static mount."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def put(self, key: str, data: bytes, content_type: str = "application/octet-stream") -> None:
+        dest = self._path(key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so concurrent writers of the same key never expose a partial file.
+        fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(data)
+            os.replace(tmp, dest)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def put_file(self, key: str, source: BinaryIO, content_type: str = "application/octet-stream") -> int:
+        """Copy ``source`` to ``key`` in chunks; returns the number of bytes written."""
+        dest = self._path(key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                shutil.copyfileobj(source, handle, COPY_CHUNK_SIZE)
+                size = handle.tell()
+            os.replace(tmp, dest)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        return size
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def open_read(self, key: str) -> BinaryIO:
+        try:
+            return self._path(key).open("rb")
+        except FileNotFoundError as exc:
+            raise StorageError(f"{key} not found") from exc
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def prune(self, prefix: str, before: datetime) -> int:
+        """Delete files under ``prefix`` last written before ``before`` (UTC); returns how many."""
+        removed = 0
+        cutoff = before.replace(tzinfo=timezone.utc).timestamp()
+        for path in self._path(prefix).rglob("*"):
+            try:
+                if path.is_file() and path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def public_url(self, key: str) -> str:
+        return f"/storage/{key}"
+
+    def upload_url(self, key: str) -> str:
+        # Placeholder for local storage path if not using S3.
+        return f"/storage/{key}"
+
+    def download_url(self, key: str, filename: str) -> str | None:
+        """No direct URL for local files; the API streams them."""
+        return None
+
+
+class S3Storage:
+    """Objects in ``bucket``, their keys prefixed with ``prefix``."""
+
+    def __init__(self, bucket: str | None, prefix: str = ""):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = None
+        if bucket:
+            self.client = boto3.client(
+                "s3",
+                region_name=settings.s3_region,
+                endpoint_url=settings.s3_endpoint_url or None,
+                aws_access_key_id=settings.aws_access_key_id or None,
+                aws_secret_access_key=settings.aws_secret_access_key or None,
+            )
+
+    def _client(self):
+        if not self.client or not self.bucket:
+            raise StorageError("S3 storage not configured")
+        return self.client
+
+    def put(self, key: str, data: bytes, content_type: str = "application/octet-stream") -> None:
+        try:
+            self._client().put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data, ContentType=content_type)
+        except (BotoCoreError, ClientError, NoCredentialsError) as exc:
+            raise StorageError(f"Failed to write {key} to S3") from exc
+
+    def put_file(self, key: str, source: BinaryIO, content_type: str = "application/octet-stream") -> int:
+        """Multipart upload of ``source`` in chunks; returns the number of bytes written."""
+        start = source.tell()
+        try:
+            self._client().upload_fileobj(source, self.bucket, self.prefix + key, ExtraArgs={"ContentType": content_type})
+        except (BotoCoreError, ClientError, NoCredentialsError) as exc:
+            raise StorageError(f"Failed to write {key} to S3") from exc
+        return source.tell() - start
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            return self._client().get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"].read()
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in {"NoSuchKey", "404"}:
+                return None
+            raise StorageError(f"Failed to read {key} from S3") from exc
+        except (BotoCoreError, NoCredentialsError) as exc:
+            raise StorageError(f"Failed to read {key} from S3") from exc
+
+    def open_read(self, key: str) -> BinaryIO:
+        try:
+            return self._client().get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"]
+        except (BotoCoreError, ClientError, NoCredentialsError) as exc:
+            raise StorageError(f"Failed to read {key} from S3") from exc
+
+    def exists(self, key: str) -> bool:
+        try:
+            self._client().head_object(Bucket=self.bucket, Key=self.prefix + key)
+            return True
+        except ClientError:
+            return False
+
+    def prune(self, prefix: str, before: datetime) -> int:
+        """Delete objects under ``prefix`` last written before ``before`` (UTC); returns how many.
+
+        A bucket lifecycle rule on the prefix does the same without the API.
+        """
+        cutoff = before.replace(tzinfo=timezone.utc)
+        removed = 0
+        try:
+            pages = self._client().get_paginator("list_objects_v2").paginate(
+                Bucket=self.bucket, Prefix=self.prefix + prefix
+            )
+            for page in pages:
+                stale = [{"Key": obj["Key"]} for obj in page.get("Contents", []) if obj["LastModified"] < cutoff]
+                if stale:
+                    # A listing page holds at most 1000 keys, the delete_objects limit.
+                    self._client().delete_objects(Bucket=self.bucket, Delete={"Objects": stale, "Quiet": True})
+                    removed += len(stale)
+        except (BotoCoreError, ClientError, NoCredentialsError) as exc:
+            raise StorageError(f"Failed to prune {prefix} on S3") from exc
+        return removed
+
+    def public_url(self, key: str) -> str:
+        if settings.s3_endpoint_url:
+            return f"{settings.s3_endpoint_url.rstrip('/')}/{self.bucket}/{self.prefix}{key}"
+        if settings.s3_region:
+            return f"https://{self.bucket}.s3.{settings.s3_region}.amazonaws.com/{self.prefix}{key}"
+        return f"https://{self.bucket}.s3.amazonaws.com/{self.prefix}{key}"
+
+    def upload_url(self, key: str) -> str:
+        try:
+            return self._client().generate_presigned_url(
+                "put_object",
+                Params={"Bucket": self.bucket, "Key": self.prefix + key},
+                ExpiresIn=900,
+            )
+        except (BotoCoreError, ClientError, NoCredentialsError) as exc:
+            raise StorageError("Failed to generate upload URL") from exc
+
+    def download_url(self, key: str, filename: str) -> str | None:
+        """Short-lived presigned GET for a private object, served as an attachment named ``filename``."""
+        try:
+            return self._client().generate_presigned_url(
+                "get_object",
+                Params={
+                    "Bucket": self.bucket,
+                    "Key": self.prefix + key,
+                    "ResponseContentDisposition": f'attachment; filename="{filename}"',
+                },
+                ExpiresIn=DOWNLOAD_URL_SECONDS,
+            )
+        except (BotoCoreError, ClientError, NoCredentialsError) as exc:
+            raise StorageError("Failed to generate download URL") from exc
+
+
+Storage = LocalStorage | S3Storage
+
+
+@lru_cache
+def get_storage() -> Storage:
+    if settings.use_s3:
+        return S3Storage(settings.s3_bucket)
+    return LocalStorage(settings.storage_path)
+
+
+@lru_cache
+def get_private_storage() -> Storage:
+    if settings.use_s3:
+        return S3Storage(settings.s3_bucket, PRIVATE_S3_PREFIX)
+    return LocalStorage(settings.private_storage_path)
@@ -0,0 +1,404 @@
+"""Import and export job processing, run by the background worker (``app.worker``).
+
+Handlers receive the job, a session and the worker's lease (its name). Exports
+never commit: they write a file to storage and the worker commits its
+metadata together with the completion.
+Imports commit in batches, each together with a checkpoint guarded by the
+lease, so a retried job resumes after its last committed batch and a worker
+that lost its lease stops (:class:`LeaseLost`) instead of writing twice.
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import itertools
+import json
+import os
+import tempfile
+from typing import Any, BinaryIO, Callable, TextIO
+from uuid import uuid5
+
+from pydantic import ValidationError
+from sqlalchemy import select, update
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError, StatementError
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .bulk import append_items, bulk_insert, cbam_lookup, declaration_header, import_rows, item_rows
+from .config import get_settings
+from .csvstream import csv_chunks
+from .importers import IMPORT_MODELS, ParsedRow, iter_records, yields_items
+from .labels import LabelLayoutError, build_label_sheet, label_layout, label_selection, sheet_labels
+from .rollups import apply_deltas, import_deltas
+from .storage import get_private_storage
+from .validation import validate_rows
+
+settings = get_settings()
+ROW_ERROR_LENGTH = 1000
+
+
+class PermanentJobError(Exception):
+    """A failure that retrying cannot fix (bad kind, malformed payload)."""
+
+
+class LeaseLost(Exception):
+    """Another worker recovered the job; this run must stop without touching it."""
+
+
+def _row_error(exc: StatementError) -> str | None:
+    """Message for errors caused by the row's data; ``None`` for anything worth retrying."""
+    if isinstance(exc, DBAPIError) and not isinstance(exc, (IntegrityError, DataError)):
+        return None
+    cause = exc.orig if exc.orig is not None else exc
+    return f"{type(cause).__name__}: {str(cause).splitlines()[0]}"[:ROW_ERROR_LENGTH]
+
+
+def _commit_batch(
+    db: Session,
+    job_id: Any,
+    org_id: str | None,
+    lease: str,
+    last_line: int,
+    created: int,
+    errors: list[tuple[ParsedRow, str]],
+) -> None:
+    """Commit pending rows together with their row errors and the job's checkpoint."""
+    for row, message in errors:
+        db.add(
+            models.ImportJobError(
+                job_id=job_id,
+                org_id=org_id,
+                line=row.line,
+                record=json.loads(json.dumps(row.record, default=str)),
+                error=message,
+                details=row.details,
+            )
+        )
+    result = db.execute(
+        update(models.ImportJob)
+        .where(models.ImportJob.id == job_id, models.ImportJob.locked_by == lease)
+        .values(
+            checkpoint=last_line,
+            rows_created=models.ImportJob.rows_created + created,
+            rows_failed=models.ImportJob.rows_failed + len(errors),
+        )
+    )
+    if result.rowcount == 0:
+        db.rollback()
+        raise LeaseLost(job_id)
+    db.commit()
+    db.expunge_all()
+
+
+Pairs = list[tuple[Any, dict[str, Any]]]
+
+
+def _insert(db: Session, kind: str, org_id: str | None, rows: Pairs, items: bool = False) -> None:
+    if items:
+        append_items(db, org_id, rows)
+        return
+    bulk_insert(db, rows)
+    if kind == "cbam":
+        apply_deltas(db, org_id, import_deltas(rows))
+
+
+def _build_records(
+    db: Session, kind: str, org_id: str | None, batch: list[ParsedRow]
+) -> tuple[list[tuple[ParsedRow, Pairs]], list[tuple[ParsedRow, str]]]:
+    errors: list[tuple[ParsedRow, str]] = []
+    built: list[tuple[ParsedRow, Pairs]] = []
+    lookup = cbam_lookup(db, org_id, (row.record for row in batch if not row.error)) if kind == "cbam" else None
+    for row in batch:
+        if row.error:
+            errors.append((row, row.error))
+            continue
+        try:
+            built.append((row, import_rows(kind, org_id, row.record, lookup)))
+        except TypeError as exc:
+            errors.append((row, f"TypeError: {exc}"))
+    return built, errors
+
+
+def _build_items(
+    db: Session, org_id: str | None, job_id: Any, batch: list[ParsedRow]
+) -> tuple[list[tuple[ParsedRow, Pairs]], list[tuple[ParsedRow, str]]]:
+    """Pairs for CBAM CSV item rows: each item plus the header of its period run's declaration.
+
+    The declaration id derives from the job and the run's first line, so a
+    resumed job appends to the declaration it created before.
+    """
+    errors = [(row, row.error) for row in batch if row.error]
+    valid = [row for row in batch if not row.error]
+    lookup = cbam_lookup(db, org_id, [{"items": [row.record for row in valid]}])
+    built: list[tuple[ParsedRow, Pairs]] = []
+    for declaration, group in itertools.groupby(valid, key=lambda row: row.declaration):
+        rows = list(group)
+        declaration_id = uuid5(job_id, str(declaration.line))
+        header = declaration_header(org_id, declaration_id, declaration)
+        try:
+            items = item_rows(org_id, declaration_id, [row.record for row in rows], lookup)
+        except TypeError as exc:
+            errors.extend((row, f"TypeError: {exc}") for row in rows)
+            continue
+        built.extend(
+            (row, [(models.CbamDeclaration.__table__, header), (models.CbamItem.__table__, item)])
+            for row, item in zip(rows, items)
+        )
+    return built, errors
+
+
+def _write_batch(
+    db: Session,
+    kind: str,
+    org_id: str | None,
+    job_id: Any,
+    lease: str,
+    batch: list[ParsedRow],
+    dry_run: bool = False,
+    items: bool = False,
+) -> tuple[int, int]:
+    """Bulk-insert and commit a batch; returns ``(created, failed)``.
+
+    If the database rejects the batch, it is rolled back and replayed one row per
+    transaction (each with its own checkpoint) to pin down the offending rows.
+    A dry run inserts nothing and only records the rejected rows; ``created``
+    then counts the rows that would have been written. With ``items`` the rows
+    are CBAM CSV items appended to their declarations (:func:`app.bulk.append_items`).
+    """
+    if items:
+        built, errors = _build_items(db, org_id, job_id, batch)
+    else:
+        built, errors = _build_records(db, kind, org_id, batch)
+    if dry_run:
+        _commit_batch(db, job_id, org_id, lease, batch[-1].line, len(built), errors)
+        return len(built), len(errors)
+    try:
+        _insert(db, kind, org_id, [pair for _, rows in built for pair in rows], items)
+    except StatementError as exc:
+        db.rollback()
+        if _row_error(exc) is None:
+            raise
+    else:
+        _commit_batch(db, job_id, org_id, lease, batch[-1].line, len(built), errors)
+        return len(built), len(errors)
+
+    rejected = {id(row): message for row, message in errors}
+    rows_by_id = {id(row): rows for row, rows in built}
+    created = failed = 0
+    for row in batch:
+        message = rejected.get(id(row))
+        if message is None:
+            try:
+                _insert(db, kind, org_id, rows_by_id[id(row)], items)
+            except StatementError as exc:
+                db.rollback()
+                message = _row_error(exc)
+                if message is None:
+                    raise
+        _commit_batch(db, job_id, org_id, lease, row.line, 0 if message else 1, [(row, message)] if message else [])
+        created += 0 if message else 1
+        failed += 1 if message else 0
+    return created, failed
+
+
+def run_import(db: Session, job: models.ImportJob, lease: str) -> dict[str, Any]:
+    """Import in batches of ``IMPORT_BATCH_SIZE``, each committed with a checkpoint.
+
+    Each batch is validated against the import schema before it is written
+    (:mod:`app.validation`). A retried or re-run job resumes after the last
+    committed line. Rejected rows go to ``import_job_errors``; the job fails
+    once more than ``IMPORT_MAX_ERRORS`` rows were rejected. With
+    ``payload["dry_run"]`` the job only validates and reports.
+
+    CBAM CSV rows are single items: the first batch of a period run creates
+    its declaration and every batch appends its items to it, adding their
+    delta to the totals and rollups, so a period never has to fit in memory.
+    """
+    if job.kind not in IMPORT_MODELS:
+        raise PermanentJobError(f"Unsupported import kind: {job.kind}")
+    job_id, org_id, kind = job.id, job.org_id, job.kind
+    dry_run = bool((job.payload or {}).get("dry_run"))
+    items = yields_items(kind, job.payload)
+    total_created, total_failed = job.rows_created, job.rows_failed
+
+    batch: list[ParsedRow] = []
+
+    def commit() -> None:
+        nonlocal total_created, total_failed
+        rows = validate_rows("cbam_items" if items else kind, batch)
+        created, failed = _write_batch(db, kind, org_id, job_id, lease, rows, dry_run, items)
+        total_created += created
+        total_failed += failed
+        batch.clear()
+        if total_failed > settings.import_max_errors:
+            raise PermanentJobError(f"Aborted after {total_failed} rejected rows; see the job's errors")
+
+    for row in iter_records(kind, job.payload, after=job.checkpoint):
+        batch.append(row)
+        if len(batch) >= settings.import_batch_size:
+            commit()
+    if batch:
+        commit()
+    if dry_run:
+        return {"dry_run": True, "valid": total_created, "failed": total_failed}
+    return {"created": total_created, "failed": total_failed}
+
+
+EXPORT_YIELD_PER = 1000
+EXPORT_CONTENT_TYPES = {
+    ".csv": "text/csv",
+    ".json": "application/json",
+    ".pdf": "application/pdf",
+    ".gz": "application/gzip",
+}
+PASSPORT_EXPORT_COLUMNS = (
+    "id",
+    "battery_model",
+    "gtin",
+    "serial_number",
+    "battery_category",
+    "battery_weight_kg",
+    "rated_capacity_kwh",
+    "carbon_footprint_kg_per_kwh",
+)
+
+
+def export_key(org_id: str | None, filename: str) -> str:
+    return f"exports/{org_id}/{filename}"
+
+
+def export_content_type(filename: str) -> str:
+    return EXPORT_CONTENT_TYPES.get(os.path.splitext(filename)[1], "application/octet-stream")
+
+
+def _write_passports_csv(db: Session, org_id: str | None, out: TextIO) -> int:
+    table = models.BatteryPassport
+    rows = db.execute(
+        select(*(getattr(table, name) for name in PASSPORT_EXPORT_COLUMNS))
+        .where(table.org_id == org_id)
+        .order_by(table.created_at.desc(), table.id.desc())
+        .execution_options(yield_per=EXPORT_YIELD_PER)
+    )
+    count = 0
+
+    def counted() -> Any:
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    out.writelines(csv_chunks(itertools.chain([PASSPORT_EXPORT_COLUMNS], counted())))
+    return count
+
+
+def _write_cbam_json(db: Session, org_id: str | None, out: TextIO) -> int:
+    """Declarations with their items as one JSON array, from a single streamed join."""
+    decl, item = models.CbamDeclaration, models.CbamItem
+    rows = db.execute(
+        select(
+            decl.id,
+            decl.period,
+            decl.status,
+            decl.total_emissions,
+            item.cn_code,
+            item.quantity_tonnes,
+            item.calculated_emissions,
+        )
+        .outerjoin(item, item.declaration_id == decl.id)
+        .where(decl.org_id == org_id)
+        .order_by(decl.created_at.desc(), decl.id, item.created_at)
+        .execution_options(yield_per=EXPORT_YIELD_PER)
+    )
+    out.write("[")
+    count = 0
+    for decl_id, group in itertools.groupby(rows, key=lambda row: row.id):
+        first, *rest = group
+        payload = {
+            "id": str(decl_id),
+            "period": first.period,
+            "status": first.status,
+            "total_emissions": first.total_emissions,
+            "items": [
+                {
+                    "cn_code": row.cn_code,
+                    "quantity_tonnes": row.quantity_tonnes,
+                    "calculated_emissions": row.calculated_emissions,
+                }
+                for row in (first, *rest)
+                if row.cn_code is not None
+            ],
+        }
+        out.write(("," if count else "") + json.dumps(payload))
+        count += 1
+    out.write("]")
+    return count
+
+
+def _write_label_sheet(db: Session, job: models.ExportJob, out: BinaryIO) -> int:
+    """The PDF label sheet for ``payload`` (a ``LabelSheetRequest``), for sheets too large to render in a request."""
+    try:
+        request = schemas.LabelSheetRequest.model_validate(job.payload or {})
+        layout = label_layout(request)
+        layout.validate()
+    except (ValidationError, LabelLayoutError) as exc:
+        raise PermanentJobError(f"Invalid label sheet request: {exc}") from exc
+    rows = db.execute(label_selection(job.org_id, request, settings.label_sheet_max_labels)).all()
+    if not rows:
+        raise PermanentJobError("No passports match the selection")
+    out.write(build_label_sheet(sheet_labels(rows), layout))
+    return len(rows)
+
+
+def _text(write: Callable[[Session, str | None, TextIO], int]) -> Callable[[Session, models.ExportJob, BinaryIO], int]:
+    """Adapt a writer of UTF-8 text for the org to the binary export stream."""
+
+    def wrapped(db: Session, job: models.ExportJob, raw: BinaryIO) -> int:
+        out = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+        rows = write(db, job.org_id, out)
+        out.flush()
+        out.detach()
+        return rows
+
+    return wrapped
+
+
+EXPORT_WRITERS: dict[str, tuple[str, Callable[[Session, models.ExportJob, BinaryIO], int]]] = {
+    "passports": (".csv", _text(_write_passports_csv)),
+    "cbam": (".json", _text(_write_cbam_json)),
+    "labels": (".pdf", _write_label_sheet),
+}
+
+
+def run_export(db: Session, job: models.ExportJob, lease: str) -> dict[str, Any]:
+    """Stream the export to a temporary file, then to private storage under ``exports/``.
+
+    Rows are read with ``yield_per`` (a server-side cursor on Postgres) and
+    written as they arrive, optionally gzipped (``payload["gzip"]``). The job
+    only keeps the download URL, size and row count.
+    """
+    if job.kind not in EXPORT_WRITERS:
+        raise PermanentJobError(f"Unsupported export kind: {job.kind}")
+    extension, write = EXPORT_WRITERS[job.kind]
+    compress = bool((job.payload or {}).get("gzip"))
+    filename = f"{job.id}{extension}" + (".gz" if compress else "")
+    with tempfile.TemporaryFile() as spool:
+        raw: BinaryIO = gzip.GzipFile(fileobj=spool, mode="wb") if compress else spool
+        rows = write(db, job, raw)
+        if compress:
+            raw.close()
+        spool.seek(0)
+        size = get_private_storage().put_file(export_key(job.org_id, filename), spool, export_content_type(filename))
+    return {
+        "url": f"/api/jobs/exports/{job.id}/download",
+        "filename": filename,
+        "bytes": size,
+        "rows": rows,
+    }
+
+
+# Queue name -> (job model, handler).
+JOB_TYPES: dict[str, tuple[type, Callable[[Session, Any, str], dict[str, Any]]]] = {
+    "import": (models.ImportJob, run_import),
+    "export": (models.ExportJob, run_export),
+}
@@ -0,0 +1,127 @@
+"""Batch validation of import records against the API's create schemas.
+
+Records are validated a chunk at a time with a ``TypeAdapter(list[...])``, so
+pydantic runs one compiled validator over the whole list instead of building a
+model per row in Python. When a chunk has invalid rows, its errors are grouped
+by list index into structured row errors (``field`` / ``message`` / ``type``)
+and the remaining rows are validated again as one list.
+
+Import schemas forbid unknown fields, so a misspelled CSV column is reported
+instead of silently dropped. With ``IMPORT_VALIDATION_POOL`` on, chunks are
+validated on the shared process pool.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import replace
+from functools import lru_cache
+from typing import Any, List, Optional
+from uuid import UUID
+
+from pydantic import ConfigDict, TypeAdapter, ValidationError
+
+from . import schemas
+from .config import get_settings
+from .executor import pool_map
+from .importers import ParsedRow
+
+settings = get_settings()
+ERROR_MESSAGE_LENGTH = 1000
+
+
+class PassportImport(schemas.BatteryPassportCreate):
+    model_config = ConfigDict(extra="forbid")
+
+    template_id: Optional[UUID] = None
+
+
+class ComponentImport(schemas.ComponentCreate):
+    model_config = ConfigDict(extra="forbid")
+
+
+class TemplateImport(schemas.ProductTemplateCreate):
+    model_config = ConfigDict(extra="forbid")
+
+
+class CbamItemImport(schemas.CbamItemCreate):
+    model_config = ConfigDict(extra="forbid")
+
+
+class CbamDeclarationImport(schemas.CbamDeclarationCreate):
+    model_config = ConfigDict(extra="forbid")
+
+    items: List[CbamItemImport]
+
+
+IMPORT_SCHEMAS: dict[str, type] = {
+    "components": ComponentImport,
+    "templates": TemplateImport,
+    "passports": PassportImport,
+    "cbam": CbamDeclarationImport,
+    # CBAM CSV rows, one item each (see app.importers.CsvDeclaration)
+    "cbam_items": CbamItemImport,
+}
+
+# (validated record, None) or (None, structured errors), per input record.
+Outcome = tuple[Optional[dict[str, Any]], Optional[list[dict[str, Any]]]]
+
+
+@lru_cache
+def _adapter(kind: str) -> TypeAdapter:
+    return TypeAdapter(List[IMPORT_SCHEMAS[kind]])
+
+
+def _row_errors(exc: ValidationError) -> dict[int, list[dict[str, Any]]]:
+    by_index: dict[int, list[dict[str, Any]]] = {}
+    for error in exc.errors(include_url=False):
+        index, *loc = error["loc"]
+        by_index.setdefault(index, []).append(
+            {"field": ".".join(map(str, loc)) or None, "message": error["msg"], "type": error["type"]}
+        )
+    return by_index
+
+
+def validate_chunk(kind: str, records: list[dict[str, Any]]) -> list[Outcome]:
+    """Validate ``records`` as one list; runs in the process pool when enabled."""
+    adapter = _adapter(kind)
+    try:
+        models = adapter.validate_python(records)
+        return [(model.model_dump(exclude_unset=True), None) for model in models]
+    except ValidationError as exc:
+        invalid = _row_errors(exc)
+    valid = [index for index in range(len(records)) if index not in invalid]
+    outcomes: list[Outcome] = [(None, invalid[index]) if index in invalid else (None, None) for index in range(len(records))]
+    for index, model in zip(valid, adapter.validate_python([records[index] for index in valid])):
+        outcomes[index] = (model.model_dump(exclude_unset=True), None)
+    return outcomes
+
+
+def error_message(details: list[dict[str, Any]]) -> str:
+    """One-line summary of structured errors for the ``error`` column."""
+    parts = [f"{detail['field']}: {detail['message']}" if detail["field"] else detail["message"] for detail in details]
+    noun = "error" if len(parts) == 1 else "errors"
+    return f"{len(parts)} validation {noun}: {'; '.join(parts)}"[:ERROR_MESSAGE_LENGTH]
+
+
+def validate_rows(kind: str, rows: list[ParsedRow]) -> list[ParsedRow]:
+    """Validated copies of ``rows``; invalid ones carry an error and its details.
+
+    Rows that already failed to parse pass through unchanged.
+    """
+    pending = [row for row in rows if not row.error]
+    if not pending:
+        return rows
+    records = [row.record for row in pending]
+    workers = max(settings.render_workers, 1) if settings.import_validation_pool else 1
+    size = math.ceil(len(records) / workers)
+    chunks = [records[start : start + size] for start in range(0, len(records), size)]
+    if len(chunks) > 1:
+        outcomes = [outcome for chunk in pool_map(validate_chunk, [kind] * len(chunks), chunks) for outcome in chunk]
+    else:
+        outcomes = validate_chunk(kind, records)
+    validated = {
+        id(row): replace(row, record=record) if details is None else replace(row, error=error_message(details), details=details)
+        for row, (record, details) in zip(pending, outcomes)
+    }
+    return [validated.get(id(row), row) for row in rows]
@@ -0,0 +1,260 @@
+"""Background worker for import/export jobs.
+
+Run one or more with ``python -m app.worker``. The API only queues jobs
+(``POST /api/jobs/.../run``); workers claim them from the job tables:
+
+* claiming selects the oldest due ``queued`` row with ``FOR UPDATE SKIP LOCKED``
+  on Postgres, then flips it to ``running`` with an update guarded on
+  ``status = 'queued'``. On SQLite, which has no row locks, that guarded update
+  alone decides which worker wins;
+* while a job runs, a heartbeat thread bumps ``heartbeat_at``; rows whose
+  heartbeat is older than ``JOB_STALE_SECONDS`` belonged to a crashed worker
+  and are queued again (or failed once out of attempts);
+* failures are retried with exponential backoff up to ``max_attempts``;
+  :class:`~app.tasks.PermanentJobError` and integrity errors fail immediately.
+  Imports resume from their last committed checkpoint.
+* about once an hour a worker also deletes cached PDF renders older than
+  ``RENDER_CACHE_MAX_AGE_DAYS`` (see :mod:`app.rendering`);
+* with RLS enforced, the queue statements run without ``dpp.org_id`` and rely
+  on the ``JOB_QUEUE_ROLE`` queue policy (see :func:`app.security.ensure_rls_policies`);
+  only :meth:`Worker.process` scopes its session to the job's org.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from .config import get_settings
+from .database import SessionLocal
+from .executor import shutdown_process_pool
+from .rendering import prune_renders
+from .security import scope_session_to_org
+from .storage import StorageError
+from .tasks import JOB_TYPES, LeaseLost, PermanentJobError
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+MAX_RETRY_DELAY_SECONDS = 3600
+RENDER_PRUNE_INTERVAL = timedelta(hours=1)
+ERROR_LENGTH = 255
+
+
+def retry_delay(attempts: int) -> timedelta:
+    seconds = settings.job_retry_base_seconds * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(seconds, MAX_RETRY_DELAY_SECONDS))
+
+
+class Heartbeat(threading.Thread):
+    def __init__(self, model: type, job_id: Any, worker_name: str):
+        super().__init__(daemon=True, name=f"heartbeat-{job_id}")
+        self.model = model
+        self.job_id = job_id
+        self.worker_name = worker_name
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self) -> None:
+        while not self.stopped.wait(settings.job_heartbeat_seconds):
+            try:
+                with SessionLocal() as db:
+                    result = db.execute(
+                        update(self.model)
+                        .where(self.model.id == self.job_id, self.model.locked_by == self.worker_name)
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+                    db.commit()
+                if result.rowcount == 0:
+                    self.lost = True
+                    logger.warning("Lost the lease on job %s", self.job_id)
+                    return
+            except Exception:  # noqa: BLE001
+                logger.exception("Heartbeat for job %s failed", self.job_id)
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
+
+
+class Worker:
+    def __init__(self, name: str | None = None):
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = threading.Event()
+        self._last_recovery = datetime.min
+        self._last_prune = datetime.min
+
+    def claim(self, model: type) -> tuple[Any, str | None] | None:
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            job_id = db.scalar(
+                select(model.id)
+                .where(model.status == "queued", model.next_run_at <= now)
+                .order_by(model.next_run_at, model.created_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            if job_id is None:
+                return None
+            result = db.execute(
+                update(model)
+                .where(model.id == job_id, model.status == "queued")
+                .values(
+                    status="running",
+                    attempts=model.attempts + 1,
+                    locked_by=self.name,
+                    locked_at=now,
+                    heartbeat_at=now,
+                )
+                .returning(model.org_id)
+            )
+            row = result.first()
+            db.commit()
+        return (job_id, row.org_id) if row else None
+
+    def process(self, queue: str, job_id: Any, org_id: str | None) -> None:
+        model, handler = JOB_TYPES[queue]
+        heartbeat = Heartbeat(model, job_id, self.name)
+        heartbeat.start()
+        try:
+            with SessionLocal() as db:
+                if org_id:
+                    scope_session_to_org(db, org_id)
+                try:
+                    job = db.get(model, job_id)
+                    result = handler(db, job, self.name)
+                    done = db.execute(
+                        update(model)
+                        .where(model.id == job_id, model.locked_by == self.name)
+                        .values(status="completed", result=result, error=None, locked_by=None, next_run_at=None)
+                    )
+                    if done.rowcount == 0:
+                        # Another worker recovered the job; its run owns the outcome.
+                        db.rollback()
+                        logger.warning("Discarding result of job %s: lease lost", job_id)
+                        return
+                    db.commit()
+                    logger.info("Completed %s job %s", queue, job_id)
+                except LeaseLost:
+                    db.rollback()
+                    logger.warning("Stopped job %s: lease lost", job_id)
+                except Exception as exc:  # noqa: BLE001
+                    db.rollback()
+                    permanent = isinstance(exc, (PermanentJobError, IntegrityError))
+                    self.fail(db, model, job_id, exc, permanent)
+        finally:
+            heartbeat.stop()
+
+    def fail(self, db: Any, model: type, job_id: Any, exc: Exception, permanent: bool) -> None:
+        job = db.get(model, job_id)
+        if job is None or job.locked_by != self.name:
+            return
+        error = f"{type(exc).__name__}: {exc}"[:ERROR_LENGTH]
+        job.error = error
+        job.locked_by = None
+        if permanent or job.attempts >= job.max_attempts:
+            job.status = "failed"
+            job.next_run_at = None
+            logger.error("Job %s failed after %s attempt(s): %s", job_id, job.attempts, error)
+        else:
+            job.status = "queued"
+            job.next_run_at = datetime.utcnow() + retry_delay(job.attempts)
+            logger.warning("Job %s failed (attempt %s), retrying at %s: %s", job_id, job.attempts, job.next_run_at, error)
+        db.commit()
+
+    def recover_stale(self) -> int:
+        """Requeue (or fail) running jobs whose worker stopped heartbeating."""
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=settings.job_stale_seconds)
+        recovered = 0
+        with SessionLocal() as db:
+            for model, _ in JOB_TYPES.values():
+                stale = (model.status == "running", model.heartbeat_at < cutoff)
+                recovered += db.execute(
+                    update(model)
+                    .where(*stale, model.attempts >= model.max_attempts)
+                    .values(status="failed", error="Worker stopped responding", locked_by=None)
+                ).rowcount
+                recovered += db.execute(
+                    update(model)
+                    .where(*stale, model.attempts < model.max_attempts)
+                    .values(status="queued", next_run_at=now, locked_by=None)
+                ).rowcount
+            db.commit()
+        if recovered:
+            logger.warning("Recovered %s stale job(s)", recovered)
+        self._last_recovery = now
+        return recovered
+
+    def prune_renders(self) -> int:
+        """Drop cached PDF renders older than ``RENDER_CACHE_MAX_AGE_DAYS`` (``0`` keeps them)."""
+        self._last_prune = datetime.utcnow()
+        if settings.render_cache_max_age_days <= 0:
+            return 0
+        try:
+            removed = prune_renders(timedelta(days=settings.render_cache_max_age_days))
+        except (OSError, StorageError):
+            logger.exception("Pruning cached renders failed")
+            return 0
+        if removed:
+            logger.info("Pruned %s cached render(s)", removed)
+        return removed
+
+    def run_once(self) -> bool:
+        """Process at most one job per queue; returns whether any job ran."""
+        if datetime.utcnow() - self._last_recovery >= timedelta(seconds=settings.job_stale_seconds / 2):
+            self.recover_stale()
+        if datetime.utcnow() - self._last_prune >= RENDER_PRUNE_INTERVAL:
+            self.prune_renders()
+        ran = False
+        for queue, (model, _) in JOB_TYPES.items():
+            if self.stopping.is_set():
+                break
+            claimed = self.claim(model)
+            if claimed:
+                self.process(queue, *claimed)
+                ran = True
+        return ran
+
+    def run(self, drain: bool = False) -> None:
+        logger.info("Worker %s started", self.name)
+        while not self.stopping.is_set():
+            if self.run_once():
+                continue
+            if drain:
+                break
+            self.stopping.wait(settings.worker_poll_seconds)
+        logger.info("Worker %s stopped", self.name)
+
+    def stop(self, *_: Any) -> None:
+        self.stopping.set()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.worker", description="Process queued import/export jobs.")
+    parser.add_argument("--name", help="Worker id recorded on claimed jobs (default host:pid)")
+    parser.add_argument("--drain", action="store_true", help="Exit once no job is due instead of polling")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    worker = Worker(args.name)
+    # Finish the current job, then exit.
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    try:
+        worker.run(drain=args.drain)
+    finally:
+        shutdown_process_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ import type {
   ExportJob,
   CbamDeclaration,
   CbamDeclarationPayload,
+  CbamDeclarationSummary,
   AuditLog,
   CraProduct,
   EudrSupplier,
@@ -131,8 +132,8 @@ export async function createCbamDeclaration(payload: CbamDeclarationPayload): Pr
   });
 }
 
-export async function listCbamDeclarations(): Promise<CbamDeclaration[]> {
-  return request<CbamDeclaration[]>("/cbam/declarations");
+export async function listCbamDeclarations(): Promise<CbamDeclarationSummary[]> {
+  return request<CbamDeclarationSummary[]>("/cbam/declarations");
 }
 
 export async function createCbamSupplier(body: { name: string; country?: string; default_emission_factor?: number; contact?: string; }): Promise<any> {
@@ -155,8 +156,8 @@ export async function listCbamFactors(): Promise<any[]> {
   return request<any[]>("/cbam/factors");
 }
 
-export async function updateCbamStatus(id: string, status: string): Promise<CbamDeclaration> {
-  return request<CbamDeclaration>(`/cbam/declarations/${id}/status`, {
+export async function updateCbamStatus(id: string, status: string): Promise<CbamDeclarationSummary> {
+  return request<CbamDeclarationSummary>(`/cbam/declarations/${id}/status`, {
     method: "POST",
     body: JSON.stringify({ status }),
   });
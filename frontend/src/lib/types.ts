@@ -134,6 +134,8 @@ export type CbamDeclaration = {
   updated_at: string;
 };
 
+export type CbamDeclarationSummary = Omit<CbamDeclaration, "org_id" | "items"> & { item_count?: number };
+
 export type AuditLog = {
   id: string;
   org_id?: string;